@@ -0,0 +1,161 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+"""
+Benchmark receiving a full time step of input data in the InputDataInventory.
+
+Compares the incremental completeness counters with the previous implementation, which
+checked every input class of every calculation after each received message.
+
+    poetry run python scripts/benchmark_input_data_inventory.py --esdl-ids 10000
+"""
+
+import argparse
+import logging
+import time
+from typing import override
+
+from libdots.io.input_data_inventory import InputDataInventory
+from libdots.io.io_data import IODataInterface
+from libdots.io.io_data import NewStep
+
+
+def create_message_class(service_name: str) -> type[IODataInterface]:
+    class Message(IODataInterface):
+        @override
+        def set_values_from_serialized_protobuf(self, serialized_message: bytes):
+            pass
+
+        @override
+        def get_values_as_serialized_protobuf(self) -> bytes:
+            return b""
+
+        @classmethod
+        @override
+        def get_name(cls) -> str:
+            return service_name
+
+        @classmethod
+        @override
+        def get_main_topic(cls) -> str:
+            return f"/data/{service_name}/model"
+
+        @classmethod
+        @override
+        def get_variable_descr(cls) -> str:
+            return "{}"
+
+    return Message
+
+
+class FullScanInputDataInventory(InputDataInventory):
+    """The completeness check before it was tracked incrementally."""
+
+    @override
+    def _count_received(self, input_name: str):
+        pass
+
+    @override
+    def _get_new_calcs_with_all_input_received(self) -> list[str]:
+        return_val: list[str] = []
+        for calc_name, calc_input_classes in self.calcs_input_classes.items():
+            if calc_name not in self.calcs_done:
+                all_received = True
+                for input_class in calc_input_classes:
+                    nr_received = len(self.input_data_dict[input_class.get_name()])
+                    if (
+                        self._expected_esdl_ids_dict is not None
+                        and input_class.get_main_topic() in self._expected_esdl_ids_dict
+                    ):
+                        nr_expected = len(
+                            self._expected_esdl_ids_dict[input_class.get_main_topic()]
+                        )
+                    else:
+                        nr_expected = 0
+                    if nr_received < nr_expected:
+                        all_received = False
+                if all_received and calc_name not in self.calc_names_all_received:
+                    self.calc_names_all_received.add(calc_name)
+                    return_val.append(calc_name)
+        return return_val
+
+
+def run(
+    inventory_class: type[InputDataInventory],
+    nr_of_esdl_ids: int,
+    nr_of_services: int,
+    nr_of_calcs: int,
+) -> float:
+    message_classes = [
+        create_message_class(f"service_{i}") for i in range(nr_of_services)
+    ]
+    inventory = inventory_class(
+        {
+            f"calc_{i}": [NewStep, *message_classes[i % nr_of_services :]]
+            for i in range(nr_of_calcs)
+        },
+        "benchmark",
+    )
+    esdl_ids = [f"asset_{i}" for i in range(nr_of_esdl_ids)]
+    inventory.set_expected_esdl_ids_for_input_data(
+        {
+            "model_asset": {
+                message_class.get_name(): esdl_ids for message_class in message_classes
+            }
+        }
+    )
+    messages = [(NewStep.get_main_topic(), NewStep.get_name())] + [
+        (message_class.get_main_topic(), message_class.get_name())
+        for _ in esdl_ids
+        for message_class in message_classes
+    ]
+
+    start = time.perf_counter()
+    ready: list[str] = []
+    for main_topic, data_name in messages:
+        ready += inventory.add_input(main_topic, data_name, b"")
+    duration = time.perf_counter() - start
+    assert len(ready) == nr_of_calcs
+    return duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=(__doc__ or "").split("\n\n")[0])
+    parser.add_argument("--esdl-ids", type=int, default=10000)
+    parser.add_argument("--services", type=int, default=4)
+    parser.add_argument("--calcs", type=int, default=4)
+    args = parser.parse_args()
+    logging.disable(logging.DEBUG)
+
+    nr_of_messages = args.esdl_ids * args.services
+    print(
+        f"{nr_of_messages} input messages per step, {args.calcs} calculations, "
+        f"{args.services} input message types"
+    )
+    durations: dict[str, float] = {}
+    for name, inventory_class in (
+        ("full scan", FullScanInputDataInventory),
+        ("incremental", InputDataInventory),
+    ):
+        durations[name] = run(inventory_class, args.esdl_ids, args.services, args.calcs)
+        print(
+            f"{name:>12}: {durations[name]:.3f}s "
+            f"({durations[name] / nr_of_messages * 1e6:.2f}µs per message)"
+        )
+    print(f"     speedup: {durations['full scan'] / durations['incremental']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,7 +16,18 @@
 """Data input/output handling."""
 from . import io_data
 from . import messages
+from .async_mqtt_client import AsyncMqttClient
+from .columnar import ColumnarBatch
+from .columnar import ColumnarOutput
 from .input_data_inventory import InputDataInventory
 from .mqtt_client import MqttClient
 
-__all__ = ["InputDataInventory", "MqttClient", "io_data", "messages"]
+__all__ = [
+    "AsyncMqttClient",
+    "ColumnarBatch",
+    "ColumnarOutput",
+    "InputDataInventory",
+    "MqttClient",
+    "io_data",
+    "messages",
+]
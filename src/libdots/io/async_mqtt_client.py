@@ -0,0 +1,188 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import override
+
+from paho.mqtt.client import MQTT_ERR_SUCCESS
+from paho.mqtt.client import Client
+from paho.mqtt.client import MQTTMessage
+
+from .mqtt_client import MqttClient
+
+if TYPE_CHECKING:
+    from paho.mqtt.client import SocketLike
+
+
+class AsyncMqttClient(MqttClient):
+    """
+    An asyncio alternative to :py:class:`MqttClient <libdots.io.mqtt_client.MqttClient>`.
+    The paho socket is driven from the running event loop instead of ``loop_forever``,
+    and each received message is processed in its own task. ``async def`` calculation
+    functions are awaited, so calculations waiting for I/O overlap without threads.
+
+    The :py:class:`InputDataInventory <libdots.io.input_data_inventory.InputDataInventory>` and
+    :py:class:`ServiceCalc <libdots.model.service_calc.ServiceCalc>` are used exactly as
+    in the threaded client. Start it with :py:meth:`run`.
+
+    When the connection to the broker is lost it is reconnected, waiting from
+    :py:attr:`reconnect_min_delay` up to :py:attr:`reconnect_max_delay` seconds between
+    the attempts. :py:meth:`run` only returns once the client disconnected itself.
+    """
+
+    reconnect_min_delay = 1.0
+    reconnect_max_delay = 120.0
+
+    _loop: asyncio.AbstractEventLoop
+    _disconnected: asyncio.Future[int]
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        # keep references to running tasks, the event loop only keeps weak references.
+        self._tasks: set[asyncio.Task[Any]] = set()
+
+    @override
+    def _create_calculation_executor(
+        self, calculation_workers: int
+    ) -> ThreadPoolExecutor | None:
+        # independent calculations run concurrently as tasks
+        return None
+
+    async def run(self):
+        """Connect to the broker and process messages until the simulation is done."""
+        self._loop = asyncio.get_running_loop()
+        self._disconnected = self._loop.create_future()
+
+        def on_connect(client: Client, userdata: Any, flags: dict[str, Any], rc: int):
+            # Subscribing in on_connect() means that if we lose the connection and
+            # reconnect then subscriptions will be renewed.
+            for topic in self.subscribed_topics:
+                client.subscribe(topic, self.qos)
+
+        def on_message(client: Client, userdata: Any, msg: MQTTMessage):
+            self._create_task(self._process_message_async(client, msg))
+
+        def on_publish(client: Client, userdata: Any, mid: int):
+            self._on_publish(mid)
+
+        def on_disconnect(client: Client, userdata: Any, rc: int):
+            # paho reports 0 only when disconnect() was called
+            if rc != MQTT_ERR_SUCCESS:
+                self.logger.warning(
+                    f"Connection to the broker lost ({rc}), reconnecting"
+                )
+                self._create_task(self._reconnect())
+            elif not self._disconnected.done():
+                self._disconnected.set_result(rc)
+
+        def on_socket_open(client: Client, userdata: Any, sock: "SocketLike"):
+            self._loop.add_reader(sock, client.loop_read)
+            self._create_task(self._loop_misc())
+
+        def on_socket_close(client: Client, userdata: Any, sock: "SocketLike"):
+            self._loop.remove_reader(sock)
+
+        def on_socket_register_write(client: Client, userdata: Any, sock: "SocketLike"):
+            self._loop.add_writer(sock, client.loop_write)
+
+        def on_socket_unregister_write(
+            client: Client, userdata: Any, sock: "SocketLike"
+        ):
+            self._loop.remove_writer(sock)
+
+        self.mqtt_client.on_connect = on_connect
+        self.mqtt_client.on_message = on_message
+        self.mqtt_client.on_publish = on_publish
+        self.mqtt_client.on_disconnect = on_disconnect
+        self.mqtt_client.on_socket_open = on_socket_open
+        self.mqtt_client.on_socket_close = on_socket_close
+        self.mqtt_client.on_socket_register_write = on_socket_register_write
+        self.mqtt_client.on_socket_unregister_write = on_socket_unregister_write
+
+        self.mqtt_client.username_pw_set(self.username, self.password)
+        self.mqtt_client.connect(self.host, port=self.port)
+
+        self._subscribe_lifecycle_topics()
+
+        self._send_ready_for_processing()
+        self.logger.debug("Service started, waiting for model parameters...")
+        await self._disconnected
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.service_calc.stop_calculation_processes()
+
+    async def _reconnect(self):
+        delay = self.reconnect_min_delay
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                self.mqtt_client.reconnect()
+                return
+            except OSError as ex:
+                self.logger.warning(f"Reconnecting to the broker failed: {ex}")
+                delay = min(delay * 2, self.reconnect_max_delay)
+
+    async def _loop_misc(self):
+        while self.mqtt_client.loop_misc() == MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+    def _create_task(self, coro: Any):
+        task = self._loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process_message_async(self, client: Client, msg: MQTTMessage):
+        try:
+            calc_names = self._receive_message(client, msg)
+
+            # do step for calculations that have received all required input
+            if self.input_data_inventory.is_step_active():
+                await self._run_calculations_async(
+                    self.calculation_scheduler.inputs_received(calc_names)
+                )
+
+        except Exception as ex:
+            self._handle_error(client, ex)
+
+    async def _run_calculations_async(self, calc_names: list[str]):
+        await asyncio.gather(
+            *(self._run_calculation_async(calc_name) for calc_name in calc_names)
+        )
+
+    async def _run_calculation_async(self, calc_name: str):
+        next_calc_names = await self._do_step_async(calc_name)
+        self._check_calculations_done()
+        await self._run_calculations_async(next_calc_names)
+
+    async def _do_step_async(self, calc_name: str) -> list[str]:
+        self.sim_logger.debug(
+            f"start '{self.service_calc.service_name} ({self.service_calc.model_id}) - {calc_name}'"
+        )
+        output_data_tuple = await self.service_calc.async_calc_function(
+            calc_name, self.input_data_inventory.get_input_data(calc_name)
+        )
+
+        self._send_output_data(output_data_tuple)
+
+        next_calc_names = self.calculation_scheduler.finished(calc_name)
+        self.input_data_inventory.set_calc_done(calc_name)
+
+        self.sim_logger.debug(
+            f"finished '{self.service_calc.service_name} ({self.service_calc.model_id}) - {calc_name}'"
+        )
+        return next_calc_names
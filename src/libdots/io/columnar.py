@@ -0,0 +1,183 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+"""Columnar messages, for calculation functions working on whole NumPy arrays."""
+
+from collections.abc import Iterator
+from collections.abc import Mapping
+from collections.abc import Sequence
+from functools import cache
+from typing import Any
+from typing import Generic
+from typing import TypeVar
+from typing import cast
+from typing import get_type_hints
+
+import numpy
+import numpy.typing
+
+from ..types import EsdlId
+from .io_data import IODataInterface
+
+IODataT = TypeVar("IODataT", bound=IODataInterface, covariant=True)
+MessageT = TypeVar("MessageT", bound=IODataInterface)
+
+NUMERIC_FIELD_DTYPES: dict[type, type[numpy.generic]] = {
+    bool: numpy.bool_,
+    int: numpy.int64,
+    float: numpy.float64,
+}
+
+
+@cache
+def numeric_fields(data_class: type[IODataInterface]) -> dict[str, type[numpy.generic]]:
+    """
+    The numeric fields of a message class and the dtype of their column, in declaration order.
+    Fields are taken from the class annotations, like ``kw: float`` in the quickstart ``Load`` message.
+    """
+    return {
+        name: NUMERIC_FIELD_DTYPES[field_type]
+        for name, field_type in get_type_hints(data_class).items()
+        if field_type in NUMERIC_FIELD_DTYPES
+    }
+
+
+class ColumnarBatch(Generic[IODataT]):
+    """
+    All messages of one type received in a time step, as columns.
+
+    ``esdl_ids`` holds the esdl_id of the sender of each message, and every numeric field of the
+    message class has a NumPy array with the value of each message at the same position.
+    A calculation function asks for this view by declaring a ``{name}_columns`` field of type
+    ``ColumnarBatch[X]`` in its input_data:
+
+    .. code-block:: python
+
+        class InputData(TypedDict):
+            load_columns: ColumnarBatch[Load]
+
+        def calculation(self, new_step: NewStep, input_data: InputData) -> OutputData:
+            total_kw = input_data["load_columns"]["kw"].sum()
+
+    :param data_class: The message class.
+    :param esdl_ids: The esdl_id of the sender of each message.
+    :param columns: Per numeric field, the values of all messages.
+    """
+
+    def __init__(
+        self,
+        data_class: type[IODataT],
+        esdl_ids: numpy.typing.NDArray[numpy.str_],
+        columns: dict[str, numpy.typing.NDArray[Any]],
+    ):
+        self.data_class = data_class
+        self.esdl_ids = esdl_ids
+        self.columns = columns
+
+    @staticmethod
+    def from_messages(
+        data_class: type[MessageT], messages: Mapping[EsdlId, MessageT]
+    ) -> "ColumnarBatch[MessageT]":
+        """Build the columns from the messages, per esdl_id of the sender."""
+        nr_of_messages = len(messages)
+        esdl_ids = numpy.array(list(messages), dtype=numpy.str_)
+        columns = {
+            name: numpy.fromiter(
+                (getattr(message, name) for message in messages.values()),
+                dtype=dtype,
+                count=nr_of_messages,
+            )
+            for name, dtype in numeric_fields(data_class).items()
+        }
+        return ColumnarBatch(data_class, esdl_ids, columns)
+
+    def __getitem__(self, field: str) -> numpy.typing.NDArray[Any]:
+        return self.columns[field]
+
+    def __len__(self) -> int:
+        return len(self.esdl_ids)
+
+
+class ColumnarOutput(ColumnarBatch[IODataT]):
+    """
+    Output messages of one type for many esdl_ids, as columns.
+
+    A calculation function can return this instead of a mapping of esdl_id to message. The arrays can
+    be allocated once, for instance in ``base_setup``, and filled in place every time step:
+
+    .. code-block:: python
+
+        self.load_output = ColumnarOutput.allocate(Load, self.esdl_ids, esdl_id_field="origin_esdl_id")
+
+        def calculation(self, new_step: NewStep, input_data: InputData) -> OutputData:
+            numpy.multiply(self.peak_kw, factor, out=self.load_output["kw"])
+            return (self.load_output,)
+
+    :param data_class: The message class.
+    :param esdl_ids: The esdl_id to send each message for.
+    :param columns: Per field, the values of all messages.
+    :param esdl_id_field: The name of a message field that is set to the esdl_id of the message, if any.
+    """
+
+    def __init__(
+        self,
+        data_class: type[IODataT],
+        esdl_ids: numpy.typing.NDArray[numpy.str_],
+        columns: dict[str, numpy.typing.NDArray[Any]],
+        esdl_id_field: str | None = None,
+    ):
+        super().__init__(data_class, esdl_ids, columns)
+        self.esdl_id_field = esdl_id_field
+
+    @staticmethod
+    def allocate(
+        data_class: type[MessageT],
+        esdl_ids: Sequence[EsdlId],
+        esdl_id_field: str | None = None,
+    ) -> "ColumnarOutput[MessageT]":
+        """Create zero filled columns for all numeric fields of ``data_class``."""
+        columns = {
+            name: numpy.zeros(len(esdl_ids), dtype=dtype)
+            for name, dtype in numeric_fields(data_class).items()
+        }
+        return ColumnarOutput(
+            data_class, numpy.array(esdl_ids, dtype=numpy.str_), columns, esdl_id_field
+        )
+
+    def __setitem__(self, field: str, values: numpy.typing.ArrayLike):
+        # write into the existing array, so it keeps being reused
+        self.columns[field][...] = values
+
+    def serialize(self) -> Iterator[tuple[EsdlId, bytes]]:
+        """
+        Serialize the message of each esdl_id.
+
+        A single scratch instance of the message class is filled with the values of each row in turn,
+        so no message object is created per esdl_id. Like for received messages, it is created without
+        arguments, so the constructor must have defaults for all of them.
+        """
+        message = self.data_class()
+        # converting to lists once is much faster than reading the arrays element by element
+        esdl_ids = cast(list[EsdlId], self.esdl_ids.tolist())
+        columns = [
+            (name, cast(list[Any], values.tolist()))
+            for name, values in self.columns.items()
+        ]
+        for i, esdl_id in enumerate(esdl_ids):
+            if self.esdl_id_field is not None:
+                setattr(message, self.esdl_id_field, esdl_id)
+            for name, values in columns:
+                setattr(message, name, values[i])
+            yield esdl_id, message.get_values_as_serialized_protobuf()
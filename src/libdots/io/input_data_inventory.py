@@ -14,13 +14,38 @@
 #  Manager:
 #      Scene Ltd
 import logging
+from collections.abc import Iterable
+from collections.abc import Mapping
+from collections.abc import Sequence
 from threading import Lock
+from typing import Literal
+from typing import TypeAlias
 
 from ..types import EsdlId
+from ..types import EsdlIdSet
+from ..types import ServiceName
+from .columnar import ColumnarBatch
 from .io_data import IODataInterface
 from .io_data import ModelParameters
 from .io_data import NewStep
 
+InputView = Literal["list", "by_esdl_id", "columns"]
+"""
+How a calculation function receives the messages of one type in its input_data:
+
+    * list: ``{name}_list``, a list of the messages
+    * by_esdl_id: ``{name}_by_esdl_id``, a mapping of the esdl_id that sent the message to the message
+    * columns: ``{name}_columns``, a :py:class:`.ColumnarBatch` with the numeric fields of the messages
+"""
+
+
+InputDataValue: TypeAlias = (
+    Sequence[IODataInterface]
+    | Mapping[EsdlId, IODataInterface]
+    | ColumnarBatch[IODataInterface]
+)
+"""The messages of one type in the input_data of a calculation function, in one of the :py:data:`InputView` s."""
+
 
 class InputDataInventory:
     """
@@ -30,6 +55,8 @@ class InputDataInventory:
 
     :param calculation_messages: A dictionary of function names and message types it should receive.
     :param service_name: The name of the calculation service.
+    :param calculation_input_views: Per function name and message name, the :py:data:`InputView` s the function
+        receives the messages as. Defaults to ``["list"]`` for every message.
 
 
     An example for calculation_messages looks like this
@@ -44,12 +71,18 @@ class InputDataInventory:
     This defines that there are 2 calculation functions for the calculstion service and what
     message type each of them requires as input.
 
+    Messages are stored per message name and esdl_id of the sender. A message received twice from the
+    same esdl_id in a time step (for instance a QoS 1 redelivery) is ignored.
+
     """
 
     def __init__(
         self,
         calculation_messages: dict[str, list[type[IODataInterface]]],
         service_name: str,
+        calculation_input_views: (
+            Mapping[str, Mapping[str, list[InputView]]] | None
+        ) = None,
     ):
 
         self.lock = Lock()
@@ -58,117 +91,206 @@ class InputDataInventory:
 
         # required data class types per calculation
         self.calcs_input_classes = calculation_messages
+        self.calcs_input_views = calculation_input_views or {}
+
+        # data class per (main topic, data name), the first calculation's class wins
+        self._input_classes_by_topic: dict[tuple[str, str], type[IODataInterface]] = {}
+        for input_class in self.input_classes:
+            self._input_classes_by_topic.setdefault(
+                (input_class.get_main_topic(), input_class.get_name()), input_class
+            )
+
+        # input data names per calculation, and the calculations per input data name
+        self._input_names_by_calc: dict[str, list[str]] = {
+            calc_name: list(
+                dict.fromkeys(input_class.get_name() for input_class in input_classes)
+            )
+            for calc_name, input_classes in self.calcs_input_classes.items()
+        }
+        self._calcs_by_input_name: dict[str, list[str]] = {}
+        for calc_name, input_names in self._input_names_by_calc.items():
+            for input_name in input_names:
+                self._calcs_by_input_name.setdefault(input_name, []).append(calc_name)
 
         # expected ESDL objects (id's), per calculation service (identified by main topic) providing input
-        self._expected_esdl_ids_dict: dict[str, list[EsdlId]] | None = None
+        self._expected_esdl_ids_dict: dict[str, EsdlIdSet] | None = None
+
+        # Completeness is tracked incrementally: the number of messages expected per input data name,
+        # and per calculation the number of input data names that did not receive all messages yet.
+        # A calculation is ready when its count drops to 0.
+        self._nr_expected: dict[str, int] = {}
+        self._nr_incomplete_inputs: dict[str, int] = {}
+        # calculations that are ready, but were not returned by add_input yet
+        self._ready_calcs_not_returned: list[str] = []
+
+        # keep track of which calculations are done
+        self.calcs_done: set[str] = set()
+        self.calc_names_all_received: set[str] = set()
 
         # input_data dict with a list of IODataInterface instances per IO_class
         self.input_data_dict: dict[str, list[IODataInterface]] = {}
+        # the same IODataInterface instances per IO_class and esdl_id of the sender
+        self.input_data_by_esdl_id: dict[str, dict[EsdlId, IODataInterface]] = {}
         self.delete_all_received_input_data()
 
-        # keep track of which calculations are done
-        self.calcs_done: list[str] = []
-        self.calc_names_all_received: list[str] = []
-
     @property
-    def expected_esdl_ids_dict(self) -> dict[str, list[EsdlId]]:
+    def expected_esdl_ids_dict(self) -> dict[str, EsdlIdSet]:
         if self._expected_esdl_ids_dict is None:
             raise ValueError(
                 "expected_esdl_ids_dict not set. Please call set_expected_esdl_ids_for_input_data first."
             )
         return self._expected_esdl_ids_dict
 
+    @property
+    def input_classes(self) -> list[type[IODataInterface]]:
+        """All data classes the calculations take as input, without duplicates."""
+        return list(
+            dict.fromkeys(
+                input_class
+                for calc_input_classes in self.calcs_input_classes.values()
+                for input_class in calc_input_classes
+            )
+        )
+
     # reset input_data_dict to empty lists for each data type, and reset calcs_done
     def delete_all_received_input_data(self):
-        self.lock.acquire()
+        with self.lock:
+            self._delete_all_received_input_data()
+
+    def delete_all_received_input_data_if_all_calcs_done(self) -> bool:
+        """
+        Remove all input data when all calculations of the time step are done, as a single step.
+        Returns whether the data was removed, which only happens for one of the threads that call this.
+        """
+        with self.lock:
+            if not self.all_calcs_done():
+                return False
+            self._delete_all_received_input_data()
+            return True
+
+    def _delete_all_received_input_data(self):
         self.logger.debug("Removing all input data...")
         for calc_input_classes in self.calcs_input_classes.values():
             for input_class in calc_input_classes:
                 self.input_data_dict[input_class.get_name()] = []
-        self.calcs_done = []
-        self.calc_names_all_received = []
+                self.input_data_by_esdl_id[input_class.get_name()] = {}
+        self.calcs_done = set()
+        self.calc_names_all_received = set()
+        self._reset_completeness()
         self.logger.debug("All input data removed!")
-        self.lock.release()
 
     def set_expected_esdl_ids_for_input_data(
-        self, connected_input_esdl_objects_dict: dict[str, dict[str, list[EsdlId]]]
+        self,
+        connected_input_esdl_objects_dict: Mapping[
+            str, Mapping[ServiceName, Iterable[EsdlId]]
+        ],
     ):
         # add lifecyle main topic for NewStep
-        self._expected_esdl_ids_dict = {"/lifecycle/dots-so/model": ["dots-so"]}
+        self._expected_esdl_ids_dict = {"/lifecycle/dots-so/model": {"dots-so": None}}
 
+        # the ESDL objects found in the whole energy system are shared between the esdl_ids, add them once
+        added: set[int] = set()
         for connected_input_esdl_objects in connected_input_esdl_objects_dict.values():
             for service_name, esdl_ids in connected_input_esdl_objects.items():
-                for esdl_id in esdl_ids:
-                    if (
-                        f"/data/{service_name}/model"
-                        not in self._expected_esdl_ids_dict
-                    ):
-                        self._expected_esdl_ids_dict[f"/data/{service_name}/model"] = [
-                            esdl_id
-                        ]
-                    elif (
-                        esdl_id
-                        not in self._expected_esdl_ids_dict[
-                            f"/data/{service_name}/model"
-                        ]
-                    ):
-                        self._expected_esdl_ids_dict[
-                            f"/data/{service_name}/model"
-                        ].append(esdl_id)
+                if id(esdl_ids) in added:
+                    continue
+                added.add(id(esdl_ids))
+                expected_esdl_ids = self._expected_esdl_ids_dict.setdefault(
+                    f"/data/{service_name}/model", {}
+                )
+                expected_esdl_ids.update(dict.fromkeys(esdl_ids))
+        with self.lock:
+            self._reset_completeness()
         self.logger.debug(
-            f" set expecting input ESDL objects for 'home_network_with_battery': {self._expected_esdl_ids_dict}"
+            " set expecting input ESDL objects for '%s': %s",
+            self.service_name,
+            self._expected_esdl_ids_dict,
         )
 
     # add input data and return a list of calculation names that have received all required input objects
     def add_input(
-        self, main_topic: str, data_name: str, serialized_values: bytes
+        self,
+        main_topic: str,
+        data_name: str,
+        serialized_values: bytes,
+        input_class: type[IODataInterface] | None = None,
+        esdl_id: EsdlId | None = None,
     ) -> list[str]:
+        # create a new IODataInterface instance from received data. Decoding happens before taking
+        # the lock, so messages received on multiple threads are decoded concurrently.
+        if input_class is not None:
+            input_class_instance = self.create_new_class(input_class, serialized_values)
+        else:
+            input_class_instance = self._find_and_create_class(
+                main_topic, data_name, serialized_values
+            )
+
         # lock data_inventory to avoid simultaneous editing and consequent problems with checking if all required input
-        # data is present
-        self.lock.acquire()
+        # data is present. Only adding the data and updating the completeness counters happens while locked.
+        with self.lock:
+            if input_class_instance:
+                if (
+                    not isinstance(input_class_instance, ModelParameters)
+                    and self._expected_esdl_ids_dict is None
+                ):
+                    raise OSError(
+                        "Input data received before model parameters were set"
+                    )
+                if esdl_id is None:
+                    self.input_data_dict[data_name].append(input_class_instance)
+                    self._count_received(data_name)
+                elif esdl_id in self.input_data_by_esdl_id[data_name]:
+                    self.logger.debug(
+                        "Ignoring duplicate '%s' data from '%s'", data_name, esdl_id
+                    )
+                    input_class_instance = None
+                else:
+                    self.input_data_by_esdl_id[data_name][
+                        esdl_id
+                    ] = input_class_instance
+                    self.input_data_dict[data_name].append(input_class_instance)
+                    self._count_received(data_name)
 
-        # create a new IODataInterface instance from received data and add to input_data_dict
-        input_class_instance = self._find_and_create_class(
-            main_topic, data_name, serialized_values
-        )
+            # the calcs that received all input data with this message
+            non_executed_calc_names_input_received = (
+                self._get_new_calcs_with_all_input_received()
+            )
 
         if input_class_instance:
-            if (
-                not isinstance(input_class_instance, ModelParameters)
-                and self._expected_esdl_ids_dict is None
-            ):
-                raise OSError("Input data received before model parameters were set")
-            self.input_data_dict[data_name].append(input_class_instance)
             self.logger.debug(
-                f" added '{data_name}' data for service '{self.service_name}': {input_class_instance.get_variable_descr()}"
+                " added '%s' data for service '%s': %s",
+                data_name,
+                self.service_name,
+                input_class_instance.get_variable_descr(),
             )
-
-        # per calc, check if all input data is present
-        non_executed_calc_names_input_received = (
-            self._get_new_calcs_with_all_input_received()
-        )
-
-        self.lock.release()
         # return list of calc names that have received all required input data
         return non_executed_calc_names_input_received
 
     # for a specific calculation, get the needed input data:
-    def get_input_data(
-        self, calc_name: str
-    ) -> dict[str, NewStep | list[IODataInterface]]:
-        input_data: dict[str, NewStep | list[IODataInterface]] = {}
+    def get_input_data(self, calc_name: str) -> dict[str, NewStep | InputDataValue]:
+        input_data: dict[str, NewStep | InputDataValue] = {}
+        calc_input_views = self.calcs_input_views.get(calc_name, {})
         for data_class in self.calcs_input_classes[calc_name]:
+            data_name = data_class.get_name()
             if data_class == NewStep:
-                data = self.input_data_dict[data_class.get_name()][0]
+                data = self.input_data_dict[data_name][0]
                 if not isinstance(data, NewStep):
                     raise TypeError(
                         f"data type for new_step is {type(data)} instead of NewStep"
                     )
                 input_data["new_step"] = data
-            else:
-                input_data[data_class.get_name() + "_list"] = self.input_data_dict[
-                    data_class.get_name()
-                ]
+                continue
+            for view in calc_input_views.get(data_name, ["list"]):
+                if view == "by_esdl_id":
+                    input_data[data_name + "_by_esdl_id"] = self.input_data_by_esdl_id[
+                        data_name
+                    ]
+                elif view == "columns":
+                    input_data[data_name + "_columns"] = ColumnarBatch.from_messages(
+                        data_class, self.input_data_by_esdl_id[data_name]
+                    )
+                else:
+                    input_data[data_name + "_list"] = self.input_data_dict[data_name]
         return input_data
 
     def is_step_active(self) -> bool:
@@ -180,20 +302,10 @@ class InputDataInventory:
     def _find_and_create_class(
         self, main_topic: str, data_name: str, serialized_values: bytes
     ) -> IODataInterface | None:
-        input_class_instance = (
-            None  # avoid multiple adding (input can be used by multiple calculations)
-        )
-
-        for calc_input_classes in self.calcs_input_classes.values():
-            for input_class in calc_input_classes:
-                if (
-                    input_class.get_main_topic() == main_topic
-                    and input_class.get_name() == data_name
-                    and not input_class_instance
-                ):  # avoid multiple adding (multiple calculations can use input)
-                    input_class_instance = self.create_new_class(
-                        input_class, serialized_values
-                    )
+        input_class_instance = None
+        input_class = self._input_classes_by_topic.get((main_topic, data_name))
+        if input_class is not None:
+            input_class_instance = self.create_new_class(input_class, serialized_values)
 
         if not input_class_instance:
             self.logger.debug(
@@ -211,51 +323,66 @@ class InputDataInventory:
                 input_data_class.set_values_from_serialized_protobuf(serialized_values)
             return input_data_class
         except TypeError:
-            self.lock.release()
             raise OSError(
                 f"The data class '{input_class.get_name()}' does not have the correct variables."
                 f"\nVariables required: {input_class.get_variable_descr()}"
             )
 
-    def _get_new_calcs_with_all_input_received(self) -> list[str]:
-        return_val: list[str] = []
-        for calc_name, calc_input_classes in self.calcs_input_classes.items():
+    def _reset_completeness(self):
+        """Recalculate the completeness counters from the expected and received input data."""
+        self._nr_expected = {}
+        for input_class in self.input_classes:
+            input_name = input_class.get_name()
+            if input_name in self._nr_expected:
+                continue
             if (
-                calc_name not in self.calcs_done
-            ):  # check if all input available per calculation
-                all_received = True
-                for (
-                    input_class
-                ) in (
-                    calc_input_classes
-                ):  # check if all input available per input data class
-                    nr_of_data_class_objects_received = len(
-                        self.input_data_dict[input_class.get_name()]
-                    )
-                    if (
-                        self._expected_esdl_ids_dict is not None
-                        and input_class.get_main_topic() in self._expected_esdl_ids_dict
-                    ):
-                        nr_of_data_class_objects_expected = len(
-                            self._expected_esdl_ids_dict[input_class.get_main_topic()]
-                        )
-                    else:
-                        nr_of_data_class_objects_expected = 0
-
-                    if (
-                        nr_of_data_class_objects_received
-                        < nr_of_data_class_objects_expected
-                    ):
-                        all_received = False
-
-                if all_received and calc_name not in self.calc_names_all_received:
-                    self.calc_names_all_received.append(calc_name)
-                    return_val.append(calc_name)
+                self._expected_esdl_ids_dict is not None
+                and input_class.get_main_topic() in self._expected_esdl_ids_dict
+            ):
+                self._nr_expected[input_name] = len(
+                    self._expected_esdl_ids_dict[input_class.get_main_topic()]
+                )
+            else:
+                self._nr_expected[input_name] = 0
+
+        self._nr_incomplete_inputs = {}
+        self._ready_calcs_not_returned = []
+        for calc_name, input_names in self._input_names_by_calc.items():
+            self._nr_incomplete_inputs[calc_name] = sum(
+                len(self.input_data_dict.get(input_name, ()))
+                < self._nr_expected[input_name]
+                for input_name in input_names
+            )
+            if (
+                self._nr_incomplete_inputs[calc_name] == 0
+                and calc_name not in self.calcs_done
+                and calc_name not in self.calc_names_all_received
+            ):
+                self._ready_calcs_not_returned.append(calc_name)
+
+    def _count_received(self, input_name: str):
+        """Update the completeness counters for a received message. Runs in O(calcs using this input)."""
+        if len(self.input_data_dict[input_name]) != self._nr_expected[input_name]:
+            return
+        # this message completed input_name
+        for calc_name in self._calcs_by_input_name[input_name]:
+            self._nr_incomplete_inputs[calc_name] -= 1
+            if (
+                self._nr_incomplete_inputs[calc_name] == 0
+                and calc_name not in self.calcs_done
+                and calc_name not in self.calc_names_all_received
+            ):
+                self._ready_calcs_not_returned.append(calc_name)
+
+    def _get_new_calcs_with_all_input_received(self) -> list[str]:
+        return_val = self._ready_calcs_not_returned
+        self._ready_calcs_not_returned = []
+        self.calc_names_all_received.update(return_val)
         return return_val
 
     def set_calc_done(self, calc_name: str):
         self.lock.acquire()
-        self.calcs_done.append(calc_name)
+        self.calcs_done.add(calc_name)
         self.lock.release()
 
     def all_calcs_done(self):
@@ -0,0 +1,114 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+import logging
+import threading
+from collections.abc import Callable
+from queue import Queue
+from typing import Literal
+
+from paho.mqtt.client import Client
+from paho.mqtt.client import MQTTMessage
+
+DispatchMode = Literal["thread", "ordered", "parallel"]
+
+MessageHandler = Callable[[Client, MQTTMessage], None]
+
+
+class MessageDispatcher:
+    """
+    Hands the messages received by the paho network thread over to the code processing them.
+
+    :param handler: The function processing a single message.
+    :param mode: How messages are handed over:
+
+        * thread: Start a new daemon thread per message (the original behaviour).
+        * ordered: A single worker thread processes the messages in the order they were received.
+        * parallel: A fixed pool of ``workers`` threads processes the messages concurrently.
+
+    :param workers: The number of worker threads in ``parallel`` mode.
+    :param queue_size: The maximum number of messages waiting for a worker. When the queue is full
+        the paho network thread blocks until a worker is available, which stops reading from the
+        socket and lets the broker buffer the messages instead of this process.
+    """
+
+    def __init__(
+        self,
+        handler: MessageHandler,
+        mode: DispatchMode = "thread",
+        workers: int = 4,
+        queue_size: int = 10000,
+    ):
+        if workers < 1:
+            raise ValueError("The message dispatcher needs at least 1 worker")
+        self.logger = logging.getLogger(__name__)
+        self.handler = handler
+        self.mode: DispatchMode = mode
+        self.nr_of_workers = 1 if mode == "ordered" else workers
+        self.queue: Queue[tuple[Client, MQTTMessage] | None] = Queue(maxsize=queue_size)
+        self._workers: list[threading.Thread] = []
+        self._workers_lock = threading.Lock()
+
+    def dispatch(self, client: Client, msg: MQTTMessage):
+        """Process ``msg`` according to the dispatch mode. Called from the paho on_message callback."""
+        if self.mode == "thread":
+            t = threading.Thread(target=self.handler, args=[client, msg])
+            t.daemon = True  # kill thread when main thread stops
+            t.start()
+            return
+        self._start_workers()
+        self.queue.put((client, msg))
+
+    def stop(self):
+        """Stop the worker threads once they processed the messages already queued."""
+        with self._workers_lock:
+            for _ in self._workers:
+                self.queue.put(None)
+            workers = self._workers
+            self._workers = []
+        for worker in workers:
+            if worker is not threading.current_thread():
+                worker.join()
+
+    def _start_workers(self):
+        if self._workers:
+            return
+        with self._workers_lock:
+            if self._workers:
+                return
+            for i in range(self.nr_of_workers):
+                worker = threading.Thread(
+                    target=self._work, name=f"mqtt-dispatch-{i}", daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self.handler(*item)
+            except Exception:
+                # the handler is expected to handle its own errors, but make sure a
+                # failing message never takes a worker down with it.
+                self.logger.exception("Error processing message")
+            finally:
+                self.queue.task_done()
+
+    def join(self):
+        """Block until all queued messages have been processed."""
+        self.queue.join()
@@ -18,27 +18,47 @@
 import logging
 import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
+from paho.mqtt.client import MQTT_ERR_NO_CONN
+from paho.mqtt.client import MQTT_ERR_SUCCESS
 from paho.mqtt.client import Client
 from paho.mqtt.client import MQTTMessage
+from paho.mqtt.client import MQTTMessageInfo
+from paho.mqtt.client import error_string
 
+from ..model.calculation_scheduler import CalculationScheduler
+from ..model.service_calc import OutputDataType
 from ..model.service_calc import ServiceCalc
 from ..types import EsdlId
+from ..types import EsdlIdSet
+from ..types import ModelParametersDescription
 from ..types import ServiceName
 from . import messages
+from .columnar import ColumnarOutput
 from .input_data_inventory import InputDataInventory
 from .io_data import IODataInterface
 from .io_data import ModelParameters
-
-MODEL_PARAMETERS = "model_parameters"
-NEW_STEP = "new_step"
-SIMULATION_DONE = "simulations_done"
+from .message_dispatcher import DispatchMode
+from .message_dispatcher import MessageDispatcher
+from .topic_router import MODEL_PARAMETERS
+from .topic_router import SIMULATION_DONE
+from .topic_router import TopicRouter
 
 
 class MqttClient:
     """
     The MQTT Client handling receiving and sending MQTT messages.
+
+    Received messages are processed outside of the paho network thread by a
+    :py:class:`MessageDispatcher <libdots.io.message_dispatcher.MessageDispatcher>`,
+    configured with ``dispatch_mode``, ``dispatch_workers`` and ``dispatch_queue_size``.
+
+    The outputs of a calculation are serialized first and then published back to back with
+    ``output_qos``, with at most ``publish_window`` QoS>0 messages in flight. CalculationsDone is only
+    sent once all output messages of the time step have been acknowledged by the broker (QoS>0) or
+    written to the socket (QoS 0). Output messages are QoS 0 by default, like the other messages.
     """
 
     def __init__(
@@ -52,12 +72,20 @@ class MqttClient:
         input_data_inventory: InputDataInventory,
         service_calc: ServiceCalc[Any],
         sim_logger: logging.Logger,
+        dispatch_mode: DispatchMode = "thread",
+        dispatch_workers: int = 4,
+        dispatch_queue_size: int = 10000,
+        publish_window: int = 100,
+        output_qos: int = 0,
+        calculation_workers: int = 4,
+        calculation_processes: int | None = None,
     ):
         self.logger = logging.getLogger(__name__)
         self.sim_logger = sim_logger
         self.host = host
         self.port = port
         self.qos = qos
+        self.output_qos = output_qos
         self.username = username
         self.password = password
         self.service_name = service_name
@@ -68,31 +96,80 @@ class MqttClient:
         self.input_data_inventory = input_data_inventory
         self.service_calc = service_calc
 
+        self.topic_router = TopicRouter(
+            service_calc.simulation_id, service_calc.model_id
+        )
+
+        self.publish_window = publish_window
+        # published message ids that are not acknowledged yet, and whether they are output data
+        self._unacked_mids: dict[int, bool] = {}
+        self._nr_of_unacked_outputs = 0
+        # message ids acknowledged before the publishing thread registered them
+        self._early_acked_mids: set[int] = set()
+        self._calculations_done_pending = False
+        self._publish_lock = threading.Lock()
+
+        self.calculation_scheduler = CalculationScheduler(
+            service_calc.calculation_functions,
+            service_calc.calculation_function_dependencies,
+        )
+        self._calculation_executor = self._create_calculation_executor(
+            calculation_workers
+        )
+
+        self.calculation_processes = calculation_processes
+
+        self.dispatch_mode: DispatchMode = dispatch_mode
+        self.dispatch_workers = dispatch_workers
+        self.dispatch_queue_size = dispatch_queue_size
+
     @property
     def mqtt_client(self) -> Client:
         if self._mqtt_client is None:
             self._mqtt_client = Client(clean_session=True)
+            self._mqtt_client.max_inflight_messages_set(self.publish_window)
         return self._mqtt_client
 
+    def _create_calculation_executor(
+        self, calculation_workers: int
+    ) -> ThreadPoolExecutor | None:
+        # calculations run on the thread that received their last input, unless the service declared
+        # which calculations are independent, then they run concurrently on a pool
+        if self.service_calc.calculation_function_dependencies is None:
+            return None
+        return ThreadPoolExecutor(calculation_workers, thread_name_prefix="calculation")
+
     def wait_for_data(self):
+        dispatcher = MessageDispatcher(
+            self._process_message,
+            mode=self.dispatch_mode,
+            workers=self.dispatch_workers,
+            queue_size=self.dispatch_queue_size,
+        )
+
         # initialize mqtt connection
 
         # The callback for when the client receives a CONNACK response from the server.
         def on_connect(client: Client, userdata: Any, flags: dict[str, Any], rc: int):
             # print("Connected with result code " + str(rc))
             # Subscribing in on_connect() means that if we lose the connection and
-            # reconnect then subscriptions will be renewed.
-            for topic in self.subscribed_topics:
-                client.subscribe(topic, self.qos)
+            # reconnect then subscriptions will be renewed, in a single request.
+            if self.subscribed_topics:
+                client.subscribe(
+                    [(topic, self.qos) for topic in self.subscribed_topics]
+                )
 
         # The callback for when a PUBLISH message is received from the server.
         def on_message(client: Client, userdata: Any, msg: MQTTMessage):
-            t = threading.Thread(target=self._process_message, args=[client, msg])
-            t.setDaemon(True)  # kill thread when main thread stops
-            t.start()
+            dispatcher.dispatch(client, msg)
+
+        # The callback for when a published message is acknowledged (QoS>0) or sent (QoS 0).
+        def on_publish(client: Client, userdata: Any, mid: int):
+            self._on_publish(mid)
 
         self.mqtt_client.on_connect = on_connect
         self.mqtt_client.on_message = on_message
+        self.mqtt_client.on_publish = on_publish
 
         self.mqtt_client.username_pw_set(self.username, self.password)
         self.mqtt_client.connect(self.host, port=self.port)
@@ -102,88 +179,102 @@ class MqttClient:
         self._send_ready_for_processing()
         self.logger.debug("Service started, waiting for model parameters...")
         self.mqtt_client.loop_forever()
+        dispatcher.stop()
+        if self._calculation_executor is not None:
+            self._calculation_executor.shutdown()
+        self.service_calc.stop_calculation_processes()
 
     def _process_message(self, client: Client, msg: MQTTMessage):
         try:
-            topic = msg.topic
-            self.logger.debug(f" [received] {topic}: {msg.payload}")
-
-            data_name: str = self._get_data_name(topic)
+            calc_names = self._receive_message(client, msg)
 
-            if data_name == SIMULATION_DONE:
-                self.logger.debug("Received simulation done message")
-                self.service_calc.write_to_influxdb()
-                self.sim_logger.info(
-                    f"Simulation Orchestrator terminated service: '{self.service_name}: "
-                    f"{self.service_calc.model_id}' - '{self.service_calc.simulation_id}'"
+            # do step for calculations that have received all required input
+            if self.input_data_inventory.is_step_active():
+                self._run_calculations(
+                    self.calculation_scheduler.inputs_received(calc_names)
                 )
-                client.disconnect()
-            else:
-                if (
-                    data_name == MODEL_PARAMETERS or data_name == NEW_STEP
-                ):  # set lifecycle main topic
-                    main_topic = "/lifecycle/dots-so/model"
-                else:  # get data main topic from message topic
-                    main_topic = "/".join(
-                        topic.split("/")[0:4]
-                    )  # first three items separated by '/'
-
-                if data_name == MODEL_PARAMETERS:
-                    model_parameter_data = self.input_data_inventory.create_new_class(
-                        ModelParameters, msg.payload
-                    )
-                    if (
-                        not isinstance(model_parameter_data, ModelParameters)
-                        or model_parameter_data.parameters_dict is None
-                    ):
-                        raise ValueError("Invalid Model Parameters Received")
-
-                    self.service_calc.setup(model_parameter_data.parameters_dict)
-                    self.input_data_inventory.set_expected_esdl_ids_for_input_data(
-                        self.service_calc.connected_input_esdl_objects_dict
-                    )
-                    self._subscribe_data_topics(
-                        client, self.service_calc.connected_input_esdl_objects_dict
-                    )
-                    self._send_parameterized()
-                    non_executed_calc_names_input_received = []
-                else:
-                    # add input data and receive a list of calculations that have all required input available
-                    non_executed_calc_names_input_received = (
-                        self.input_data_inventory.add_input(
-                            main_topic, data_name, msg.payload
-                        )
-                    )
-
-                # do step for calculations that have received all required input
-                if self.input_data_inventory.is_step_active():
-                    for calc_name in non_executed_calc_names_input_received:
-                        self._do_step(calc_name)
-
-                        if self.input_data_inventory.all_calcs_done():
-                            self._send_calculations_done()
-                            self.input_data_inventory.delete_all_received_input_data()
 
         except Exception as ex:
-            error_message = str(ex) + traceback.format_exc()
-
-            self.logger.error(error_message)
-            self._send_error_occurred(error_message)
+            self._handle_error(client, ex)
+
+    def _receive_message(self, client: Client, msg: MQTTMessage) -> list[str]:
+        """
+        Handle the lifecycle or input data message ``msg``.
+
+        Returns the names of the calculations that received all their input data by this message.
+        """
+        topic = msg.topic
+        self.logger.debug(" [received] %s: %s", topic, msg.payload)
+
+        route = self.topic_router.route(topic)
+        data_name = route.data_name
+
+        if data_name == SIMULATION_DONE:
+            self.logger.debug("Received simulation done message")
+            self.service_calc.write_to_influxdb()
+            self.service_calc.stop_calculation_processes()
+            self.sim_logger.info(
+                f"Simulation Orchestrator terminated service: '{self.service_name}: "
+                f"{self.service_calc.model_id}' - '{self.service_calc.simulation_id}'"
+            )
             client.disconnect()
+            return []
+
+        if data_name == MODEL_PARAMETERS:
+            self.service_calc.setup(self._parse_model_parameters(msg.payload))
+            self.service_calc.start_calculation_processes(self.calculation_processes)
+            self.input_data_inventory.set_expected_esdl_ids_for_input_data(
+                self.service_calc.connected_input_esdl_objects_dict
+            )
+            self.topic_router.build(
+                self.input_data_inventory.input_classes,
+                self.input_data_inventory.expected_esdl_ids_dict,
+            )
+            self._subscribe_data_topics(
+                client, self.service_calc.connected_input_esdl_objects_dict
+            )
+            self._send_parameterized()
+            return []
+
+        # add input data and receive a list of calculations that have all required input available
+        return self.input_data_inventory.add_input(
+            route.main_topic,
+            data_name,
+            msg.payload,
+            route.input_class,
+            route.esdl_id,
+        )
+
+    def _parse_model_parameters(self, payload: bytes) -> ModelParametersDescription:
+        model_parameter_data = self.input_data_inventory.create_new_class(
+            ModelParameters, payload
+        )
+        if (
+            not isinstance(model_parameter_data, ModelParameters)
+            or model_parameter_data.parameters_dict is None
+        ):
+            raise ValueError("Invalid Model Parameters Received")
+        return model_parameter_data.parameters_dict
+
+    def _check_calculations_done(self):
+        if self.input_data_inventory.delete_all_received_input_data_if_all_calcs_done():
+            with self._publish_lock:
+                # wait for the outputs of this step to be published before we report we're done
+                send_now = self._nr_of_unacked_outputs == 0
+                self._calculations_done_pending = not send_now
+            if send_now:
+                self._send_calculations_done()
+
+    def _handle_error(self, client: Client, ex: Exception):
+        error_message = str(ex) + traceback.format_exc()
+
+        self.logger.error(error_message)
+        self._send_error_occurred(error_message)
+        client.disconnect()
 
     @staticmethod
     def _get_data_name(topic: str):
-        message = topic.split("/")[6]
-        if topic.startswith("/lifecycle/dots-so/model/"):
-            if message == "ModelParameters":
-                message = MODEL_PARAMETERS
-            elif message == "NewStep":
-                message = NEW_STEP
-            elif message == "SimulationDone":
-                message = SIMULATION_DONE
-            else:
-                raise Exception(f"Received unknown lifecycle message: '{message}'")
-        return message
+        return TopicRouter.parse_topic(topic).data_name
 
     def _subscribe_lifecycle_topics(self):
         topic = f"/lifecycle/dots-so/model/{self.service_calc.simulation_id}/{self.service_calc.model_id}/+"
@@ -193,63 +284,109 @@ class MqttClient:
     def _subscribe_data_topics(
         self,
         client: Client,
-        connected_input_esdl_objects_dict: dict[
-            EsdlId, dict[ServiceName, list[EsdlId]]
-        ],
+        connected_input_esdl_objects_dict: dict[EsdlId, dict[ServiceName, EsdlIdSet]],
     ):
-        topics: list[str] = []
+        # insertion-ordered set of topics
+        topics: dict[str, None] = {}
         for (
             main_topic,
             esdl_ids,
         ) in self.input_data_inventory.expected_esdl_ids_dict.items():
             for esdl_id in esdl_ids:
-                topics.append(
-                    f"{main_topic}/{self.service_calc.simulation_id}/{esdl_id}/#"
-                )
-        for topic in set(topics):
+                topic = f"{main_topic}/{self.service_calc.simulation_id}/{esdl_id}/#"
+                topics[topic] = None
+        for topic in topics:
             client.subscribe(topic, qos=self.qos)
             self.subscribed_topics.append(topic)
 
+    def _publish(
+        self, topic: str, payload: bytes, qos: int = 0, output: bool = False
+    ) -> MQTTMessageInfo:
+        """
+        Publish a message and keep track of its acknowledgement.
+        ``output`` messages need to be acknowledged before CalculationsDone is sent.
+        """
+        info = self.mqtt_client.publish(topic, payload, qos=qos)
+        # with QoS>0 paho keeps the message while disconnected, and sends it once reconnected
+        queued = info.rc == MQTT_ERR_NO_CONN and qos > 0
+        if info.rc != MQTT_ERR_SUCCESS and not queued:
+            if output:
+                raise OSError(
+                    f"Publishing to '{topic}' failed: {error_string(info.rc)}"
+                )
+            return info
+        with self._publish_lock:
+            if info.mid in self._early_acked_mids:
+                self._early_acked_mids.remove(info.mid)
+            else:
+                self._unacked_mids[info.mid] = output
+                self._nr_of_unacked_outputs += output
+        return info
+
+    def _on_publish(self, mid: int):
+        with self._publish_lock:
+            output = self._unacked_mids.pop(mid, None)
+            if output is None:
+                # acknowledged before _publish could register it
+                self._early_acked_mids.add(mid)
+            else:
+                self._nr_of_unacked_outputs -= output
+            send_calculations_done = (
+                self._calculations_done_pending and self._nr_of_unacked_outputs == 0
+            )
+            if send_calculations_done:
+                self._calculations_done_pending = False
+        if send_calculations_done:
+            self._send_calculations_done()
+
     def _send_ready_for_processing(self):
         topic = f"/lifecycle/model/mso/{self.service_calc.simulation_id}/{self.service_calc.model_id}/ReadyForProcessing"
-        self.mqtt_client.publish(
-            topic, payload=messages.ReadyForProcessing().SerializeToString()
-        )
+        self._publish(topic, messages.ReadyForProcessing().SerializeToString())
         self.logger.debug(f" [sent] {topic}")
 
     def _send_parameterized(self):
         topic = f"/lifecycle/model/dots-so/{self.service_calc.simulation_id}/{self.service_calc.model_id}/Parameterized"
-        self.mqtt_client.publish(
-            topic, payload=messages.Parameterized().SerializeToString()
-        )
+        self._publish(topic, messages.Parameterized().SerializeToString())
         self.logger.debug(f" [sent] {topic}")
 
-    def _send_io_data(self, esdl_id: EsdlId, io_data: IODataInterface):
-        topic = f"{io_data.get_main_topic()}/{self.service_calc.simulation_id}/{esdl_id}/{io_data.get_name()}"
-        self.mqtt_client.publish(topic, io_data.get_values_as_serialized_protobuf())
-        self.logger.debug(f" [sent] {topic}: {io_data.get_variable_descr()}")
+    def _get_io_data_topic(self, esdl_id: EsdlId, io_data: IODataInterface) -> str:
+        return self.topic_router.output_topic(esdl_id, type(io_data))
 
     def _send_calculations_done(self):
         topic = f"/lifecycle/model/dots-so/{self.service_calc.simulation_id}/{self.service_calc.model_id}/CalculationsDone"
-        self.mqtt_client.publish(
-            topic, payload=messages.CalculationsDone().SerializeToString()
-        )
+        self._publish(topic, messages.CalculationsDone().SerializeToString())
         self.logger.debug(f" [sent] {topic}")
 
     def send_log(self, message: str):
-        self.mqtt_client.publish(
+        self._publish(
             f"/log/model/dots-so/{self.service_calc.simulation_id}/{self.service_calc.model_id}",
             message.encode("utf-8"),
         )
 
     def _send_error_occurred(self, message: str):
         error_occurred_message = messages.ErrorOccurred(error_message=message)
-        self.mqtt_client.publish(
+        self._publish(
             f"/lifecycle/model/dots-so/{self.service_calc.simulation_id}/{self.service_calc.model_id}/ErrorOccurred",
             error_occurred_message.SerializeToString(),
         )
 
-    def _do_step(self, calc_name: str):
+    def _run_calculations(self, calc_names: list[str]):
+        if self._calculation_executor is None:
+            for calc_name in calc_names:
+                self._run_calculation(calc_name)
+        else:
+            for calc_name in calc_names:
+                self._calculation_executor.submit(self._run_calculation, calc_name)
+
+    def _run_calculation(self, calc_name: str):
+        try:
+            next_calc_names = self._do_step(calc_name)
+            self._check_calculations_done()
+            self._run_calculations(next_calc_names)
+        except Exception as ex:
+            self._handle_error(self.mqtt_client, ex)
+
+    def _do_step(self, calc_name: str) -> list[str]:
         # do step calculation if all data received for 'calc_name'
         self.sim_logger.debug(
             f"start '{self.service_calc.service_name} ({self.service_calc.model_id}) - {calc_name}'"
@@ -258,14 +395,45 @@ class MqttClient:
             calc_name, self.input_data_inventory.get_input_data(calc_name)
         )
 
-        # send results
-        if output_data_tuple:
-            for output_data_dict in output_data_tuple:
-                for esdl_id, output_data in output_data_dict.items():
-                    self._send_io_data(esdl_id, output_data)
+        self._send_output_data(output_data_tuple)
 
+        # the scheduler is told first, so its time step is over before CalculationsDone can be sent
+        next_calc_names = self.calculation_scheduler.finished(calc_name)
         self.input_data_inventory.set_calc_done(calc_name)
 
         self.sim_logger.debug(
             f"finished '{self.service_calc.service_name} ({self.service_calc.model_id}) - {calc_name}'"
         )
+        # the calculations that were waiting for this one
+        return next_calc_names
+
+    def _send_output_data(self, output_data_tuple: OutputDataType | None):
+        # send results
+        if output_data_tuple:
+            # serialize everything first, so the messages can be published back to back
+            batch: list[tuple[str, bytes]] = []
+            for output_data in output_data_tuple:
+                if isinstance(output_data, ColumnarOutput):
+                    batch.extend(
+                        (
+                            self.topic_router.output_topic(
+                                esdl_id, output_data.data_class
+                            ),
+                            payload,
+                        )
+                        for esdl_id, payload in output_data.serialize()
+                    )
+                else:
+                    batch.extend(
+                        (
+                            self._get_io_data_topic(esdl_id, io_data),
+                            io_data.get_values_as_serialized_protobuf(),
+                        )
+                        for esdl_id, io_data in output_data.items()
+                    )
+            self._publish_output_batch(batch)
+
+    def _publish_output_batch(self, batch: list[tuple[str, bytes]]):
+        for topic, payload in batch:
+            self._publish(topic, payload, qos=self.output_qos, output=True)
+        self.logger.debug(f" [sent] {len(batch)} output messages")
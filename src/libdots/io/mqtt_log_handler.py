@@ -15,15 +15,19 @@
 #      Scene Ltd
 
 import logging
+from collections.abc import Iterable
 from logging import Formatter
 from logging import Handler
+from logging import Logger
 from logging import LogRecord
+from typing import TYPE_CHECKING
 
-from .mqtt_client import MqttClient
+if TYPE_CHECKING:
+    from .mqtt_client import MqttClient
 
 
 class MqttLogHandler(Handler):
-    def __init__(self, client: MqttClient):
+    def __init__(self, client: "MqttClient"):
         super().__init__()
         formatter = Formatter(
             fmt="%(asctime)s [%(threadName)s][%(filename)s:%(lineno)d][%(levelname)s]: %(message)s"
@@ -34,3 +38,22 @@ class MqttLogHandler(Handler):
     def emit(self, record: LogRecord):
         if record.levelno >= logging.INFO:
             self.client.send_log(self.format(record))
+
+
+def detach_mqtt_log_handlers(
+    loggers: Iterable[Logger],
+) -> list[tuple[Logger, MqttLogHandler]]:
+    """
+    Remove the :py:class:`MqttLogHandler` instances from ``loggers``, in a process forked from the one
+    that created them: they publish with the MQTT client of the parent process, whose socket and locks
+    the child must not use.
+
+    :return: The removed handlers with their logger, to add them again with a client of the child.
+    """
+    detached: list[tuple[Logger, MqttLogHandler]] = []
+    for logger in dict.fromkeys(loggers):
+        for handler in list(logger.handlers):
+            if isinstance(handler, MqttLogHandler):
+                logger.removeHandler(handler)
+                detached.append((logger, handler))
+    return detached
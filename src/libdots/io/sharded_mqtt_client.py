@@ -0,0 +1,302 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+import logging
+import multiprocessing
+import threading
+import traceback
+from multiprocessing.connection import Connection
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
+from typing import Any
+from typing import Literal
+from typing import override
+
+from paho.mqtt.client import Client
+from paho.mqtt.client import MQTTMessage
+
+from ..model.service_calc import ServiceCalc
+from ..types import EsdlId
+from ..types import ModelParametersDescription
+from .input_data_inventory import InputDataInventory
+from .mqtt_client import MqttClient
+from .mqtt_log_handler import detach_mqtt_log_handlers
+from .topic_router import MODEL_PARAMETERS
+from .topic_router import SIMULATION_DONE
+
+ShardEvent = Literal["parameterized", "calculations_done", "error", "finished"]
+"""What a shard reports to the parent process, see :py:class:`ShardedMqttClient`."""
+
+
+def split_esdl_ids(esdl_ids: list[EsdlId], shards: int) -> list[list[EsdlId]]:
+    """Split ``esdl_ids`` in at most ``shards`` consecutive slices of (almost) equal size."""
+    nr_of_shards = max(1, min(shards, len(esdl_ids)))
+    return [
+        esdl_ids[
+            i * len(esdl_ids) // nr_of_shards : (i + 1) * len(esdl_ids) // nr_of_shards
+        ]
+        for i in range(nr_of_shards)
+    ]
+
+
+class ShardedMqttClient(MqttClient):
+    """
+    Runs the esdl_ids of one model in several child processes (shards).
+
+    This process keeps the MQTT identity of the model towards the orchestrator. On ModelParameters it runs
+    :py:meth:`ServiceCalc.setup_shared <libdots.model.service_calc.ServiceCalc.setup_shared>` once, and
+    forks a child process per slice of the esdl_ids, so the children start with the parsed ESDL and
+    everything loaded in ``base_setup``. Each child sets up its own esdl_ids, and has its own
+    :py:class:`InputDataInventory` and MQTT connection to receive the time steps and input data and
+    publish its output data. The children report to this process, which sends a single Parameterized and
+    CalculationsDone once all of them did, and forwards their errors. When a child fails, the others are
+    terminated.
+
+    The children are forked from the thread handling the ModelParameters message, while the paho network
+    thread of this process is running. A forked child only has the forking thread, and inherits the paho
+    client of this process in whatever state the network thread left it, including its socket and
+    possibly held locks. So a child must never use that client: :py:func:`_run_shard` detaches the
+    :py:class:`MqttLogHandler <libdots.io.mqtt_log_handler.MqttLogHandler>` instances before anything
+    else runs, and each child creates its own client.
+
+    :param shards: The maximum number of child processes.
+    :param kwargs: The parameters of :py:class:`MqttClient`, the children use the same ones.
+    """
+
+    def __init__(self, shards: int, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.shards = shards
+        self._shard_client_kwargs = {
+            name: value
+            for name, value in kwargs.items()
+            if name not in ("input_data_inventory", "service_calc")
+        }
+        self._shard_processes: list[BaseProcess] = []
+        self._shard_listener: threading.Thread | None = None
+        self._shards_stopped = False
+        self._nr_parameterized = 0
+        self._nr_calculations_done = 0
+
+    @override
+    def _receive_message(self, client: Client, msg: MQTTMessage) -> list[str]:
+        data_name = self.topic_router.route(msg.topic).data_name
+        if data_name == MODEL_PARAMETERS:
+            model_parameters = self._parse_model_parameters(msg.payload)
+            self.service_calc.setup_shared(model_parameters)
+            self._start_shards(model_parameters)
+        elif data_name == SIMULATION_DONE:
+            # the shards write their own results, wait for them to finish
+            for process in self._shard_processes:
+                process.join()
+            self.sim_logger.info(
+                f"Simulation Orchestrator terminated service: '{self.service_name}: "
+                f"{self.service_calc.model_id}' - '{self.service_calc.simulation_id}'"
+            )
+            client.disconnect()
+        # the shards receive the time steps and input data themselves
+        return []
+
+    def _start_shards(self, model_parameters: ModelParametersDescription):
+        context = multiprocessing.get_context("fork")
+        connections: list[Connection] = []
+        for i, esdl_ids in enumerate(
+            split_esdl_ids(model_parameters["esdl_ids"], self.shards)
+        ):
+            connection, shard_connection = context.Pipe()
+            process = context.Process(
+                target=_run_shard,
+                args=(
+                    self.service_calc,
+                    model_parameters,
+                    esdl_ids,
+                    shard_connection,
+                    self._shard_client_kwargs,
+                ),
+                name=f"shard-{i}",
+            )
+            # forks while the paho network thread runs, the child must not use the inherited client
+            process.start()
+            shard_connection.close()
+            self._shard_processes.append(process)
+            connections.append(connection)
+        self.logger.debug("Started %s shards", len(connections))
+        self._shard_listener = threading.Thread(
+            target=self._listen_to_shards,
+            args=(connections,),
+            name="shard-listener",
+            daemon=True,
+        )
+        self._shard_listener.start()
+
+    def _listen_to_shards(self, connections: list[Connection]):
+        nr_of_shards = len(connections)
+        while connections:
+            for connection in wait(connections):
+                assert isinstance(connection, Connection)
+                try:
+                    event, message = connection.recv()
+                except EOFError:
+                    event, message = "error", "Shard stopped unexpectedly"
+                if event in ("finished", "error"):
+                    connections.remove(connection)
+                self._on_shard_event(event, message, nr_of_shards)
+
+    def _on_shard_event(
+        self, event: ShardEvent, message: str | None, nr_of_shards: int
+    ):
+        if event == "parameterized":
+            self._nr_parameterized += 1
+            if self._nr_parameterized == nr_of_shards:
+                self._send_parameterized()
+        elif event == "calculations_done":
+            self._nr_calculations_done += 1
+            if self._nr_calculations_done == nr_of_shards:
+                self._nr_calculations_done = 0
+                self._send_calculations_done()
+        elif event == "error":
+            if self._shards_stopped:
+                # a shard terminated after the first error
+                return
+            self.logger.error(message)
+            self._send_error_occurred(message or "")
+            self.mqtt_client.disconnect()
+            self._stop_shards()
+
+    def _stop_shards(self):
+        """Terminate the shards still running, they would wait for time steps forever."""
+        self._shards_stopped = True
+        for process in self._shard_processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self._shard_processes:
+            process.join()
+
+
+class ShardMqttClient(MqttClient):
+    """
+    The MQTT client of a shard started by :py:class:`ShardedMqttClient`. It handles the time steps of its
+    esdl_ids like :py:class:`MqttClient`, but reports its lifecycle messages to the parent process.
+
+    :param connection: The connection to the parent process.
+    :param kwargs: The parameters of :py:class:`MqttClient`.
+    """
+
+    def __init__(self, connection: Connection, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.connection = connection
+        self._connection_lock = threading.Lock()
+        self._data_subscription_mid: int | None = None
+        self._data_topics: list[str] = []
+
+    def report(self, event: ShardEvent, message: str | None = None):
+        """Send ``event`` to the parent process."""
+        with self._connection_lock:
+            self.connection.send((event, message))
+
+    @override
+    def wait_for_data(self):
+        def on_subscribe(client: Client, userdata: Any, mid: int, *args: Any):
+            # the parent may only report Parameterized when the data topics are subscribed to
+            if mid == self._data_subscription_mid:
+                self._data_subscription_mid = None
+                # renewed by on_connect from now on
+                self.subscribed_topics.extend(self._data_topics)
+                self.report("parameterized")
+
+        self.mqtt_client.on_subscribe = on_subscribe
+        super().wait_for_data()
+
+    @override
+    def _send_ready_for_processing(self):
+        # the parent process received the model parameters, set up as MqttClient does on receiving them
+        self.service_calc.start_calculation_processes(self.calculation_processes)
+        self.input_data_inventory.set_expected_esdl_ids_for_input_data(
+            self.service_calc.connected_input_esdl_objects_dict
+        )
+        self.topic_router.build(
+            self.input_data_inventory.input_classes,
+            self.input_data_inventory.expected_esdl_ids_dict,
+        )
+        topics = list(
+            dict.fromkeys(
+                f"{main_topic}/{self.service_calc.simulation_id}/{esdl_id}/#"
+                for main_topic, esdl_ids in self.input_data_inventory.expected_esdl_ids_dict.items()
+                for esdl_id in esdl_ids
+            )
+        )
+        if not topics:
+            self.report("parameterized")
+            return
+        # this runs before the connection is acknowledged, so the topics are only added to the
+        # subscribed_topics once subscribed, on_connect would subscribe to them again
+        self._data_topics = topics
+        # subscribe in a single request, its acknowledgement means all topics are subscribed to
+        _, self._data_subscription_mid = self.mqtt_client.subscribe(
+            [(topic, self.qos) for topic in topics]
+        )
+
+    @override
+    def _receive_message(self, client: Client, msg: MQTTMessage) -> list[str]:
+        if self.topic_router.route(msg.topic).data_name == MODEL_PARAMETERS:
+            # handled by the parent process
+            return []
+        return super()._receive_message(client, msg)
+
+    @override
+    def _send_parameterized(self):
+        self.report("parameterized")
+
+    @override
+    def _send_calculations_done(self):
+        self.report("calculations_done")
+
+    @override
+    def _send_error_occurred(self, message: str):
+        self.report("error", message)
+
+
+def _run_shard(
+    service_calc: ServiceCalc[Any],
+    model_parameters: ModelParametersDescription,
+    esdl_ids: list[EsdlId],
+    connection: Connection,
+    client_kwargs: dict[str, Any],
+):
+    """Run a shard, in the child process forked by :py:class:`ShardedMqttClient`."""
+    # the log handlers point to the MQTT client of the parent process, which this process must not use,
+    # so they are detached until the client of this shard exists
+    mqtt_log_handlers = detach_mqtt_log_handlers(
+        [logging.getLogger(), client_kwargs.get("sim_logger", logging.getLogger())]
+    )
+    try:
+        service_calc.setup_esdl_ids(model_parameters, esdl_ids)
+        input_data_inventory = InputDataInventory(
+            service_calc.calculation_function_input_types,
+            service_calc.service_name,
+            service_calc.calculation_function_input_views,
+        )
+        client = ShardMqttClient(
+            connection=connection,
+            input_data_inventory=input_data_inventory,
+            service_calc=service_calc,
+            **client_kwargs,
+        )
+        for logger, handler in mqtt_log_handlers:
+            handler.client = client
+            logger.addHandler(handler)
+        client.wait_for_data()
+    except Exception as ex:
+        connection.send(("error", str(ex) + traceback.format_exc()))
+    connection.send(("finished", None))
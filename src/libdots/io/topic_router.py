@@ -0,0 +1,116 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+import logging
+from collections.abc import Iterable
+from collections.abc import Mapping
+from typing import NamedTuple
+
+from ..types import EsdlId
+from .io_data import IODataInterface
+
+MODEL_PARAMETERS = "model_parameters"
+NEW_STEP = "new_step"
+SIMULATION_DONE = "simulations_done"
+
+LIFECYCLE_MAIN_TOPIC = "/lifecycle/dots-so/model"
+LIFECYCLE_MESSAGES = {
+    "ModelParameters": MODEL_PARAMETERS,
+    "NewStep": NEW_STEP,
+    "SimulationDone": SIMULATION_DONE,
+}
+
+
+class Route(NamedTuple):
+    """Where a received message should go."""
+
+    data_name: str
+    main_topic: str
+    esdl_id: EsdlId
+    input_class: type[IODataInterface] | None = None
+
+
+class TopicRouter:
+    """
+    Routing table for the MQTT topics of a model.
+
+    Received topics are looked up in a dictionary of all topics we expect, built once by
+    :py:meth:`build` after the model setup, instead of splitting and comparing every topic.
+    Topics not in the table (which should be rare) are parsed like before.
+    The topics of output messages are cached per (esdl_id, message class).
+    """
+
+    def __init__(self, simulation_id: str, model_id: str):
+        self.logger = logging.getLogger(__name__)
+        self.simulation_id = simulation_id
+        self.model_id = model_id
+        self.routes: dict[str, Route] = {}
+        self._output_topics: dict[tuple[EsdlId, type[IODataInterface]], str] = {}
+        for message, data_name in LIFECYCLE_MESSAGES.items():
+            topic = f"{LIFECYCLE_MAIN_TOPIC}/{simulation_id}/{model_id}/{message}"
+            self.routes[topic] = Route(data_name, LIFECYCLE_MAIN_TOPIC, "dots-so")
+
+    def build(
+        self,
+        input_classes: Iterable[type[IODataInterface]],
+        expected_esdl_ids_dict: Mapping[str, Iterable[EsdlId]],
+    ):
+        """
+        Add the routes for all input data we expect.
+
+        :param input_classes: The message types the calculation functions take as input.
+        :param expected_esdl_ids_dict: The esdl ids we expect input from, per main topic.
+        """
+        for input_class in dict.fromkeys(input_classes):
+            main_topic = input_class.get_main_topic()
+            data_name = input_class.get_name()
+            if main_topic == LIFECYCLE_MAIN_TOPIC:
+                # NewStep is routed by the lifecycle routes
+                continue
+            for esdl_id in expected_esdl_ids_dict.get(main_topic, ()):
+                topic = f"{main_topic}/{self.simulation_id}/{esdl_id}/{data_name}"
+                # the first calculation's class wins, like the data inventory does.
+                self.routes.setdefault(
+                    topic, Route(data_name, main_topic, esdl_id, input_class)
+                )
+        self.logger.debug("Built routing table with %s topics", len(self.routes))
+
+    def route(self, topic: str) -> Route:
+        """Get the route for a received topic."""
+        route = self.routes.get(topic)
+        if route is None:
+            route = self.parse_topic(topic)
+        return route
+
+    @staticmethod
+    def parse_topic(topic: str) -> Route:
+        """Parse a topic that is not in the routing table."""
+        parts = topic.split("/")
+        data_name = parts[6]
+        if topic.startswith(f"{LIFECYCLE_MAIN_TOPIC}/"):
+            if data_name not in LIFECYCLE_MESSAGES:
+                raise Exception(f"Received unknown lifecycle message: '{data_name}'")
+            return Route(LIFECYCLE_MESSAGES[data_name], LIFECYCLE_MAIN_TOPIC, "dots-so")
+        # first three items separated by '/'
+        return Route(data_name, "/".join(parts[0:4]), parts[5])
+
+    def output_topic(self, esdl_id: EsdlId, output_class: type[IODataInterface]) -> str:
+        """Get the topic to publish a message of ``output_class`` for ``esdl_id`` on."""
+        key = (esdl_id, output_class)
+        topic = self._output_topics.get(key)
+        if topic is None:
+            topic = f"{output_class.get_main_topic()}/{self.simulation_id}/{esdl_id}/{output_class.get_name()}"
+            self._output_topics[key] = topic
+        return topic
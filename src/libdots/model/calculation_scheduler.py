@@ -0,0 +1,147 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+import threading
+from collections.abc import Collection
+from collections.abc import Iterable
+from collections.abc import Mapping
+
+
+def dependency_groups(
+    calc_names: Iterable[str], dependencies: Mapping[str, Collection[str]]
+) -> list[list[str]]:
+    """
+    Split the calculation functions in groups that are (indirectly) connected by dependencies.
+    Calculations in different groups are independent of each other.
+    """
+    group_of: dict[str, list[str]] = {}
+    for calc_name in calc_names:
+        group_of[calc_name] = [calc_name]
+    for calc_name, calc_dependencies in dependencies.items():
+        for dependency in calc_dependencies:
+            if calc_name not in group_of or dependency not in group_of:
+                raise ValueError(
+                    f"Dependency '{calc_name}' on '{dependency}' refers to an unknown calculation function"
+                )
+            group = group_of[calc_name]
+            other_group = group_of[dependency]
+            if group is other_group:
+                continue
+            group.extend(other_group)
+            for name in other_group:
+                group_of[name] = group
+    # list the groups and their calculations in the order of calc_names
+    groups: dict[int, list[str]] = {}
+    for calc_name, group in group_of.items():
+        groups.setdefault(id(group), []).append(calc_name)
+    return list(groups.values())
+
+
+class CalculationScheduler:
+    """
+    Decides which calculation functions of a time step can start.
+
+    A calculation can start once all its input data has been received and the calculations it depends
+    on finished in this time step. The scheduler starts over when all calculations finished.
+
+    :param calc_names: All calculation function names of the service.
+    :param dependencies: Per calculation function, the names of the calculation functions that need to
+        finish before it can start.
+    """
+
+    def __init__(
+        self,
+        calc_names: Iterable[str],
+        dependencies: Mapping[str, Collection[str]] | None = None,
+    ):
+        self.calc_names = list(calc_names)
+        self.dependencies: dict[str, list[str]] = {
+            calc_name: [] for calc_name in self.calc_names
+        }
+        self.dependents: dict[str, list[str]] = {
+            calc_name: [] for calc_name in self.calc_names
+        }
+        for calc_name, calc_dependencies in (dependencies or {}).items():
+            for dependency in calc_dependencies:
+                if (
+                    calc_name not in self.dependencies
+                    or dependency not in self.dependencies
+                ):
+                    raise ValueError(
+                        f"Dependency '{calc_name}' on '{dependency}' refers to an unknown calculation function"
+                    )
+                self.dependencies[calc_name].append(dependency)
+                self.dependents[dependency].append(calc_name)
+        self._check_for_cycles()
+
+        self._lock = threading.Lock()
+        self._inputs_received: set[str] = set()
+        self._started: set[str] = set()
+        self._finished: set[str] = set()
+
+    def inputs_received(self, calc_names: Iterable[str]) -> list[str]:
+        """
+        Mark that ``calc_names`` received all their input data.
+        Returns the calculations that can start now.
+        """
+        calc_names = list(dict.fromkeys(calc_names))
+        with self._lock:
+            self._inputs_received.update(calc_names)
+            return self._start_runnable(calc_names)
+
+    def finished(self, calc_name: str) -> list[str]:
+        """
+        Mark that ``calc_name`` finished.
+        Returns the calculations that can start now, because they were waiting for it.
+        """
+        with self._lock:
+            self._finished.add(calc_name)
+            if len(self._finished) == len(self.calc_names):
+                self._inputs_received.clear()
+                self._started.clear()
+                self._finished.clear()
+                return []
+            return self._start_runnable(self.dependents[calc_name])
+
+    def _start_runnable(self, calc_names: Iterable[str]) -> list[str]:
+        runnable = [
+            calc_name
+            for calc_name in calc_names
+            if calc_name in self._inputs_received
+            and calc_name not in self._started
+            and all(
+                dependency in self._finished
+                for dependency in self.dependencies[calc_name]
+            )
+        ]
+        self._started.update(runnable)
+        return runnable
+
+    def _check_for_cycles(self):
+        # Kahn's algorithm: if not every calculation can be ordered, there is a cycle
+        nr_of_dependencies = {
+            calc_name: len(calc_dependencies)
+            for calc_name, calc_dependencies in self.dependencies.items()
+        }
+        ordered = [calc_name for calc_name, nr in nr_of_dependencies.items() if nr == 0]
+        for calc_name in ordered:
+            for dependent in self.dependents[calc_name]:
+                nr_of_dependencies[dependent] -= 1
+                if nr_of_dependencies[dependent] == 0:
+                    ordered.append(dependent)
+        if len(ordered) != len(self.calc_names):
+            raise ValueError(
+                "The dependencies between the calculation functions contain a cycle"
+            )
@@ -13,12 +13,16 @@
 #      Scene Ltd   - Development of libdots
 #  Manager:
 #      Scene Ltd
+from pathlib import Path
 from typing import Literal
 
+from pydantic import PositiveInt
 from pydantic import SecretStr
 from pydantic_settings import BaseSettings
 from pydantic_settings import SettingsConfigDict
 
+from ..io.message_dispatcher import DispatchMode
+
 
 class ServiceConfig(BaseSettings):
     """
@@ -68,8 +72,66 @@ class ServiceConfig(BaseSettings):
     mqtt_qos: int = 0
     mqtt_username: str = ""
     mqtt_password: SecretStr = SecretStr("")
+    mqtt_dispatch_mode: DispatchMode = "thread"
+    """
+    How received messages are processed, see :py:class:`MessageDispatcher <libdots.io.message_dispatcher.MessageDispatcher>`.
+    ``thread`` starts a thread per message, ``ordered`` processes them in order on a single worker
+    and ``parallel`` processes them on a pool of ``mqtt_dispatch_workers`` threads.
+    """
+    mqtt_dispatch_workers: PositiveInt = 4
+    mqtt_dispatch_queue_size: PositiveInt = 10000
+    mqtt_publish_window: PositiveInt = 100
+    """The maximum number of QoS>0 output messages waiting for an acknowledgement from the broker."""
+    mqtt_output_qos: int = 0
+    """
+    The QoS of the output messages. With QoS>0 the broker acknowledges them, and outputs published while
+    the connection is lost are sent once reconnected.
+    """
+    calculation_workers: PositiveInt = 4
+    """
+    The number of threads running independent calculation functions concurrently, for services declaring
+    :py:attr:`calculation_function_dependencies <libdots.model.service_calc.ServiceCalc.calculation_function_dependencies>`.
+    """
+    calculation_processes: PositiveInt | None = None
+    """
+    The number of worker processes running the
+    :py:attr:`process_calculation_functions <libdots.model.service_calc.ServiceCalc.process_calculation_functions>`,
+    defaults to the number of CPUs.
+    """
+    shards: PositiveInt = 1
+    """
+    The number of processes the esdl_ids of the model are divided over, see
+    :py:class:`ShardedMqttClient <libdots.io.sharded_mqtt_client.ShardedMqttClient>`.
+    ``base_setup`` runs once for all esdl_ids, before the processes are started.
+    Ignored by :py:class:`AsyncBaseService <libdots.model.service.AsyncBaseService>`.
+    """
     influxdb_host: str = ""
     influxdb_port: int = 8086
     influxdb_user: str = ""
     influxdb_password: SecretStr = SecretStr("")
     influxdb_name: str = ""
+    influxdb_stream_batch_steps: PositiveInt | None = None
+    """
+    Write the profile output data to InfluxDB in batches of this many time steps while the simulation
+    runs, instead of all at the end, see :py:attr:`InfluxDBConnector.stream_batch_steps
+    <libdots.model.influxdb_connector.InfluxDBConnector.stream_batch_steps>`.
+    """
+    influxdb_write_batch_size: PositiveInt | None = None
+    """
+    Write the profile output data in requests of at most this many points, sent concurrently, compressed
+    and retried on failure, see :py:class:`InfluxDBWriter <libdots.model.influxdb_writer.InfluxDBWriter>`.
+    By default all points are sent in a single request.
+    """
+    influxdb_write_concurrency: PositiveInt = 4
+    """The maximum number of write requests in flight, when ``influxdb_write_batch_size`` is set."""
+    influxdb_write_retries: PositiveInt = 5
+    """The number of attempts per write request, when ``influxdb_write_batch_size`` is set."""
+    influxdb_write_compress: bool = True
+    """Gzip compress the write requests, when ``influxdb_write_batch_size`` is set."""
+    influxdb_output_dtype: Literal["float64", "float32"] = "float64"
+    """The type of the profile output values kept until they are written, ``float32`` halves their memory."""
+    influxdb_output_directory: Path | None = None
+    """
+    Keep the profile output values in a memory mapped temporary file in this directory instead of in memory,
+    see :py:class:`ProfileOutputBuffer <libdots.model.profile_output_buffer.ProfileOutputBuffer>`.
+    """
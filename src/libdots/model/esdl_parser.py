@@ -15,56 +15,330 @@
 #      Scene Ltd
 
 
+import contextlib
+import hashlib
+import io
 import logging
+import threading
 from base64 import b64decode
+from collections.abc import Iterable
+from collections.abc import Iterator
+from functools import cached_property
+from typing import Any
+from typing import Literal
+from typing import cast
+from typing import override
 
+import numpy
 from esdl import EnergySystem
 from esdl import esdl
 from esdl.esdl_handler import EnergySystemHandler
+from pyecore.resources import URI
 
 from ..types import CalculationServiceDescription
 from ..types import EsdlId
+from ..types import EsdlIdSet
 from ..types import ESDLObject
+from ..types import FrozenEsdlIdSet
 from ..types import ServiceName
+from .esdl_topology import EsdlTopology
+from .esdl_topology import NodeArray
+
+
+class Base64Reader(io.RawIOBase):
+    """
+    A binary stream of the base64 decoded ``data``, decoded a chunk at a time while reading.
+    Like :py:func:`base64.b64decode`, characters outside the base64 alphabet are skipped, and missing
+    padding is accepted.
+
+    :param data: The base64 encoded data.
+    :param chunk_size: The number of characters of ``data`` decoded at a time.
+    """
+
+    def __init__(self, data: str, chunk_size: int = 1 << 20):
+        super().__init__()
+        self.data = data
+        self.chunk_size = chunk_size
+        self._chunks = self._decode()
+        self._chunk = memoryview(b"")
+        self._sha256 = hashlib.sha256()
+
+    @override
+    def readable(self) -> bool:
+        return True
+
+    @override
+    def readinto(self, buffer: Any) -> int:
+        while not self._chunk:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._sha256.update(chunk)
+            self._chunk = memoryview(chunk)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+    def hexdigest(self) -> str:
+        """The SHA-256 of the decoded data read so far."""
+        return self._sha256.hexdigest()
+
+    def _decode(self) -> Iterator[bytes]:
+        remainder = b""
+        for start in range(0, len(self.data), self.chunk_size):
+            encoded = remainder + self.data[start : start + self.chunk_size].encode(
+                "ascii"
+            ).translate(None, _NON_BASE64_BYTES)
+            # base64 decodes groups of 4 characters
+            end = len(encoded) - len(encoded) % 4
+            remainder = encoded[end:]
+            yield b64decode(encoded[:end])
+        if remainder:
+            yield b64decode(remainder + b"=" * (-len(remainder) % 4))
+
+
+# everything but the base64 alphabet, including the padding which is added when needed
+_NON_BASE64_BYTES = bytes(
+    set(range(256))
+    - set(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/")
+)
+
+
+class StreamURI(URI):
+    """A pyecore URI reading a resource from a binary stream."""
+
+    def __init__(self, uri: str, stream: io.RawIOBase):
+        super().__init__(uri)
+        self.stream = stream
+
+    @override
+    def create_instream(self) -> io.RawIOBase:
+        return self.stream
+
+
+class EsdlIndex:
+    """
+    The ESDL objects of an energy system by id and by type, built in a single walk over the system.
+
+    :param energy_system: The energy system to index. Changes to it afterwards are not indexed.
+    """
+
+    def __init__(self, energy_system: EnergySystem):
+        self.energy_system = energy_system
+        # all contents of the energy system, in document order
+        self.contents: list[ESDLObject] = []
+        self.by_id: dict[EsdlId, ESDLObject] = {energy_system.id: energy_system}
+        self.by_type: dict[str, list[ESDLObject]] = {
+            type(energy_system).__name__: [energy_system]
+        }
+        for obj in energy_system.eAllContents():
+            if isinstance(obj, ESDLObject):
+                self.contents.append(obj)
+                # the first object with an id wins, like searching the contents did
+                self.by_id.setdefault(obj.id, obj)
+                self.by_type.setdefault(type(obj).__name__, []).append(obj)
+
+    @cached_property
+    def topology(self) -> EsdlTopology:
+        """The port connectivity of the energy system, built on first use. Node 0 is the energy system."""
+        return EsdlTopology([self.energy_system, *self.contents])
 
 
 class ESDLParser:
+    """
+    Finds the ESDL objects and their connected calculation services.
+    The lookups are cached, and safe to use from multiple threads, like the ``thread``
+    :py:attr:`esdl_object_setup_mode <libdots.model.service_calc.ServiceCalc.esdl_object_setup_mode>`.
+    """
+
     def __init__(self, receives_service_names_list: list[ServiceName]):
         self.receives_service_names_list = receives_service_names_list
         self.logger = logging.getLogger(__name__)
+        # guards filling and resetting the caches below, they are replaced instead of modified
+        # so a reference taken under the lock stays consistent
+        self._cache_lock = threading.RLock()
+        self._index: EsdlIndex | None = None
+        # per ESDL type, the received calculation service of _calculation_services
+        self._calculation_services: list[CalculationServiceDescription] | None = None
+        self._services_by_esdl_type: dict[str, ServiceName] = {}
+        # the connected ESDL objects found in the whole energy system of _index, for _calculation_services
+        self._system_wide_connected: dict[
+            Literal["all", "non_connected"], dict[str, FrozenEsdlIdSet]
+        ] = {}
+        # per type code of the topology of _index, the index of its service in _service_names or -1
+        self._service_codes: NodeArray | None = None
+        self._service_names: list[ServiceName] = []
+        # the handler that loaded the energy system in get_energy_system, it keeps its ids
+        self._esdl_handler: EnergySystemHandler | None = None
+        # the SHA-256 of the ESDL read by get_energy_system
+        self.esdl_digest: str | None = None
 
     def get_energy_system(self, esdl_base64string: str) -> EnergySystem:
-        esdl_string = b64decode(esdl_base64string + b"==".decode("utf-8")).decode(
-            "utf-8"
+        """
+        Parse the base64 encoded ESDL. It is decoded while parsing, so the decoded text is never in memory
+        as a whole. Sets :py:attr:`esdl_digest`.
+        """
+        reader = Base64Reader(esdl_base64string)
+        self._esdl_handler = EnergySystemHandler()
+        energy_system = self._esdl_handler.load_uri(
+            StreamURI("from_base64.esdl", reader)
         )
-        esh = EnergySystemHandler()
-        esh.load_from_string(esdl_string)
-        return esh.get_energy_system()
+        self.esdl_digest = reader.hexdigest()
+        index = EsdlIndex(energy_system)
+        with self._cache_lock:
+            self._index = index
+            self._reset_caches()
+        return energy_system
+
+    def get_index(self, energy_system: EnergySystem) -> EsdlIndex:
+        """The index of ``energy_system``, built when it was loaded or on first use."""
+        with self._cache_lock:
+            index = self._index
+            if index is None or index.energy_system is not energy_system:
+                index = self._index = EsdlIndex(energy_system)
+                self._reset_caches()
+            return index
+
+    def get_topology(self, energy_system: EnergySystem) -> EsdlTopology:
+        """The port connectivity of ``energy_system``."""
+        with self._cache_lock:
+            # built on first use, once
+            return self.get_index(energy_system).topology
+
+    def _reset_caches(self):
+        # called with _cache_lock held
+        self._system_wide_connected = {}
+        self._service_codes = None
+
+    def get_services_by_esdl_type(
+        self, calculation_services: list[CalculationServiceDescription]
+    ) -> dict[str, ServiceName]:
+        """
+        Per ESDL type, the calculation service this service receives input data from, built once for the
+        ``calculation_services`` of the model.
+        """
+        with self._cache_lock:
+            if self._calculation_services is not calculation_services:
+                services_by_esdl_type: dict[str, ServiceName] = {}
+                for calc_service in calculation_services:
+                    # the first calculation service for a type is used
+                    services_by_esdl_type.setdefault(
+                        calc_service["esdl_type"], calc_service["calc_service_name"]
+                    )
+                self._services_by_esdl_type = {
+                    esdl_type: service_name
+                    for esdl_type, service_name in services_by_esdl_type.items()
+                    if service_name in self.receives_service_names_list
+                }
+                self._calculation_services = calculation_services
+                self._reset_caches()
+            return self._services_by_esdl_type
 
     def get_model_esdl_object(
         self, esdl_id: EsdlId, energy_system: EnergySystem
     ) -> ESDLObject:
-        if energy_system.id == esdl_id:
-            return energy_system
-        # Iterate over all contents of the EnergySystem
-        for obj in energy_system.eAllContents():
-            if isinstance(obj, ESDLObject) and obj.id == esdl_id:
-                return obj
-        raise OSError(f"ESDL_ID '{esdl_id}' not found in provided ESDL file")
+        try:
+            return self.get_index(energy_system).by_id[esdl_id]
+        except KeyError:
+            raise OSError(f"ESDL_ID '{esdl_id}' not found in provided ESDL file")
+
+    def prune_energy_system(
+        self, energy_system: EnergySystem, esdl_ids: Iterable[EsdlId]
+    ) -> int:
+        """
+        Remove the assets of ``energy_system`` that are not needed, to free their memory:
+        the assets are kept when they are in ``esdl_ids``, are connected to a port of one of them,
+        contain one of them or are contained by one of them.
+        Everything that is not an asset, like the areas and the profiles in the energy system information,
+        is kept. The connections of the kept assets to the removed ones are removed too.
+
+        :return: The number of removed assets, not counting the assets contained by them.
+        """
+        index = self.get_index(energy_system)
+        topology = index.topology
+        keep_ids: set[EsdlId] = set()
+        for esdl_id in esdl_ids:
+            keep_ids.add(esdl_id)
+            node = topology.node(esdl_id)
+            for neighbours in topology.inputs(node), topology.outputs(node):
+                nodes = cast(list[int], neighbours.tolist())
+                keep_ids.update(topology.esdl_ids[n] for n in nodes)
+
+        # the objects containing a kept object, by identity
+        containers: set[int] = set()
+        for esdl_id in keep_ids:
+            container = index.by_id[esdl_id].eContainer()
+            while container is not None and id(container) not in containers:
+                containers.add(id(container))
+                container = container.eContainer()
+
+        # the contents are in document order, so containers come before their contents
+        kept_assets: set[int] = set()
+        removed: list[esdl.Asset] = []
+        removed_ids: set[int] = set()
+        for obj in index.contents:
+            container_id = id(obj.eContainer())
+            if container_id in removed_ids:
+                # removed with its container
+                removed_ids.add(id(obj))
+            elif not isinstance(obj, esdl.Asset):
+                continue
+            elif (
+                obj.id in keep_ids
+                or id(obj) in containers
+                or container_id in kept_assets
+            ):
+                kept_assets.add(id(obj))
+            else:
+                removed.append(obj)
+                removed_ids.add(id(obj))
+
+        handler = self._esdl_handler
+        if handler is not None and handler.get_energy_system() is not energy_system:
+            handler = None
+        for asset in removed:
+            if handler is not None:
+                # the objects can still be found by id in the resource of the energy system
+                for obj in [asset, *asset.eAllContents()]:
+                    obj_id = getattr(obj, "id", None)
+                    if isinstance(obj_id, str):
+                        # with duplicate ids, only one of the objects is found by id
+                        with contextlib.suppress(KeyError):
+                            handler.remove_obj_by_id(obj_id)
+            # removes the asset from its container and all references to it and its contents
+            asset.delete()
+
+        # index what is left
+        index = EsdlIndex(energy_system)
+        with self._cache_lock:
+            self._index = index
+            self._reset_caches()
+        self.logger.debug("Removed %s assets from the energy system", len(removed))
+        return len(removed)
+
+    def get_esdl_objects_by_type(
+        self, esdl_type: str, energy_system: EnergySystem
+    ) -> list[ESDLObject]:
+        """The ESDL objects of type ``esdl_type`` (the class name, like ``EnergyDemand``) in ``energy_system``."""
+        return self.get_index(energy_system).by_type.get(esdl_type, [])
 
     def get_connected_input_esdl_objects(
         self,
         esdl_id: EsdlId,
         calculation_services: list[CalculationServiceDescription],
         energy_system: EnergySystem,
-    ) -> dict[str, list[EsdlId]]:
+    ) -> dict[str, EsdlIdSet]:
         model_esdl_obj = self.get_model_esdl_object(esdl_id, energy_system)
 
-        connected_input_esdl_objects: dict[str, list[EsdlId]] = {}
+        connected_input_esdl_objects: dict[str, EsdlIdSet] = {}
 
         if isinstance(model_esdl_obj, esdl.EnergyAsset):
             self.add_calc_services_from_ports(
-                calculation_services, connected_input_esdl_objects, model_esdl_obj
+                calculation_services,
+                connected_input_esdl_objects,
+                model_esdl_obj,
+                energy_system,
             )
             self.add_calc_services_from_non_connected_objects(
                 calculation_services, connected_input_esdl_objects, energy_system
@@ -80,114 +354,158 @@ class ESDLParser:
         esdl_id: EsdlId,
         calculation_services: list[CalculationServiceDescription],
         energy_system: EnergySystem,
-    ) -> dict[str, list[EsdlId]]:
+    ) -> dict[str, EsdlIdSet]:
         model_esdl_obj = self.get_model_esdl_object(esdl_id, energy_system)
 
-        connected_output_esdl_objects: dict[str, list[EsdlId]] = {}
+        connected_output_esdl_objects: dict[str, EsdlIdSet] = {}
 
         if isinstance(model_esdl_obj, esdl.EnergyAsset):
             self.add_calc_services_from_output_ports(
-                calculation_services, connected_output_esdl_objects, model_esdl_obj
+                calculation_services,
+                connected_output_esdl_objects,
+                model_esdl_obj,
+                energy_system,
             )
         return connected_output_esdl_objects
 
     def add_calc_services_from_ports(
         self,
         calculation_services: list[CalculationServiceDescription],
-        connected_input_esdl_objects: dict[str, list[EsdlId]],
+        connected_input_esdl_objects: dict[str, EsdlIdSet],
         model_esdl_asset: esdl.EnergyAsset,
+        energy_system: esdl.EnergySystem,
     ):
-        # Iterate over all ports of this asset
-        for port in model_esdl_asset.port:
-            # only InPorts to find connected receiving services
-            if isinstance(port, esdl.InPort):
-                # Iterate over all connected ports of this port
-                for connected_port in port.connectedTo:
-                    # Get the asset to which the connected port belongs to
-                    connected_asset = connected_port.eContainer()
-                    self.add_esdl_object(
-                        connected_input_esdl_objects,
-                        connected_asset,
-                        calculation_services,
-                    )
+        # the assets connected to the InPorts of this asset
+        topology = self.get_topology(energy_system)
+        self._add_nodes(
+            connected_input_esdl_objects,
+            topology.inputs(topology.node(model_esdl_asset.id)),
+            calculation_services,
+            topology,
+        )
 
     def add_calc_services_from_output_ports(
         self,
         calculation_services: list[CalculationServiceDescription],
-        connected_input_esdl_objects: dict[str, list[EsdlId]],
+        connected_input_esdl_objects: dict[str, EsdlIdSet],
         model_esdl_asset: esdl.EnergyAsset,
+        energy_system: esdl.EnergySystem,
     ):
-        # Iterate over all ports of this asset
-        for port in model_esdl_asset.port:
-            # only InPorts to find connected receiving services
-            if isinstance(port, esdl.OutPort):
-                # Iterate over all connected ports of this port
-                for connected_port in port.connectedTo:
-                    # Get the asset to which the connected port belongs to
-                    connected_asset = connected_port.eContainer()
-                    self.add_esdl_object(
-                        connected_input_esdl_objects,
-                        connected_asset,
-                        calculation_services,
-                    )
+        # the assets connected to the OutPorts of this asset
+        topology = self.get_topology(energy_system)
+        self._add_nodes(
+            connected_input_esdl_objects,
+            topology.outputs(topology.node(model_esdl_asset.id)),
+            calculation_services,
+            topology,
+        )
 
     def add_calc_services_from_non_connected_objects(
         self,
         calculation_services: list[CalculationServiceDescription],
-        connected_input_esdl_objects: dict[str, list[EsdlId]],
-        energy_system: ESDLObject,
+        connected_input_esdl_objects: dict[str, EsdlIdSet],
+        energy_system: esdl.EnergySystem,
     ):
-        for esdl_obj in energy_system.eAllContents():
-            if not isinstance(esdl_obj, esdl.EnergyAsset) and isinstance(
-                esdl_obj, ESDLObject
-            ):
-                self.add_esdl_object(
-                    connected_input_esdl_objects, esdl_obj, calculation_services
-                )
-        self.add_esdl_object(
-            connected_input_esdl_objects, energy_system, calculation_services
+        self._add_system_wide_connected(
+            connected_input_esdl_objects,
+            "non_connected",
+            calculation_services,
+            energy_system,
         )
 
     def add_calc_services_from_all_objects(
         self,
         calculation_services: list[CalculationServiceDescription],
-        connected_input_esdl_objects: dict[str, list[EsdlId]],
+        connected_input_esdl_objects: dict[str, EsdlIdSet],
+        energy_system: esdl.EnergySystem,
+    ):
+        self._add_system_wide_connected(
+            connected_input_esdl_objects, "all", calculation_services, energy_system
+        )
+
+    def _add_system_wide_connected(
+        self,
+        connected_input_esdl_objects: dict[str, EsdlIdSet],
+        objects: Literal["all", "non_connected"],
+        calculation_services: list[CalculationServiceDescription],
         energy_system: esdl.EnergySystem,
     ):
-        for esdl_obj in energy_system.eAllContents():
-            if isinstance(esdl_obj, ESDLObject):
-                self.add_esdl_object(
-                    connected_input_esdl_objects, esdl_obj, calculation_services
+        # the same for every esdl_id, so found once and shared
+        with self._cache_lock:
+            self.get_services_by_esdl_type(calculation_services)
+            topology = self.get_topology(energy_system)
+            if objects not in self._system_wide_connected:
+                system_wide_connected: dict[str, EsdlIdSet] = {}
+                # all contents of the energy system, which is node 0
+                nodes = numpy.arange(1, len(topology), dtype=numpy.int32)
+                if objects == "non_connected":
+                    nodes = numpy.append(nodes[~topology.is_asset[nodes]], 0)
+                self._add_nodes(
+                    system_wide_connected, nodes, calculation_services, topology
+                )
+                self._system_wide_connected[objects] = {
+                    service_name: FrozenEsdlIdSet(esdl_ids)
+                    for service_name, esdl_ids in system_wide_connected.items()
+                }
+            found = self._system_wide_connected[objects]
+        for service_name, esdl_ids in found.items():
+            if service_name in connected_input_esdl_objects:
+                connected_input_esdl_objects[service_name].update(esdl_ids)
+            else:
+                # not copied, the shared sets are frozen
+                connected_input_esdl_objects[service_name] = esdl_ids
+
+    def _add_nodes(
+        self,
+        connected_input_esdl_objects: dict[str, EsdlIdSet],
+        nodes: NodeArray,
+        calculation_services: list[CalculationServiceDescription],
+        topology: EsdlTopology,
+    ):
+        with self._cache_lock:
+            services_by_esdl_type = self.get_services_by_esdl_type(calculation_services)
+            if self._service_codes is None:
+                self._service_names = list(
+                    dict.fromkeys(services_by_esdl_type.values())
+                )
+                self._service_codes = numpy.array(
+                    [
+                        (
+                            self._service_names.index(services_by_esdl_type[esdl_type])
+                            if esdl_type in services_by_esdl_type
+                            else -1
+                        )
+                        for esdl_type in topology.esdl_types
+                    ],
+                    numpy.int32,
                 )
+            codes, service_names = self._service_codes, self._service_names
+        # the calculation service of each node, by its type
+        service_codes = codes[topology.type_codes[nodes]]
+        received = service_codes >= 0
+        received_nodes = cast(list[int], nodes[received].tolist())
+        received_service_codes = cast(list[int], service_codes[received].tolist())
+        for node, service_code in zip(received_nodes, received_service_codes):
+            connected_input_esdl_objects.setdefault(service_names[service_code], {})[
+                f"{topology.esdl_ids[node]}"
+            ] = None
 
     def add_esdl_object(
         self,
-        connected_input_esdl_objects: dict[str, list[EsdlId]],
+        connected_input_esdl_objects: dict[str, EsdlIdSet],
         esdl_obj: ESDLObject,
         calculation_services: list[CalculationServiceDescription],
     ):
         # find calculation service for ESDL object type
         current_esdl_type = type(esdl_obj).__name__
 
-        calc_service = next(
-            (
-                calc_service
-                for calc_service in calculation_services
-                if calc_service["esdl_type"] == current_esdl_type
-            ),
-            None,
+        service_name = self.get_services_by_esdl_type(calculation_services).get(
+            current_esdl_type
         )
 
-        if (
-            calc_service
-            and calc_service["calc_service_name"] in self.receives_service_names_list
-        ):
-            service_name = calc_service["calc_service_name"]
+        if service_name is not None:
             esdl_id = f"{str(esdl_obj.id)}"
-            if service_name not in tuple(connected_input_esdl_objects):
-                connected_input_esdl_objects[service_name] = [esdl_id]
-            elif esdl_id not in connected_input_esdl_objects[service_name]:
-                connected_input_esdl_objects[service_name].append(esdl_id)
+            connected_input_esdl_objects.setdefault(service_name, {})[esdl_id] = None
         else:
             self.logger.debug(
                 "No calculation service found for ESDL type %s", current_esdl_type
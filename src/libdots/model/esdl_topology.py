@@ -0,0 +1,158 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+"""The port connectivity of an energy system as a compact graph."""
+
+from collections.abc import Sequence
+
+import numpy
+import numpy.typing
+from esdl import esdl
+
+from ..types import EsdlId
+from ..types import ESDLObject
+
+NodeArray = numpy.typing.NDArray[numpy.int32]
+"""Node numbers of an :py:class:`EsdlTopology`."""
+
+
+class EsdlTopology:
+    """
+    The ESDL objects of an energy system numbered 0..n-1, with the connections between the ports of the
+    assets as CSR (compressed sparse row) adjacency arrays.
+
+    The in-edges of node ``i`` are ``in_indices[in_indptr[i]:in_indptr[i + 1]]``: the assets connected to
+    the InPorts of ``i``, in port order and without duplicates. The out-edges are stored the same way for
+    the OutPorts. Calculation services can use it for graph traversals, for instance to aggregate over all
+    assets upstream of a node:
+
+    .. code-block:: python
+
+        topology = self.esdl_topology
+        upstream_ids = [topology.esdl_ids[n] for n in topology.upstream(topology.node(esdl_id))]
+
+    :param esdl_objects: The ESDL objects of the energy system, the energy system itself first.
+    """
+
+    def __init__(self, esdl_objects: Sequence[ESDLObject]):
+        self.esdl_ids: list[EsdlId] = [obj.id for obj in esdl_objects]
+        self.nodes_by_id: dict[EsdlId, int] = {}
+        for node, esdl_id in enumerate(self.esdl_ids):
+            # the first object with an id wins, like in the EsdlIndex
+            self.nodes_by_id.setdefault(esdl_id, node)
+
+        # the type of each node, as a code into esdl_types
+        type_codes: dict[str, int] = {}
+        self.type_codes: NodeArray = numpy.fromiter(
+            (
+                type_codes.setdefault(type(obj).__name__, len(type_codes))
+                for obj in esdl_objects
+            ),
+            numpy.int32,
+            len(esdl_objects),
+        )
+        self.esdl_types: list[str] = list(type_codes)
+        self.is_asset = numpy.fromiter(
+            (isinstance(obj, esdl.EnergyAsset) for obj in esdl_objects),
+            numpy.bool_,
+            len(esdl_objects),
+        )
+
+        # the ports refer to the objects themselves, which can share an id
+        nodes_by_object = {id(obj): node for node, obj in enumerate(esdl_objects)}
+        in_indptr = [0]
+        in_indices: list[int] = []
+        out_indptr = [0]
+        out_indices: list[int] = []
+        for obj in esdl_objects:
+            # insertion-ordered sets of connected nodes
+            in_nodes: dict[int, None] = {}
+            out_nodes: dict[int, None] = {}
+            if isinstance(obj, esdl.EnergyAsset):
+                for port in obj.port:
+                    if isinstance(port, esdl.InPort):
+                        nodes = in_nodes
+                    elif isinstance(port, esdl.OutPort):
+                        nodes = out_nodes
+                    else:
+                        continue
+                    for connected_port in port.connectedTo:
+                        node = nodes_by_object.get(id(connected_port.eContainer()))
+                        if node is not None:
+                            nodes[node] = None
+            in_indices.extend(in_nodes)
+            in_indptr.append(len(in_indices))
+            out_indices.extend(out_nodes)
+            out_indptr.append(len(out_indices))
+        self.in_indptr: NodeArray = numpy.array(in_indptr, numpy.int32)
+        self.in_indices: NodeArray = numpy.array(in_indices, numpy.int32)
+        self.out_indptr: NodeArray = numpy.array(out_indptr, numpy.int32)
+        self.out_indices: NodeArray = numpy.array(out_indices, numpy.int32)
+
+    def __len__(self) -> int:
+        return len(self.esdl_ids)
+
+    def node(self, esdl_id: EsdlId) -> int:
+        """The node number of ``esdl_id``."""
+        return self.nodes_by_id[esdl_id]
+
+    def type_code(self, esdl_type: str) -> int | None:
+        """The code of ``esdl_type`` (the class name, like ``EnergyDemand``) in :py:attr:`type_codes`."""
+        try:
+            return self.esdl_types.index(esdl_type)
+        except ValueError:
+            return None
+
+    def inputs(self, node: int) -> NodeArray:
+        """The nodes connected to the InPorts of ``node``."""
+        return self.in_indices[self.in_indptr[node] : self.in_indptr[node + 1]]
+
+    def outputs(self, node: int) -> NodeArray:
+        """The nodes connected to the OutPorts of ``node``."""
+        return self.out_indices[self.out_indptr[node] : self.out_indptr[node + 1]]
+
+    def upstream(self, node: int) -> NodeArray:
+        """All nodes ``node`` receives from, directly or through other nodes, nearest first."""
+        return self._reachable(self.in_indptr, self.in_indices, node)
+
+    def downstream(self, node: int) -> NodeArray:
+        """All nodes ``node`` sends to, directly or through other nodes, nearest first."""
+        return self._reachable(self.out_indptr, self.out_indices, node)
+
+    def _reachable(self, indptr: NodeArray, indices: NodeArray, node: int) -> NodeArray:
+        visited = numpy.zeros(len(self), numpy.bool_)
+        visited[node] = True
+        reached: list[NodeArray] = []
+        frontier = numpy.array([node], numpy.int32)
+        while len(frontier):
+            neighbours = _gather(indptr, indices, frontier)
+            # keep the first occurrence of each node not visited yet
+            neighbours = neighbours[~visited[neighbours]]
+            _, first = numpy.unique(neighbours, return_index=True)
+            frontier = neighbours[numpy.sort(first)]
+            visited[frontier] = True
+            reached.append(frontier)
+        return numpy.concatenate(reached)
+
+
+def _gather(indptr: NodeArray, indices: NodeArray, nodes: NodeArray) -> NodeArray:
+    """The concatenated CSR rows of ``nodes``."""
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    ends = numpy.cumsum(lengths)
+    positions = numpy.arange(ends[-1] if len(ends) else 0) + numpy.repeat(
+        starts - ends + lengths, lengths
+    )
+    return indices[positions]
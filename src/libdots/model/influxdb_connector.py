@@ -15,10 +15,14 @@
 #      Scene Ltd
 
 import logging
+import threading
 from collections.abc import Iterable
+from collections.abc import Sequence
 from datetime import datetime
 from datetime import timedelta
 from datetime import timezone as tz
+from pathlib import Path
+from queue import Queue
 from typing import Any
 
 import numpy
@@ -26,10 +30,25 @@ from influxdb import InfluxDBClient
 
 from ..types import EsdlId
 from ..types import ESDLObject
+from .influxdb_writer import InfluxDBWriter
+from .line_protocol import LineProtocolEncoder
+from .profile_output_buffer import ProfileOutputBuffer
+from .profile_output_buffer import ProfileOutputData
 
 
 class InfluxDBConnector:
-    """A connector writes data to an InfluxDB database."""
+    """
+    A connector writes data to an InfluxDB database.
+
+    The profile output data is kept in a :py:class:`ProfileOutputBuffer
+    <libdots.model.profile_output_buffer.ProfileOutputBuffer>`, :py:attr:`profile_output_data`
+    holds views on it per esdl_id and output name. An array replaced in it holds all time steps, it is
+    copied into the buffer before its time steps are written.
+    By default the profile output data of all time steps is kept and written by
+    :py:meth:`write_output` at the end of the simulation. When :py:attr:`stream_batch_steps` is set,
+    only that many time steps are kept: once the data of a later time step is set, the completed
+    time steps are written in the background while the simulation continues.
+    """
 
     def __init__(
         self,
@@ -57,12 +76,53 @@ class InfluxDBConnector:
         self.start_date: datetime | None = None
         self.time_step_seconds: int | None = None
         self.nr_of_time_steps: int | None = None
-        self.profile_output_data: dict[
-            EsdlId,
-            dict[str, list[Any] | numpy.typing.NDArray[Any]],
-        ] = {}
+        self.profile_output_data: ProfileOutputData = {}
         self.summary_output_data: dict[EsdlId, dict[str, float]] = {}
         self.esdl_objects: dict[EsdlId, ESDLObject] | None = None
+        self.profile_output_buffer: ProfileOutputBuffer | None = None
+        self.profile_output_dtype: numpy.typing.DTypeLike = numpy.float64
+        """
+        The type of the profile output values, ``float32`` halves the memory at the cost of precision.
+        Set this before :py:meth:`init_profile_output_data`.
+        """
+        self.profile_output_directory: Path | None = None
+        """
+        When set, the profile output values are stored in a memory mapped temporary file in this
+        directory instead of in memory. Set this before :py:meth:`init_profile_output_data`.
+        """
+        # the views on the profile output buffer, to find replaced arrays in profile_output_data
+        self._profile_output_views: ProfileOutputData = {}
+        self._line_protocol_encoder: LineProtocolEncoder | None = None
+
+        self.stream_batch_steps: int | None = None
+        """
+        The number of time steps written at once while the simulation runs, ``None`` to write all
+        time steps at the end. Set this before :py:meth:`init_profile_output_data`.
+        """
+        self.stream_queue_size = 2
+        """The maximum number of batches waiting for the background writer, before setting data blocks."""
+        self.write_batch_size: int | None = None
+        """
+        The maximum number of points per request when writing the profile output data, ``None`` to send
+        them in one request. When set, the requests go through an :py:class:`InfluxDBWriter
+        <libdots.model.influxdb_writer.InfluxDBWriter>` using the settings below.
+        Set this before the first write.
+        """
+        self.write_concurrency = 4
+        """The maximum number of requests in flight."""
+        self.write_retries = 5
+        """The number of attempts per request."""
+        self.write_compress = True
+        """Gzip compress the requests."""
+        self._batch_writer: InfluxDBWriter | None = None
+        # the number of time steps written (or queued to be written) while streaming
+        self._flushed_steps = 0
+        self._flush_lock = threading.Lock()
+        self._write_queue: (
+            Queue[tuple[numpy.typing.NDArray[Any], int] | None] | None
+        ) = None
+        self._writer: threading.Thread | None = None
+        self._writer_error: Exception | None = None
 
     @property
     def client(self) -> InfluxDBClient:
@@ -100,10 +160,43 @@ class InfluxDBConnector:
             msgs, database=self.influx_database_name, time_precision="s"
         )
 
+    @property
+    def batch_writer(self) -> InfluxDBWriter | None:
+        """The writer of the profile output data, when :py:attr:`write_batch_size` is set."""
+        if self._batch_writer is None and self.write_batch_size is not None:
+            self._batch_writer = InfluxDBWriter(
+                f"http://{self.influx_host}:{self.influx_port}",
+                self.influx_database_name,
+                self.influx_user,
+                self.influx_password,
+                batch_size=self.write_batch_size,
+                concurrency=self.write_concurrency,
+                retries=self.write_retries,
+                compress=self.write_compress,
+            )
+        return self._batch_writer
+
+    def write_lines(self, data: bytes):
+        """Send ``data``, encoded in the line protocol with timestamps in seconds, to the database."""
+        if self.batch_writer is not None:
+            self.batch_writer.write_lines(data)
+            return
+        self.client.request(
+            url="write",
+            method="POST",
+            params={"db": self.influx_database_name, "precision": "s"},
+            data=data,
+            expected_response_code=204,
+            headers={"Content-Type": "application/octet-stream"},
+        )
+
     def close(self):
         if self._client is not None:
             self._client.close()
         self._client = None
+        if self._batch_writer is not None:
+            self._batch_writer.close()
+        self._batch_writer = None
 
     def init_profile_output_data(
         self,
@@ -123,14 +216,33 @@ class InfluxDBConnector:
         self.start_date = start_date
         self.time_step_seconds = time_step_seconds
         self.nr_of_time_steps = nr_of_time_steps
+        self.profile_output_buffer = ProfileOutputBuffer(
+            esdl_ids,
+            output_names,
+            self._buffered_steps,
+            self.profile_output_dtype,
+            self.profile_output_directory,
+        )
+        self._profile_output_views = self.profile_output_buffer.views()
+        for esdl_id, views in self._profile_output_views.items():
+            self.profile_output_data[esdl_id] = dict(views)
         for esdl_id in esdl_ids:
-            self.profile_output_data[esdl_id] = {}
-            for output_name in output_names:
-                self.profile_output_data[esdl_id][output_name] = numpy.zeros(
-                    self.nr_of_time_steps
-                )
             self.summary_output_data[esdl_id] = {}
         self.esdl_objects = esdl_objects
+        self._line_protocol_encoder = LineProtocolEncoder(
+            esdl_type, [self._tags(esdl_id) for esdl_id in esdl_ids], output_names
+        )
+        self._flushed_steps = 0
+        if self.stream_batch_steps is not None:
+            self._start_writer()
+
+    @property
+    def _buffered_steps(self) -> int:
+        """The number of time steps kept in the :py:attr:`profile_output_buffer`."""
+        assert self.nr_of_time_steps is not None, "We do not have a nr_of_time_steps"
+        if self.stream_batch_steps is None:
+            return self.nr_of_time_steps
+        return min(self.stream_batch_steps, self.nr_of_time_steps)
 
     def set_time_step_data_point(
         self, esdl_id: EsdlId, output_name: str, time_step_nr: int, value: float
@@ -138,45 +250,266 @@ class InfluxDBConnector:
         if numpy.isnan(value):
             self.logger.warning("Value for %s is nan, changing to 0.0", output_name)
             value = 0.0
-        self.profile_output_data[esdl_id][output_name][time_step_nr - 1] = float(value)
+        assert self.profile_output_buffer is not None, "The output is not initialized"
+        buffer = self.profile_output_buffer
+        slot = self._time_step_slot(time_step_nr)
+        if slot is None:
+            self.logger.warning(
+                "Time step %s of %s was already written, ignoring %s",
+                time_step_nr,
+                esdl_id,
+                output_name,
+            )
+            return
+        buffer.values[
+            buffer.esdl_indices[esdl_id], buffer.output_indices[output_name], slot
+        ] = value
+
+    def set_time_step_data_points(
+        self,
+        output_name: str,
+        time_step_nr: int,
+        values: numpy.typing.ArrayLike,
+        esdl_ids: Sequence[EsdlId] | None = None,
+    ):
+        """
+        Set ``output_name`` of time step ``time_step_nr`` for many esdl_ids at once.
+        NaN values are changed to 0.0, with a single warning.
+
+        :param values: The value per esdl_id.
+        :param esdl_ids: The esdl_ids of ``values``, by default the esdl_ids passed to
+            :py:meth:`init_profile_output_data`, in that order.
+        """
+        assert self.profile_output_buffer is not None, "The output is not initialized"
+        buffer = self.profile_output_buffer
+        values = self._replace_nan(values, output_name)
+        slot = self._time_step_slot(time_step_nr)
+        if slot is None:
+            self.logger.warning(
+                "Time step %s was already written, ignoring %s",
+                time_step_nr,
+                output_name,
+            )
+            return
+        rows = (
+            slice(None)
+            if esdl_ids is None
+            else [buffer.esdl_indices[esdl_id] for esdl_id in esdl_ids]
+        )
+        buffer.values[rows, buffer.output_indices[output_name], slot] = values
+
+    def set_time_step_data_range(
+        self,
+        esdl_id: EsdlId,
+        output_name: str,
+        first_time_step_nr: int,
+        values: numpy.typing.ArrayLike,
+    ):
+        """
+        Set ``output_name`` of ``esdl_id`` for consecutive time steps, from ``first_time_step_nr`` on.
+        NaN values are changed to 0.0, with a single warning.
+        When streaming, the time steps must fit in the :py:attr:`stream_batch_steps` kept.
+        """
+        assert self.profile_output_buffer is not None, "The output is not initialized"
+        buffer = self.profile_output_buffer
+        values = self._replace_nan(values, output_name)
+        nr_of_steps = len(values)
+        if self.stream_batch_steps is None:
+            slots = slice(first_time_step_nr - 1, first_time_step_nr - 1 + nr_of_steps)
+        else:
+            last_time_step_nr = first_time_step_nr + nr_of_steps - 1
+            if last_time_step_nr > self._flushed_steps + self._buffered_steps:
+                # make room, the time steps before the first one are done everywhere
+                self.flush(
+                    min(
+                        first_time_step_nr - 1, last_time_step_nr - self._buffered_steps
+                    )
+                )
+            if last_time_step_nr > self._flushed_steps + self._buffered_steps:
+                raise ValueError(
+                    f"Time steps {first_time_step_nr} to {last_time_step_nr} do not fit in the "
+                    f"{self._buffered_steps} time steps kept while streaming"
+                )
+            time_step_nrs = numpy.arange(first_time_step_nr, last_time_step_nr + 1)
+            written = time_step_nrs <= self._flushed_steps
+            if written.any():
+                self.logger.warning(
+                    "%s time steps of %s were already written, ignoring their %s",
+                    numpy.count_nonzero(written),
+                    esdl_id,
+                    output_name,
+                )
+                time_step_nrs = time_step_nrs[~written]
+                values = values[~written]
+            slots = (time_step_nrs - 1) % self._buffered_steps
+        buffer.values[
+            buffer.esdl_indices[esdl_id], buffer.output_indices[output_name], slots
+        ] = values
 
     def set_summary_data_point(self, esdl_id: EsdlId, output_name: str, value: float):
         self.summary_output_data[esdl_id][output_name] = value
 
+    def set_summary_data_points(
+        self,
+        output_name: str,
+        values: numpy.typing.ArrayLike,
+        esdl_ids: Sequence[EsdlId] | None = None,
+    ):
+        """
+        Set the summary ``output_name`` for many esdl_ids at once.
+        NaN values are changed to 0.0, with a single warning.
+
+        :param values: The value per esdl_id.
+        :param esdl_ids: The esdl_ids of ``values``, by default the esdl_ids passed to
+            :py:meth:`init_profile_output_data`, in that order.
+        """
+        values = self._replace_nan(values, output_name)
+        if esdl_ids is None:
+            esdl_ids = list(self.summary_output_data)
+        if len(esdl_ids) != len(values):
+            raise ValueError(
+                f"Got {len(values)} values of {output_name} for {len(esdl_ids)} esdl_ids"
+            )
+        for esdl_id, value in zip(esdl_ids, values):
+            self.summary_output_data[esdl_id][output_name] = float(value)
+
+    def _replace_nan(
+        self, values: numpy.typing.ArrayLike, output_name: str
+    ) -> numpy.typing.NDArray[numpy.float64]:
+        """``values`` as a float array, with the NaN values changed to 0.0."""
+        array = numpy.asarray(values, dtype=numpy.float64)
+        nan = numpy.isnan(array)
+        nr_of_nan = numpy.count_nonzero(nan)
+        if nr_of_nan:
+            self.logger.warning(
+                "%s values for %s are nan, changing to 0.0", nr_of_nan, output_name
+            )
+            array = numpy.where(nan, 0.0, array)
+        return array
+
+    def _time_step_slot(self, time_step_nr: int) -> int | None:
+        """The index of ``time_step_nr`` in the buffer, or ``None`` when it was already written."""
+        if self.stream_batch_steps is None:
+            return time_step_nr - 1
+        if time_step_nr > self._flushed_steps + self._buffered_steps:
+            # a time step is only started when the previous ones are done everywhere
+            self.flush(time_step_nr - 1)
+        if time_step_nr <= self._flushed_steps:
+            return None
+        return (time_step_nr - 1) % self._buffered_steps
+
+    def flush(self, time_step_nr: int):
+        """
+        When streaming, queue the profile output data up to and including ``time_step_nr`` to be
+        written by the background writer, in batches of :py:attr:`stream_batch_steps` time steps.
+        Data set for these time steps later is ignored.
+        """
+        if self.stream_batch_steps is None or self._write_queue is None:
+            return
+        assert self.nr_of_time_steps is not None, "We do not have a nr_of_time_steps"
+        assert self.profile_output_buffer is not None, "The output is not initialized"
+        buffer = self.profile_output_buffer
+        with self._flush_lock:
+            last_step = min(time_step_nr, self.nr_of_time_steps)
+            while self._flushed_steps < last_step:
+                nr_of_steps = min(self._buffered_steps, last_step - self._flushed_steps)
+                slots = (
+                    numpy.arange(self._flushed_steps, self._flushed_steps + nr_of_steps)
+                    % self._buffered_steps
+                )
+                self._copy_replaced_arrays(buffer, self._flushed_steps, slots)
+                # indexing with an array copies, so the slots can be reused right away
+                batch = numpy.array(buffer.values[:, :, slots])
+                buffer.values[:, :, slots] = 0.0
+                self._write_queue.put((batch, self._flushed_steps))
+                # only now the slots can be set for the next time steps
+                self._flushed_steps += nr_of_steps
+
     def write_output(self):
-        points: list[Any] = []
-        first_timestamp: str | None = None
         assert self.nr_of_time_steps is not None, "We do not have a nr_of_time_steps"
+        if self._write_queue is not None:
+            # allow data writing even if simulation was terminated
+            self.flush(self.nr_of_time_steps)
+            self._stop_writer()
+        elif self.profile_output_buffer is not None:
+            values = self.profile_output_buffer.values
+            self._copy_replaced_arrays(
+                self.profile_output_buffer, 0, numpy.arange(self._buffered_steps)
+            )
+            self.logger.info(
+                f"InfluxDB writing {values.shape[0] * values.shape[2]} points to measurement"
+                f" '{self.esdl_type}' with tag simulationRun {self.simulation_id}"
+            )
+            self.write_lines(self._encode_profile(values, 0))
+        if self._batch_writer is not None:
+            self.logger.info(
+                "InfluxDB profile output written: %s", self._batch_writer.stats
+            )
+
+        points = self._summary_points()
+        if points:
+            self.logger.info(
+                f"InfluxDB writing {len(points)} summary points to measurement '{self.esdl_type}'"
+                f" with tag simulationRun {self.simulation_id}"
+            )
+            self.write(points)
+
+    def _step_time(self, i_step: int) -> str:
         assert self.time_step_seconds is not None, "We do not have a time_step_seconds"
         assert self.start_date is not None, "We do not have a start_date"
+        return (
+            (self.start_date + timedelta(seconds=(i_step + 2) * self.time_step_seconds))
+            .astimezone(tz.utc)
+            .strftime("%Y-%m-%dT%H:%M:%SZ")
+        )
 
-        for i_step in range(self.nr_of_time_steps):
-            step_time = (
-                (
-                    self.start_date
-                    + timedelta(seconds=(i_step + 2) * self.time_step_seconds)
-                )
-                .astimezone(tz.utc)
-                .strftime("%Y-%m-%dT%H:%M:%SZ")
-            )
-            if first_timestamp is None:
-                first_timestamp = step_time
+    def _copy_replaced_arrays(
+        self,
+        buffer: ProfileOutputBuffer,
+        first_step: int,
+        slots: numpy.typing.NDArray[numpy.intp],
+    ):
+        """
+        Copy the arrays replaced in :py:attr:`profile_output_data`, which hold all time steps,
+        into the ``slots`` of the buffer for the time steps from index ``first_step`` on.
+        """
+        for esdl_id, i_esdl in buffer.esdl_indices.items():
+            views = self._profile_output_views[esdl_id]
+            for output_name, i_output in buffer.output_indices.items():
+                output_values = self.profile_output_data[esdl_id][output_name]
+                if output_values is not views[output_name]:
+                    # allow data writing even if simulation was terminated
+                    output_values = numpy.asarray(
+                        output_values[first_step : first_step + len(slots)]
+                    )
+                    buffer.values[i_esdl, i_output, slots] = 0.0
+                    buffer.values[i_esdl, i_output, slots[: len(output_values)]] = (
+                        output_values
+                    )
 
-            for (
-                esdl_id,
-                esdl_object_profile_output_data,
-            ) in self.profile_output_data.items():
-                fields = {}
-                for output_name in esdl_object_profile_output_data.keys():
-                    if i_step < len(esdl_object_profile_output_data[output_name]):
-                        fields[output_name] = esdl_object_profile_output_data[
-                            output_name
-                        ][i_step]
-                    else:  # allow data writing even if simulation was terminated
-                        fields[output_name] = 0.0
-                self.add_measurement(points, esdl_id, step_time, fields)
-
-        if self.summary_output_data and first_timestamp is not None:
+    def _encode_profile(
+        self, values: numpy.typing.NDArray[Any], first_step: int
+    ) -> bytes:
+        """
+        The line protocol of ``values`` of the profile output buffer (esdl_ids, output names, time steps),
+        starting at time step ``first_step`` (0 based).
+        """
+        assert self.time_step_seconds is not None, "We do not have a time_step_seconds"
+        assert self.start_date is not None, "We do not have a start_date"
+        if self._line_protocol_encoder is None:
+            return b""
+        nr_of_steps: int = values.shape[2]
+        timestamps = (
+            int(self.start_date.timestamp())
+            + (numpy.arange(first_step, first_step + nr_of_steps) + 2)
+            * self.time_step_seconds
+        )
+        return self._line_protocol_encoder.encode(values, timestamps)
+
+    def _summary_points(self) -> list[dict[str, Any]]:
+        points: list[dict[str, Any]] = []
+        if self.summary_output_data and self.nr_of_time_steps:
+            first_timestamp = self._step_time(0)
             for (
                 esdl_id,
                 esdl_object_summary_output_data,
@@ -186,12 +519,62 @@ class InfluxDBConnector:
                     fields[output_name] = esdl_object_summary_output_data[output_name]
                 if fields:
                     self.add_measurement(points, esdl_id, first_timestamp, fields)
+        return points
 
-        self.logger.info(
-            f"InfluxDB writing {len(points)} points to measurement '{self.esdl_type}'"
-            f" with tag simulationRun {self.simulation_id}"
+    def _start_writer(self):
+        self._stop_writer()
+        self._writer_error = None
+        self._write_queue = Queue(maxsize=self.stream_queue_size)
+        self._writer = threading.Thread(
+            target=self._write_batches,
+            args=[self._write_queue],
+            name="influxdb-writer",
+            daemon=True,
         )
-        self.write(points)
+        self._writer.start()
+
+    def _stop_writer(self):
+        """Wait for the queued batches to be written and stop the background writer."""
+        if self._write_queue is None or self._writer is None:
+            return
+        self._write_queue.put(None)
+        self._writer.join()
+        self._write_queue = None
+        self._writer = None
+        if self._writer_error is not None:
+            raise self._writer_error
+
+    def _write_batches(
+        self, write_queue: Queue[tuple[numpy.typing.NDArray[Any], int] | None]
+    ):
+        while (item := write_queue.get()) is not None:
+            values, first_step = item
+            try:
+                self.logger.debug(
+                    "InfluxDB writing %s points of time steps %s to %s",
+                    values.shape[0] * values.shape[2],
+                    first_step + 1,
+                    first_step + values.shape[2],
+                )
+                self.write_lines(self._encode_profile(values, first_step))
+            except Exception as ex:
+                # keep writing the next batches, the first error is raised by write_output
+                self.logger.exception("Error writing to influx db")
+                if self._writer_error is None:
+                    self._writer_error = ex
+
+    def _tags(self, esdl_id: EsdlId) -> dict[str, str | None]:
+        assert self.esdl_objects is not None
+        if hasattr(self.esdl_objects[esdl_id], "name"):
+            esdl_name = self.esdl_objects[esdl_id].name
+        else:
+            esdl_name = self.esdl_type
+        return {
+            "simulation_id": self.simulation_id,
+            "model_id": self.model_id,
+            "esdl_id": esdl_id,
+            "esdl_name": esdl_name,
+        }
 
     def add_measurement(
         self,
@@ -201,19 +584,9 @@ class InfluxDBConnector:
         fields: dict[str, Any],
     ):
         try:
-            assert self.esdl_objects is not None
-            if hasattr(self.esdl_objects[esdl_id], "name"):
-                esdl_name = self.esdl_objects[esdl_id].name
-            else:
-                esdl_name = self.esdl_type
             item = {
                 "measurement": f"{self.esdl_type}",
-                "tags": {
-                    "simulation_id": self.simulation_id,
-                    "model_id": self.model_id,
-                    "esdl_id": esdl_id,
-                    "esdl_name": esdl_name,
-                },
+                "tags": self._tags(esdl_id),
                 "time": timestamp,
                 "fields": fields,
             }
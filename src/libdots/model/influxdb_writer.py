@@ -0,0 +1,197 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+import gzip
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+import httpx
+from tenacity import RetryCallState
+from tenacity import Retrying
+from tenacity import retry_if_exception
+from tenacity import stop_after_attempt
+from tenacity import wait_exponential
+
+
+class WriteStats:
+    """Totals of the requests sent by an :py:class:`InfluxDBWriter`."""
+
+    def __init__(self):
+        self.batches = 0
+        self.lines = 0
+        self.bytes = 0
+        """The size of the line protocol written."""
+        self.bytes_sent = 0
+        """The size of the request bodies sent, after compression."""
+        self.retries = 0
+        self.failed_batches = 0
+        self.seconds = 0.0
+        """The time spent in :py:meth:`InfluxDBWriter.write_lines`."""
+
+    @property
+    def lines_per_second(self) -> float:
+        return self.lines / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.lines} lines in {self.batches} batches in {self.seconds:.2f}s "
+            f"({self.lines_per_second:.0f} lines/s, {self.bytes_per_second / 1024**2:.2f} MiB/s, "
+            f"{self.bytes_sent / 1024**2:.2f} MiB sent), "
+            f"{self.retries} retries, {self.failed_batches} failed batches"
+        )
+
+
+def _is_retryable(ex: BaseException) -> bool:
+    """Connection problems, timeouts, server errors and rate limiting are worth another try."""
+    if isinstance(ex, httpx.TransportError):
+        return True
+    if isinstance(ex, httpx.HTTPStatusError):
+        status_code = ex.response.status_code
+        return status_code >= 500 or status_code == 429
+    return False
+
+
+class InfluxDBWriter:
+    """
+    Writes line protocol to the InfluxDB 1.x ``/write`` endpoint, split in batches of ``batch_size`` lines.
+    Up to ``concurrency`` batches are compressed and sent at the same time, over a pool of reused connections.
+    A batch that fails with a connection error, a timeout or a server error is retried with exponential
+    backoff, so a transient failure does not lose the other batches.
+
+    :param url: The base url of InfluxDB, like ``http://influxdb:8086``.
+    :param database: The database to write to.
+    :param username: The user, or an empty string to write without authentication.
+    :param password: The password of ``username``.
+    :param batch_size: The maximum number of lines per request.
+    :param concurrency: The maximum number of requests in flight.
+    :param retries: The number of attempts per batch, including the first one.
+    :param backoff: The initial wait between attempts in seconds, doubling every retry.
+    :param compress: Send the request bodies gzip compressed.
+    :param timeout: The timeout of a request in seconds.
+    :param precision: The precision of the timestamps in the lines.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        database: str,
+        username: str = "",
+        password: str = "",
+        batch_size: int = 5000,
+        concurrency: int = 4,
+        retries: int = 5,
+        backoff: float = 0.5,
+        compress: bool = True,
+        timeout: float = 60,
+        precision: str = "s",
+    ):
+        if batch_size < 1 or concurrency < 1 or retries < 1:
+            raise ValueError(
+                "The batch size, concurrency and retries should be at least 1"
+            )
+        self.logger = logging.getLogger(__name__)
+        self.database = database
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.compress = compress
+        self.precision = precision
+        self.stats = WriteStats()
+        self._stats_lock = threading.Lock()
+        self.client = httpx.Client(
+            base_url=url,
+            auth=(username, password) if username else None,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=concurrency, max_keepalive_connections=concurrency
+            ),
+        )
+        self._executor = ThreadPoolExecutor(
+            concurrency, thread_name_prefix="influxdb-write"
+        )
+
+    def write_lines(self, data: bytes):
+        """
+        Write ``data``, line protocol with one point per line, and wait until all batches are written.
+        Raises the error of the first batch that failed after all its attempts.
+        """
+        start = time.perf_counter()
+        lines = data.splitlines(keepends=True)
+        futures = [
+            self._executor.submit(self._write_batch, lines[i : i + self.batch_size])
+            for i in range(0, len(lines), self.batch_size)
+        ]
+        wait(futures)
+        with self._stats_lock:
+            self.stats.seconds += time.perf_counter() - start
+        for future in futures:
+            future.result()
+
+    def close(self):
+        self._executor.shutdown()
+        self.client.close()
+
+    def _write_batch(self, lines: list[bytes]):
+        body = b"".join(lines)
+        headers = {"Content-Type": "text/plain; charset=utf-8"}
+        content = body
+        if self.compress:
+            # zlib releases the GIL, so the batches are compressed in parallel too
+            content = gzip.compress(body, compresslevel=1)
+            headers["Content-Encoding"] = "gzip"
+        retrying = Retrying(
+            stop=stop_after_attempt(self.retries),
+            wait=wait_exponential(multiplier=self.backoff, max=30),
+            retry=retry_if_exception(_is_retryable),
+            before_sleep=self._before_retry,
+            reraise=True,
+        )
+        try:
+            retrying(self._post, content, headers)
+        except Exception:
+            with self._stats_lock:
+                self.stats.failed_batches += 1
+            raise
+        with self._stats_lock:
+            self.stats.batches += 1
+            self.stats.lines += len(lines)
+            self.stats.bytes += len(body)
+            self.stats.bytes_sent += len(content)
+
+    def _post(self, content: bytes, headers: dict[str, str]):
+        response = self.client.post(
+            "/write",
+            params={"db": self.database, "precision": self.precision},
+            content=content,
+            headers=headers,
+        )
+        response.raise_for_status()
+
+    def _before_retry(self, retry_state: RetryCallState):
+        with self._stats_lock:
+            self.stats.retries += 1
+        self.logger.warning(
+            "Retrying InfluxDB write after attempt %s failed: %s",
+            retry_state.attempt_number,
+            retry_state.outcome.exception() if retry_state.outcome else None,
+        )
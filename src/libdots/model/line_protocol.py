@@ -0,0 +1,112 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+from collections.abc import Mapping
+from collections.abc import Sequence
+from typing import Any
+from typing import cast
+
+import numpy
+import numpy.typing
+
+
+def escape_key(value: str) -> str:
+    """Escape a measurement, tag key, tag value or field key for the InfluxDB line protocol."""
+    return (
+        value.replace("\\", "\\\\")
+        .replace(" ", "\\ ")
+        .replace(",", "\\,")
+        .replace("=", "\\=")
+        .replace("\n", "\\n")
+    )
+
+
+class LineProtocolEncoder:
+    """
+    Encodes the float fields of a measurement to the InfluxDB line protocol in bulk, for many series
+    and time steps at once, producing the same lines as ``influxdb.line_protocol.make_lines``.
+
+    The series key (measurement and tags) is escaped once per series and the line layout is built once,
+    instead of building and serializing a point dictionary per series and time step.
+
+    :param measurement: The name of the measurement.
+    :param series_tags: The tags per series. Tags without a value are left out.
+    :param field_names: The names of the fields, in the order of the values passed to :py:meth:`encode`.
+    """
+
+    def __init__(
+        self,
+        measurement: str,
+        series_tags: Sequence[Mapping[str, str | None]],
+        field_names: Sequence[str],
+    ):
+        self.field_names = list(field_names)
+        self.series_keys: list[str] = []
+        for tags in series_tags:
+            series_key = escape_key(measurement)
+            for tag_key in sorted(tags):
+                tag_value = tags[tag_key]
+                if tag_key and tag_value:
+                    series_key += f",{escape_key(tag_key)}={escape_key(tag_value)}"
+            self.series_keys.append(series_key)
+        # the fields are sorted, like make_lines does
+        self._field_order = sorted(
+            range(len(self.field_names)), key=self.field_names.__getitem__
+        )
+        fields = ",".join(
+            f"{escape_key(self.field_names[field])}={{}}" for field in self._field_order
+        )
+        self._line_format = f"{{}} {fields} {{}}\n"
+
+    def encode(
+        self,
+        values: numpy.typing.NDArray[numpy.floating[Any]],
+        timestamps: numpy.typing.NDArray[numpy.integer[Any]],
+    ) -> bytes:
+        """
+        The lines of all series and time steps, ordered by time step and then by series.
+
+        :param values: The field values with shape (series, fields, time steps).
+        :param timestamps: The timestamp of each time step, in the precision of the write request.
+        """
+        nr_of_series, nr_of_fields, nr_of_steps = values.shape
+        if nr_of_series != len(self.series_keys) or nr_of_fields != len(
+            self.field_names
+        ):
+            raise ValueError(
+                f"Expected values for {len(self.series_keys)} series and {len(self.field_names)} fields, "
+                f"got {values.shape}"
+            )
+        if not nr_of_fields:
+            return b""
+        # one column per field, time step major
+        columns: list[list[float]] | list[list[str]]
+        if values.dtype == numpy.float32:
+            # the shortest representation of the float32 values, 0.1 instead of 0.10000000149011612
+            columns = [
+                cast(list[str], values[:, field, :].T.astype(str).ravel().tolist())
+                for field in self._field_order
+            ]
+        else:
+            # python floats format like repr, which is what make_lines writes
+            columns = [
+                values[:, field, :].T.astype(numpy.float64).ravel().tolist()
+                for field in self._field_order
+            ]
+        series_keys = self.series_keys * nr_of_steps
+        times = cast(list[int], numpy.repeat(timestamps, nr_of_series).tolist())
+        return "".join(
+            map(self._line_format.format, series_keys, *columns, times)
+        ).encode("utf-8")
@@ -0,0 +1,77 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+import tempfile
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+
+import numpy
+import numpy.typing
+
+from ..types import EsdlId
+
+ProfileOutputData = dict[EsdlId, dict[str, list[Any] | numpy.typing.NDArray[Any]]]
+
+
+class ProfileOutputBuffer:
+    """
+    The profile output data of all esdl_ids, output names and time steps in one contiguous array
+    :py:attr:`values` with shape (esdl_ids, output names, time steps).
+
+    :param esdl_ids: The esdl_ids, in the order of the first axis.
+    :param output_names: The output names, in the order of the second axis.
+    :param nr_of_time_steps: The length of the last axis.
+    :param dtype: The type of the values, ``float32`` halves the memory at the cost of precision.
+    :param directory: When given, the values are stored in an anonymous temporary file in this
+        directory, mapped into memory with ``numpy.memmap``, so the operating system can page them out.
+        The file is removed when the buffer is garbage collected.
+    """
+
+    def __init__(
+        self,
+        esdl_ids: Sequence[EsdlId],
+        output_names: Sequence[str],
+        nr_of_time_steps: int,
+        dtype: numpy.typing.DTypeLike = numpy.float64,
+        directory: Path | None = None,
+    ):
+        self.esdl_ids = list(esdl_ids)
+        self.output_names = list(output_names)
+        self.esdl_indices = {esdl_id: i for i, esdl_id in enumerate(self.esdl_ids)}
+        self.output_indices = {
+            output_name: i for i, output_name in enumerate(self.output_names)
+        }
+        shape = (len(self.esdl_ids), len(self.output_names), nr_of_time_steps)
+        self.values: numpy.typing.NDArray[numpy.floating[Any]]
+        if directory is None or not numpy.prod(shape):
+            self.values = numpy.zeros(shape, dtype=dtype)
+        else:
+            directory.mkdir(parents=True, exist_ok=True)
+            # the file has no name, it is removed when it is closed
+            file = tempfile.TemporaryFile(dir=directory, prefix="profile-output-")
+            # a new file reads as zeros
+            self.values = numpy.memmap(file, dtype=dtype, mode="w+", shape=shape)
+            file.close()
+
+    def views(self) -> ProfileOutputData:
+        """The profile output data per esdl_id and output name, as views on :py:attr:`values`."""
+        return {
+            esdl_id: {
+                output_name: self.values[i_esdl, i_output]
+                for i_output, output_name in enumerate(self.output_names)
+            }
+            for i_esdl, esdl_id in enumerate(self.esdl_ids)
+        }
@@ -13,14 +13,18 @@
 #      Scene Ltd   - Development of libdots
 #  Manager:
 #      Scene Ltd
+import asyncio
 import logging
 from abc import ABC
 from abc import abstractmethod
 from typing import Any
+from typing import override
 
+from libdots.io.async_mqtt_client import AsyncMqttClient
 from libdots.io.input_data_inventory import InputDataInventory
 from libdots.io.mqtt_client import MqttClient
 from libdots.io.mqtt_log_handler import MqttLogHandler
+from libdots.io.sharded_mqtt_client import ShardedMqttClient
 from libdots.model.config import ServiceConfig
 from libdots.model.service_calc import CalculationFunction
 from libdots.model.service_calc import ServiceCalc
@@ -65,15 +69,24 @@ class BaseService(ABC):
             influxdb_password=config.influxdb_password.get_secret_value(),
             influxdb_name=config.influxdb_name,
         )
+        influxdb_client = self.service_calc.influxdb_client
+        influxdb_client.stream_batch_steps = config.influxdb_stream_batch_steps
+        influxdb_client.write_batch_size = config.influxdb_write_batch_size
+        influxdb_client.write_concurrency = config.influxdb_write_concurrency
+        influxdb_client.write_retries = config.influxdb_write_retries
+        influxdb_client.write_compress = config.influxdb_write_compress
+        influxdb_client.profile_output_dtype = config.influxdb_output_dtype
+        influxdb_client.profile_output_directory = config.influxdb_output_directory
         self.logger = logging.getLogger()
 
         self.input_data_inventory = InputDataInventory(
             self.service_calc.calculation_function_input_types,
             self.service_calc.service_name,
+            self.service_calc.calculation_function_input_views,
         )
 
         # initialize mqtt client
-        self.mqtt_client = MqttClient(
+        mqtt_client_kwargs: dict[str, Any] = dict(
             host=config.mqtt_host,
             port=config.mqtt_port,
             qos=config.mqtt_qos,
@@ -83,7 +96,22 @@ class BaseService(ABC):
             service_calc=self.service_calc,
             service_name=self.service_calc.service_name,
             sim_logger=self.logger,
+            dispatch_mode=config.mqtt_dispatch_mode,
+            dispatch_workers=config.mqtt_dispatch_workers,
+            dispatch_queue_size=config.mqtt_dispatch_queue_size,
+            publish_window=config.mqtt_publish_window,
+            output_qos=config.mqtt_output_qos,
+            calculation_workers=config.calculation_workers,
+            calculation_processes=config.calculation_processes,
         )
+        if config.shards > 1 and not issubclass(
+            self.mqtt_client_class, AsyncMqttClient
+        ):
+            self.mqtt_client = ShardedMqttClient(
+                shards=config.shards, **mqtt_client_kwargs
+            )
+        else:
+            self.mqtt_client = self.mqtt_client_class(**mqtt_client_kwargs)
         mqtt_handler = MqttLogHandler(self.mqtt_client)
         self.logger.addHandler(mqtt_handler)
 
@@ -95,5 +123,45 @@ class BaseService(ABC):
         """
         pass
 
+    @property
+    def mqtt_client_class(self) -> type[MqttClient]:
+        """The MQTT client implementation running this service."""
+        return MqttClient
+
     def start(self):
         self.mqtt_client.wait_for_data()
+
+
+class AsyncBaseService(BaseService):
+    """
+    A :py:class:`BaseService` running on asyncio with an
+    :py:class:`AsyncMqttClient <libdots.io.async_mqtt_client.AsyncMqttClient>`.
+
+    Its :py:class:`ServiceCalc <libdots.model.service_calc.ServiceCalc>` can use ``async def``
+    calculation functions, which can overlap while they wait for I/O (fetching profiles,
+    external lookups). Regular calculation functions keep working, so a service can switch
+    to this class first and migrate its calculation functions later.
+
+        .. code-block:: python
+
+            class MyService(AsyncBaseService):
+                @property
+                @override
+                def service_calc_class(self):
+                    return MyServiceCalc
+
+            config = ServiceConfig() # pyright:ignore[reportCallIssue]
+            service = MyService(config)
+            service.start()
+    """
+
+    mqtt_client: AsyncMqttClient
+
+    @property
+    @override
+    def mqtt_client_class(self) -> type[AsyncMqttClient]:
+        return AsyncMqttClient
+
+    @override
+    def start(self):
+        asyncio.run(self.mqtt_client.run())
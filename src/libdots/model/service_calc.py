@@ -13,13 +13,26 @@
 #      Scene Ltd   - Development of libdots
 #  Manager:
 #      Scene Ltd
+import asyncio
+import inspect
+import itertools
 import logging
+import multiprocessing
+import os
 import typing
 from abc import ABC
 from abc import abstractmethod
+from collections.abc import Awaitable
+from collections.abc import Collection
 from collections.abc import Mapping
 from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from logging import LogRecord
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+from multiprocessing.queues import Queue
 from threading import Lock
 from typing import Any
 from typing import Generic
@@ -30,21 +43,37 @@ from typing import TypeVar
 from typing import get_args
 from typing import get_origin
 from typing import get_type_hints
+from typing import override
 
 from esdl import EnergySystem
 from esdl import URIProfile
 
+from ..io.columnar import ColumnarBatch
+from ..io.columnar import ColumnarOutput
+from ..io.input_data_inventory import InputDataValue
+from ..io.input_data_inventory import InputView
 from ..io.io_data import IODataInterface
 from ..io.io_data import NewStep
+from ..io.mqtt_log_handler import MqttLogHandler
+from ..io.mqtt_log_handler import detach_mqtt_log_handlers
+from ..types import CalculationServiceDescription
 from ..types import EsdlId
+from ..types import EsdlIdSet
 from ..types import ESDLObject
 from ..types import ModelParametersDescription
 from ..types import ServiceName
+from .calculation_scheduler import dependency_groups
 from .esdl_parser import ESDLParser
+from .esdl_topology import EsdlTopology
 from .influxdb_connector import InfluxDBConnector
 
-InputDataType: TypeAlias = Mapping[str, Sequence[IODataInterface]]
-OutputDataType: TypeAlias = tuple[Mapping[EsdlId, IODataInterface], ...]
+InputDataType: TypeAlias = Mapping[str, InputDataValue]
+ConnectedEsdlObjects: TypeAlias = tuple[
+    dict[ServiceName, EsdlIdSet], dict[ServiceName, EsdlIdSet]
+]
+OutputDataType: TypeAlias = tuple[
+    Mapping[EsdlId, IODataInterface] | ColumnarOutput[IODataInterface], ...
+]
 
 InputDataInterfaceT = TypeVar(
     "InputDataInterfaceT",
@@ -64,9 +93,10 @@ class AllInputDataInterface(TypedDict, extra_items=Sequence[IODataInterface]):
     new_step: NewStep
 
 """
-AllInputDataInterfaceT = Mapping[
-    Literal["new_step"] | str, NewStep | Sequence[IODataInterface]
-]
+AllInputDataInterfaceT = Mapping[Literal["new_step"] | str, NewStep | InputDataValue]
+
+EsdlObjectSetupMode = Literal["serial", "thread", "process"]
+"""How :py:meth:`ServiceCalc.process_esdl_object` runs during setup, see :py:attr:`ServiceCalc.esdl_object_setup_mode`."""
 
 
 class CalculationFunction(Protocol[InputDataInterfaceT, OutputDataInterfaceT]):
@@ -77,8 +107,21 @@ class CalculationFunction(Protocol[InputDataInterfaceT, OutputDataInterfaceT]):
     ) -> OutputDataInterfaceT: ...
 
 
+class AsyncCalculationFunction(Protocol[InputDataInterfaceT, OutputDataInterfaceT]):
+    """
+    Protocol describing ``async def`` calculation functions.
+    These are awaited when running with :py:class:`AsyncBaseService <libdots.model.service.AsyncBaseService>`
+    and run to completion with :py:func:`asyncio.run` in the threaded runtime.
+    """
+
+    def __call__(
+        self, new_step: NewStep, input_data: InputDataInterfaceT
+    ) -> Awaitable[OutputDataInterfaceT]: ...
+
+
 CalculationFunctionT = TypeVar(
-    "CalculationFunctionT", bound=CalculationFunction[Any, Any]
+    "CalculationFunctionT",
+    bound=CalculationFunction[Any, Any] | AsyncCalculationFunction[Any, Any],
 )
 
 
@@ -126,19 +169,25 @@ class ServiceCalc(ABC, Generic[CalculationFunctionT]):
         self.simulation_id = simulation_id
         self.model_id = model_id
         self.lock = Lock()
+        # per calculation function, created on first use by calculation_lock()
+        self._calculation_locks: dict[str, Lock] | None = None
+        # runs the process_calculation_functions, see start_calculation_processes()
+        self._process_pool: ProcessPoolExecutor | None = None
         self.logger = logging.getLogger(__name__)
 
         # set in setup()
         self.esdl_objects: dict[EsdlId, ESDLObject] = {}
 
         # per ESDL object:
-        #     a dictionary with, per calculation service, a list of connected ESDL objects
+        #     a dictionary with, per calculation service, an ordered set of connected ESDL objects
+        #     (the sets found in the whole energy system are shared between the ESDL objects,
+        #     they are a FrozenEsdlIdSet that raises a TypeError when modified)
         self.connected_input_esdl_objects_dict: dict[
-            EsdlId, dict[ServiceName, list[EsdlId]]
+            EsdlId, dict[ServiceName, EsdlIdSet]
         ] = {}
 
         self.connected_output_esdl_objects_dict: dict[
-            EsdlId, dict[ServiceName, list[EsdlId]]
+            EsdlId, dict[ServiceName, EsdlIdSet]
         ] = {}
 
         # for writing to influx db
@@ -189,6 +238,73 @@ class ServiceCalc(ABC, Generic[CalculationFunctionT]):
         """
         pass
 
+    @property
+    def calculation_function_dependencies(self) -> Mapping[str, Sequence[str]] | None:
+        """
+        Per calculation function, the calculation functions that need to finish before it can run in a time step.
+
+        By default (``None``) the calculation functions run one at a time. When the dependencies are declared,
+        the calculation functions are split in groups connected by dependencies. Each group gets its own lock,
+        so calculation functions of independent groups run concurrently. Example
+
+            .. code-block:: python
+
+                {
+                    "post_battery": ["pre_battery"],
+                    "prices": [],
+                }
+
+        Here ``post_battery`` only starts after ``pre_battery`` finished, while ``prices`` runs next to them.
+        """
+        return None
+
+    @property
+    def process_calculation_functions(self) -> Collection[str]:
+        """
+        The names of the calculation functions to run in a pool of worker processes instead of a thread,
+        for CPU-bound calculations that would otherwise hold the GIL and stall receiving messages.
+
+        The workers are forked once after :py:meth:`setup`, so they share the state set during
+        ``base_setup`` and ``process_esdl_object``. Per time step only the input data and the returned
+        output data are sent between the processes. Changes a calculation function makes to the service
+        state (like writing to the influxdb client) stay in the worker process, so these functions should
+        only read the state and return their results.
+
+        The workers are forked while the threads of the MQTT client run, which Python warns about with a
+        DeprecationWarning. Only the forking thread exists in a worker, so the workers never use the
+        MQTT client: their log records of INFO and up are sent to this process, and published from here.
+        """
+        return ()
+
+    @property
+    def esdl_object_setup_mode(self) -> EsdlObjectSetupMode:
+        """
+        How :py:meth:`process_esdl_object` and finding the connected ESDL objects run for the esdl_ids
+        during setup:
+
+            * serial: One esdl_id after the other (the default).
+            * thread: On a pool of threads, for a thread-safe ``process_esdl_object`` that waits for I/O,
+              like fetching profiles.
+            * process: On a pool of forked worker processes, for a CPU-bound ``process_esdl_object``.
+              Changes it makes to the service state stay in the worker process, so it should return what it
+              computed instead, see :py:meth:`add_processed_esdl_object`. Like for the
+              :py:attr:`process_calculation_functions`, the workers send their logs to this process.
+
+        In all modes the results are stored in the order of the esdl_ids.
+        """
+        return "serial"
+
+    @property
+    def partial_esdl_load(self) -> bool:
+        """
+        When ``True``, the assets of :py:attr:`esdl_energy_system` this process does not need are removed
+        at the end of :py:meth:`setup_esdl_ids`, to free their memory. Kept are the esdl_ids, the ESDL
+        objects connected to them, the assets connected to a port of any of these and everything that is
+        not an asset, like the profiles. Set this when :py:meth:`process_esdl_object` and the calculation
+        functions only use the ESDL objects of the esdl_ids and their neighbours.
+        """
+        return False
+
     @property
     @abstractmethod
     def receives_service_names(
@@ -201,9 +317,18 @@ class ServiceCalc(ABC, Generic[CalculationFunctionT]):
         return []
 
     @abstractmethod
-    def process_esdl_object(self, esdl_id: EsdlId, esdl_object: ESDLObject):
+    def process_esdl_object(self, esdl_id: EsdlId, esdl_object: ESDLObject) -> Any:
         """
         Runs during the model setup phase. This code runs for each esdl object handled by this calculation service.
+        The returned value is passed to :py:meth:`add_processed_esdl_object`.
+        """
+        pass
+
+    def add_processed_esdl_object(self, esdl_id: EsdlId, result: Any):
+        """
+        Runs during the model setup phase in the main process, with the value returned by
+        :py:meth:`process_esdl_object` for ``esdl_id``, in the order of the esdl_ids.
+        This is optional, and needed to keep the results with ``esdl_object_setup_mode`` ``process``.
         """
         pass
 
@@ -219,6 +344,15 @@ class ServiceCalc(ABC, Generic[CalculationFunctionT]):
         self,
         model_parameters: ModelParametersDescription,
     ):
+        self.setup_shared(model_parameters)
+        self.setup_esdl_ids(model_parameters, model_parameters["esdl_ids"])
+
+    def setup_shared(self, model_parameters: ModelParametersDescription):
+        """
+        The part of :py:meth:`setup` that does not depend on the esdl_ids handled: reading the model
+        parameters and the ESDL, and :py:meth:`base_setup`.
+        When the esdl_ids are sharded over processes, this runs once before the shards are started.
+        """
         self.simulation_name = model_parameters["simulation_name"]
 
         self.simulation_start_date = datetime.fromtimestamp(
@@ -233,37 +367,89 @@ class ServiceCalc(ABC, Generic[CalculationFunctionT]):
         self.esdl_energy_system = self.esdl_parser.get_energy_system(
             model_parameters["esdl_base64string"]
         )
+        # the ESDL text is no longer needed, free its memory
+        model_parameters["esdl_base64string"] = ""
 
         self.base_setup()
 
-        # get esdl objects and connected services for all esdl object in the model
+    def setup_esdl_ids(
+        self, model_parameters: ModelParametersDescription, esdl_ids: list[EsdlId]
+    ):
+        """
+        The part of :py:meth:`setup` per esdl_id: :py:meth:`process_esdl_object`, finding the connected
+        ESDL objects and :py:meth:`setup_influxdb_output`, for the ``esdl_ids`` handled by this process.
+        """
+        self.esdl_ids = esdl_ids
+        calculation_services = model_parameters["calculation_services"]
+
+        # get the esdl objects, before the worker processes are forked
         for esdl_id in self.esdl_ids:
-            esdl_object = self.esdl_parser.get_model_esdl_object(
+            self.esdl_objects[esdl_id] = self.esdl_parser.get_model_esdl_object(
                 esdl_id, self.esdl_energy_system
             )
-            # run additional code for each esdl object
-            self.process_esdl_object(esdl_id, esdl_object)
-
-            # store the esdl object
-            self.esdl_objects[esdl_id] = esdl_object
-            # find connected esdl objects
-            self.connected_input_esdl_objects_dict[esdl_id] = (
-                self.esdl_parser.get_connected_input_esdl_objects(
-                    esdl_id,
-                    model_parameters["calculation_services"],
-                    self.esdl_energy_system,
-                )
-            )
 
-            self.connected_output_esdl_objects_dict[esdl_id] = (
-                self.esdl_parser.get_connected_output_esdl_objects(
-                    esdl_id,
-                    model_parameters["calculation_services"],
-                    self.esdl_energy_system,
+        # run additional code and find the connected services for each esdl object
+        mode = self.esdl_object_setup_mode
+        if mode == "serial":
+            results = [
+                self._setup_esdl_object(esdl_id, calculation_services)
+                for esdl_id in self.esdl_ids
+            ]
+        elif mode == "thread":
+            with ThreadPoolExecutor(thread_name_prefix="setup") as executor:
+                results = list(
+                    executor.map(
+                        self._setup_esdl_object,
+                        self.esdl_ids,
+                        itertools.repeat(calculation_services),
+                    )
                 )
-            )
+        else:
+            workers = os.cpu_count() or 1
+            with _ProcessPool(workers, self) as executor:
+                results = list(
+                    executor.map(
+                        _setup_esdl_object_in_process,
+                        self.esdl_ids,
+                        itertools.repeat(calculation_services),
+                        # send the esdl_ids in a few batches per worker process
+                        chunksize=max(1, len(self.esdl_ids) // (workers * 4)),
+                    )
+                )
+
+        for esdl_id, (result, (connected_input, connected_output)) in zip(
+            self.esdl_ids, results
+        ):
+            self.add_processed_esdl_object(esdl_id, result)
+            self.connected_input_esdl_objects_dict[esdl_id] = connected_input
+            self.connected_output_esdl_objects_dict[esdl_id] = connected_output
+        if self.partial_esdl_load:
+            keep_ids = set(self.esdl_ids)
+            for esdl_id in self.esdl_ids:
+                for esdl_id_set in (
+                    *self.connected_input_esdl_objects_dict[esdl_id].values(),
+                    *self.connected_output_esdl_objects_dict[esdl_id].values(),
+                ):
+                    keep_ids.update(esdl_id_set)
+            self.esdl_parser.prune_energy_system(self.esdl_energy_system, keep_ids)
         self.setup_influxdb_output()
 
+    def _setup_esdl_object(
+        self,
+        esdl_id: EsdlId,
+        calculation_services: list[CalculationServiceDescription],
+    ) -> tuple[Any, ConnectedEsdlObjects]:
+        """Run :py:meth:`process_esdl_object` for ``esdl_id`` and find its connected esdl objects."""
+        result = self.process_esdl_object(esdl_id, self.esdl_objects[esdl_id])
+        # find connected esdl objects
+        connected_input = self.esdl_parser.get_connected_input_esdl_objects(
+            esdl_id, calculation_services, self.esdl_energy_system
+        )
+        connected_output = self.esdl_parser.get_connected_output_esdl_objects(
+            esdl_id, calculation_services, self.esdl_energy_system
+        )
+        return result, (connected_input, connected_output)
+
     # write_to_influxdb is called upon 'SimulationDone' message
     def write_to_influxdb(self):
         """Write collected data to influxdb"""
@@ -273,6 +459,11 @@ class ServiceCalc(ABC, Generic[CalculationFunctionT]):
             self.logger.debug("Write to influx db")
             self.influxdb_client.write_output()
 
+    @property
+    def esdl_topology(self) -> EsdlTopology:
+        """The port connectivity of :py:attr:`esdl_energy_system`, available from ``base_setup``."""
+        return self.esdl_parser.get_topology(self.esdl_energy_system)
+
     def get_profile_uri_by_id(self, id: str) -> str:
         """Get a ESDL ProfileURI by the esdl id"""
         assert self.esdl_energy_system is not None
@@ -288,25 +479,107 @@ class ServiceCalc(ABC, Generic[CalculationFunctionT]):
         input_data_dict: AllInputDataInterfaceT,
     ):
         """Gets called by mqtt client when all input data has been received."""
-        try:
-            # don't allow concurrent calculations on a service
-            self.lock.acquire()
-            if "new_step" not in input_data_dict or not isinstance(
-                input_data_dict["new_step"], NewStep
-            ):
-                raise ValueError("new_step is missing or wrong type")
-            new_step: NewStep = input_data_dict["new_step"]
-            input_data_dict = dict(input_data_dict)
-            del input_data_dict["new_step"]
+        new_step, input_data = self._split_input_data(input_data_dict)
+        # don't allow concurrent calculations within a dependency group
+        with self.calculation_lock(calc_name):
+            if self._runs_in_process(calc_name):
+                assert self._process_pool is not None
+                return self._process_pool.submit(
+                    _calc_in_process, calc_name, new_step, input_data
+                ).result()
             output_data_tuple = self.calculation_functions[calc_name](
-                new_step,
-                typing.cast(Mapping[str, Sequence[IODataInterface]], input_data_dict),
+                new_step, input_data
+            )
+            if inspect.isawaitable(output_data_tuple):
+                output_data_tuple = asyncio.run(_await(output_data_tuple))
+        return output_data_tuple
+
+    async def async_calc_function(
+        self,
+        calc_name: str,
+        input_data_dict: AllInputDataInterfaceT,
+    ):
+        """
+        Gets called by the asyncio mqtt client when all input data has been received.
+        ``async def`` calculation functions are awaited without holding a lock, so
+        calculations waiting for I/O overlap with each other and with receiving messages.
+        Regular calculation functions run under their calculation lock, like in :py:meth:`calc_function`.
+        """
+        new_step, input_data = self._split_input_data(input_data_dict)
+        if self._runs_in_process(calc_name):
+            assert self._process_pool is not None
+            return await asyncio.wrap_future(
+                self._process_pool.submit(
+                    _calc_in_process, calc_name, new_step, input_data
+                )
             )
-            self.lock.release()
-            return output_data_tuple
-        except Exception as e:
-            self.lock.release()
-            raise e
+        function = self.calculation_functions[calc_name]
+        if inspect.iscoroutinefunction(function):
+            return await function(new_step, input_data)
+        with self.calculation_lock(calc_name):
+            output_data_tuple = function(new_step, input_data)
+        if inspect.isawaitable(output_data_tuple):
+            output_data_tuple = await output_data_tuple
+        return output_data_tuple
+
+    def start_calculation_processes(self, processes: int | None = None):
+        """
+        Fork the worker processes running the :py:attr:`process_calculation_functions`.
+        Called by the mqtt client after :py:meth:`setup`, so the workers start with the state of the set up service.
+
+        :param processes: The number of worker processes, defaults to the number of CPUs.
+        """
+        if not self.process_calculation_functions or self._process_pool is not None:
+            return
+        self._process_pool = _ProcessPool(processes, self)
+        # with fork, the first task starts all worker processes, so they copy the state as it is now
+        self._process_pool.submit(int).result()
+
+    def stop_calculation_processes(self):
+        """Stop the worker processes started by :py:meth:`start_calculation_processes`."""
+        if self._process_pool is not None:
+            self._process_pool.shutdown()
+            self._process_pool = None
+
+    def _runs_in_process(self, calc_name: str) -> bool:
+        return (
+            self._process_pool is not None
+            and calc_name in self.process_calculation_functions
+        )
+
+    def calculation_lock(self, calc_name: str) -> Lock:
+        """
+        The lock held while running ``calc_name``: the service lock when no dependencies are declared,
+        otherwise a lock per group of dependent calculation functions.
+        """
+        if self._calculation_locks is None:
+            with self.lock:
+                if self._calculation_locks is None:
+                    self._calculation_locks = self._create_calculation_locks()
+        return self._calculation_locks[calc_name]
+
+    def _create_calculation_locks(self) -> dict[str, Lock]:
+        dependencies = self.calculation_function_dependencies
+        if dependencies is None:
+            return {calc_name: self.lock for calc_name in self.calculation_functions}
+        locks: dict[str, Lock] = {}
+        for group in dependency_groups(self.calculation_functions, dependencies):
+            group_lock = Lock()
+            for calc_name in group:
+                locks[calc_name] = group_lock
+        return locks
+
+    def _split_input_data(
+        self, input_data_dict: AllInputDataInterfaceT
+    ) -> tuple[NewStep, InputDataType]:
+        if "new_step" not in input_data_dict or not isinstance(
+            input_data_dict["new_step"], NewStep
+        ):
+            raise ValueError("new_step is missing or wrong type")
+        new_step: NewStep = input_data_dict["new_step"]
+        input_data_dict = dict(input_data_dict)
+        del input_data_dict["new_step"]
+        return new_step, typing.cast(InputDataType, input_data_dict)
 
     @property
     def calculation_function_input_types(
@@ -317,15 +590,142 @@ class ServiceCalc(ABC, Generic[CalculationFunctionT]):
         It uses typing introspection for this, and its used to tell the data inventory what data to wait for per calculation function.
         """
         args: dict[str, list[type[IODataInterface]]] = {}
-        for function_name, function in self.calculation_functions.items():
+        for function_name, fields in self._calculation_function_input_fields().items():
             args[function_name] = [NewStep]  # NewStep should always be expected
+            for input_class, _ in fields:
+                if input_class not in args[function_name]:
+                    args[function_name].append(input_class)
+        return args
+
+    @property
+    def calculation_function_input_views(
+        self,
+    ) -> dict[str, dict[str, list[InputView]]]:
+        """
+        Returns per calculation function name and message name how the messages are passed in its input_data.
+        A ``Sequence[X]`` field gets the ``{name}_list`` view, a ``Mapping[EsdlId, X]`` field the
+        ``{name}_by_esdl_id`` view, mapping the esdl_id of the sender to its message, and a
+        ``ColumnarBatch[X]`` field the ``{name}_columns`` view with NumPy arrays of the numeric fields.
+        """
+        views: dict[str, dict[str, list[InputView]]] = {}
+        for function_name, fields in self._calculation_function_input_fields().items():
+            views[function_name] = {}
+            for input_class, view in fields:
+                input_views = views[function_name].setdefault(
+                    input_class.get_name(), []
+                )
+                if view not in input_views:
+                    input_views.append(view)
+        return views
+
+    def _calculation_function_input_fields(
+        self,
+    ) -> dict[str, list[tuple[type[IODataInterface], InputView]]]:
+        fields: dict[str, list[tuple[type[IODataInterface], InputView]]] = {}
+        for function_name, function in self.calculation_functions.items():
+            fields[function_name] = []
             function_argument_types = get_type_hints(function)
             input_data_types = get_type_hints(function_argument_types["input_data"])
             for input_data_type in input_data_types.values():
-                if not get_origin(input_data_type) == Sequence:
+                origin = get_origin(input_data_type)
+                if origin == Sequence:
+                    view: InputView = "list"
+                    # get the type(s) of this sequence
+                    field_args = get_args(input_data_type)
+                elif origin == Mapping:
+                    view = "by_esdl_id"
+                    # get the value type(s) of this mapping
+                    field_args = get_args(input_data_type)[1:]
+                elif origin == ColumnarBatch:
+                    view = "columns"
+                    field_args = get_args(input_data_type)
+                else:
                     continue
-                # get the type(s) of this sequence
-                for arg in get_args(input_data_type):
-                    if issubclass(arg, IODataInterface):
-                        args[function_name].append(arg)
-        return args
+                for arg in field_args:
+                    if isinstance(arg, type) and issubclass(arg, IODataInterface):
+                        fields[function_name].append((arg, view))
+        return fields
+
+
+class _ProcessPool(ProcessPoolExecutor):
+    """
+    A pool of worker processes forked from this process, each with the state of ``service_calc``.
+
+    The workers detach the :py:class:`MqttLogHandler <libdots.io.mqtt_log_handler.MqttLogHandler>`
+    instances of the root logger, which use the MQTT client of this process. Instead their log records
+    are sent to this process, and handled there by those handlers.
+    """
+
+    def __init__(self, max_workers: int | None, service_calc: ServiceCalc[Any]):
+        context = multiprocessing.get_context("fork")
+        mqtt_log_handlers = [
+            handler
+            for handler in logging.getLogger().handlers
+            if isinstance(handler, MqttLogHandler)
+        ]
+        log_queue: "Queue[LogRecord] | None" = None
+        self._log_listener: QueueListener | None = None
+        if mqtt_log_handlers:
+            log_queue = context.Queue()
+            self._log_listener = QueueListener(log_queue, *mqtt_log_handlers)
+            self._log_listener.start()
+        super().__init__(
+            max_workers,
+            mp_context=context,
+            initializer=_init_calculation_process,
+            initargs=(service_calc, log_queue),
+        )
+
+    @override
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        super().shutdown(wait, cancel_futures=cancel_futures)
+        if self._log_listener is not None:
+            # handles the records still queued
+            self._log_listener.stop()
+            self._log_listener = None
+
+
+# the service calculation of a worker process, see ServiceCalc.start_calculation_processes() and
+# ServiceCalc.setup_esdl_ids()
+_process_service_calc: ServiceCalc[Any] | None = None
+
+
+def _init_calculation_process(
+    service_calc: ServiceCalc[Any], log_queue: "Queue[LogRecord] | None"
+):
+    global _process_service_calc
+    _process_service_calc = service_calc
+    # the pool belongs to the parent process
+    service_calc._process_pool = None  # pyright:ignore[reportPrivateUsage]
+    root_logger = logging.getLogger()
+    detach_mqtt_log_handlers([root_logger])
+    if log_queue is not None:
+        # only the records the MqttLogHandler publishes
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.setLevel(logging.INFO)
+        root_logger.addHandler(queue_handler)
+
+
+def _calc_in_process(calc_name: str, new_step: NewStep, input_data: InputDataType):
+    assert _process_service_calc is not None
+    output_data_tuple = _process_service_calc.calculation_functions[calc_name](
+        new_step, input_data
+    )
+    if inspect.isawaitable(output_data_tuple):
+        output_data_tuple = asyncio.run(_await(output_data_tuple))
+    return output_data_tuple
+
+
+def _setup_esdl_object_in_process(
+    esdl_id: EsdlId, calculation_services: list[CalculationServiceDescription]
+) -> tuple[Any, ConnectedEsdlObjects]:
+    assert _process_service_calc is not None
+    return (
+        _process_service_calc._setup_esdl_object(  # pyright:ignore[reportPrivateUsage]
+            esdl_id, calculation_services
+        )
+    )
+
+
+async def _await(awaitable: Awaitable[Any]) -> Any:
+    return await awaitable
@@ -15,6 +15,8 @@
 #      Scene Ltd
 
 
+from typing import Any
+from typing import NoReturn
 from typing import TypedDict
 
 from esdl import DataSource
@@ -25,6 +27,30 @@ from esdl import Item
 EsdlId = str
 ServiceName = str
 
+EsdlIdSet = dict[EsdlId, None]
+"""
+An insertion-ordered set of esdl ids, stored as the keys of a dict with ``None`` values.
+Membership checks and adding an id take constant time, iterating yields the ids in the order they were added.
+"""
+
+
+class FrozenEsdlIdSet(EsdlIdSet):
+    """
+    An :py:data:`EsdlIdSet` that can not be modified, for sets shared between ESDL objects.
+    Create a modifiable copy with ``dict(frozen_esdl_id_set)``.
+    """
+
+    def _read_only(self: Any, *args: Any, **kwargs: Any) -> NoReturn:
+        raise TypeError(f"'{type(self).__name__}' can not be modified")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self) -> tuple[type["FrozenEsdlIdSet"], tuple[EsdlIdSet]]:
+        # pickle without setting the items one by one
+        return type(self), (dict(self),)
+
+
 ESDLObject = Item | EnergySystem | GenericProfile | DataSource
 
 
@@ -13,6 +13,8 @@
 #      Scene Ltd   - Development of libdots
 #  Manager:
 #      Scene Ltd
+import logging
+from collections.abc import Iterator
 from collections.abc import Mapping
 from collections.abc import Sequence
 from typing import Any
@@ -27,6 +29,8 @@ from pytest_mock import MockerFixture
 
 from libdots.io.io_data import IODataInterface
 from libdots.io.io_data import NewStep
+from libdots.io.mqtt_client import MqttClient
+from libdots.io.mqtt_log_handler import MqttLogHandler
 from libdots.model import service_calc
 from libdots.model.config import ServiceConfig
 from libdots.model.esdl_parser import ESDLParser
@@ -145,6 +149,19 @@ def service_calc_fixture() -> MyServiceCalc:
     return svc
 
 
+@pytest.fixture
+def mqtt_log_handler() -> Iterator[MqttLogHandler]:
+    """An MQTT log handler with a mock client on the root logger, which logs from INFO."""
+    root_logger = logging.getLogger()
+    handler = MqttLogHandler(MagicMock(spec=MqttClient))
+    root_logger.addHandler(handler)
+    level = root_logger.level
+    root_logger.setLevel(logging.INFO)
+    yield handler
+    root_logger.setLevel(level)
+    root_logger.removeHandler(handler)
+
+
 @pytest.fixture
 def config() -> ServiceConfig:
     return ServiceConfig(
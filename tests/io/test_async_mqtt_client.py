@@ -0,0 +1,199 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+import asyncio
+import logging
+import socket
+from unittest.mock import MagicMock
+
+from paho.mqtt.client import MQTT_ERR_CONN_LOST
+from paho.mqtt.client import MQTT_ERR_NO_CONN
+from pytest_mock import MockerFixture
+
+from libdots.io.async_mqtt_client import AsyncMqttClient
+from libdots.io.input_data_inventory import InputDataInventory
+from libdots.io.io_data import NewStep
+from libdots.types import EsdlId
+from tests.conftest import InputMessage
+from tests.conftest import MyServiceCalc
+from tests.conftest import OutputMessage
+
+
+def test_run_calculation_async(mocker: MockerFixture, service_calc: MyServiceCalc):
+    input_message = InputMessage(demand=10)
+    output_message = OutputMessage(load=10)
+    esdl_id: EsdlId = "1234"
+    output_data = ({esdl_id: output_message},)
+    new_step = NewStep()
+    calculation_name = "calc"
+
+    async def calc_function(*args: object):
+        await asyncio.sleep(0)
+        return output_data
+
+    mock_calc_function = mocker.patch.object(
+        service_calc, "async_calc_function", side_effect=calc_function
+    )
+    inventory = InputDataInventory(
+        service_calc.calculation_function_input_types, service_calc.service_name
+    )
+    inventory.input_data_dict = {
+        NewStep.get_name(): [new_step],
+        InputMessage.get_name(): [input_message],
+    }
+    mqtt_client = AsyncMqttClient(
+        host="",
+        port=123,
+        qos=1,
+        username="",
+        password="",
+        service_name="",
+        input_data_inventory=inventory,
+        service_calc=service_calc,
+        sim_logger=logging.getLogger(),
+    )
+    mock_publish_output_batch = mocker.patch.object(
+        mqtt_client, "_publish_output_batch"
+    )
+    mock_send_calculations_done = mocker.patch.object(
+        mqtt_client, "_send_calculations_done"
+    )
+
+    asyncio.run(
+        mqtt_client._run_calculation_async(  # pyright:ignore[reportPrivateUsage]
+            calculation_name
+        )
+    )
+    mock_calc_function.assert_called_once_with(
+        calculation_name,
+        {"new_step": new_step, f"{InputMessage.get_name()}_list": [input_message]},
+    )
+    mock_publish_output_batch.assert_called_once_with(
+        [
+            (
+                f"{OutputMessage.get_main_topic()}/{service_calc.simulation_id}/{esdl_id}/{OutputMessage.get_name()}",
+                output_message.get_values_as_serialized_protobuf(),
+            )
+        ]
+    )
+    mock_send_calculations_done.assert_called_once_with()
+    assert inventory.input_data_dict[InputMessage.get_name()] == []
+
+
+def test_process_message_async_error(
+    mocker: MockerFixture, service_calc: MyServiceCalc
+):
+    inventory = InputDataInventory(
+        service_calc.calculation_function_input_types, service_calc.service_name
+    )
+    mqtt_client = AsyncMqttClient(
+        host="",
+        port=123,
+        qos=1,
+        username="",
+        password="",
+        service_name="",
+        input_data_inventory=inventory,
+        service_calc=service_calc,
+        sim_logger=logging.getLogger(),
+    )
+    mock_send_error_occurred = mocker.patch.object(mqtt_client, "_send_error_occurred")
+    client = MagicMock()
+    msg = MagicMock(topic="/lifecycle/dots-so/model/sim/model/Unknown")
+
+    asyncio.run(
+        mqtt_client._process_message_async(  # pyright:ignore[reportPrivateUsage]
+            client, msg
+        )
+    )
+    mock_send_error_occurred.assert_called_once()
+    client.disconnect.assert_called_once_with()
+
+
+def test_no_calculation_executor(mocker: MockerFixture, service_calc: MyServiceCalc):
+    mocker.patch.object(
+        MyServiceCalc, "calculation_function_dependencies", {"calc": []}
+    )
+    mqtt_client = AsyncMqttClient(
+        host="",
+        port=123,
+        qos=1,
+        username="",
+        password="",
+        service_name="",
+        input_data_inventory=MagicMock(),
+        service_calc=service_calc,
+        sim_logger=logging.getLogger(),
+    )
+    # the calculations run concurrently as tasks instead
+    assert (
+        mqtt_client._calculation_executor is None  # pyright:ignore[reportPrivateUsage]
+    )
+
+
+def test_run(mocker: MockerFixture, service_calc: MyServiceCalc):
+    inventory = InputDataInventory(
+        service_calc.calculation_function_input_types, service_calc.service_name
+    )
+    mqtt_client = AsyncMqttClient(
+        host="",
+        port=123,
+        qos=1,
+        username="",
+        password="",
+        service_name="",
+        input_data_inventory=inventory,
+        service_calc=service_calc,
+        sim_logger=logging.getLogger(),
+    )
+    mqtt_client.reconnect_min_delay = 0.0
+    mqtt_client.subscribed_topics = ["topic"]
+    mocker.patch.object(mqtt_client, "_send_ready_for_processing")
+    client = MagicMock()
+    client.loop_misc.return_value = MQTT_ERR_NO_CONN
+    mqtt_client._mqtt_client = client  # pyright:ignore[reportPrivateUsage]
+    sock, broker_sock = socket.socketpair()
+
+    def open_socket(*args: object, **kwargs: object):
+        client.on_socket_open(client, None, sock)
+        client.on_connect(client, None, {}, 0)
+
+    client.connect.side_effect = open_socket
+    client.reconnect.side_effect = [OSError("refused"), None]
+
+    async def broker():
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(0)
+        # the socket is read when the broker sends something
+        client.loop_read.side_effect = lambda: loop.remove_reader(sock)
+        broker_sock.send(b"x")
+        while not client.loop_read.called:
+            await asyncio.sleep(0)
+        client.on_disconnect(client, None, MQTT_ERR_CONN_LOST)
+        while client.reconnect.call_count < 2:
+            await asyncio.sleep(0)
+        client.on_disconnect(client, None, 0)
+
+    async def run():
+        await asyncio.gather(mqtt_client.run(), broker())
+
+    asyncio.run(run())
+    sock.close()
+    broker_sock.close()
+
+    client.connect.assert_called_once_with("", port=123)
+    client.subscribe.assert_any_call("topic", 1)
+    client.loop_read.assert_called_once_with()
+    assert client.reconnect.call_count == 2
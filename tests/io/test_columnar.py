@@ -0,0 +1,107 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+from typing import override
+
+import numpy
+
+from libdots.io.columnar import ColumnarBatch
+from libdots.io.columnar import ColumnarOutput
+from libdots.io.columnar import numeric_fields
+from libdots.io.input_data_inventory import InputDataInventory
+from libdots.io.io_data import NewStep
+from tests.conftest import OutputMessage
+
+
+class LoadMessage(OutputMessage):
+    kw: float
+    nr_of_devices: int
+    origin_esdl_id: str
+
+    def __init__(self, kw: float = 0.0, nr_of_devices: int = 0):
+        self.kw = kw
+        self.nr_of_devices = nr_of_devices
+
+    @override
+    def get_values_as_serialized_protobuf(self) -> bytes:
+        return f"{self.origin_esdl_id}:{self.kw}:{self.nr_of_devices}".encode()
+
+    @classmethod
+    @override
+    def get_name(cls) -> str:
+        return "load"
+
+    @classmethod
+    @override
+    def get_main_topic(cls) -> str:
+        return "/data/load_service/model"
+
+
+def test_numeric_fields():
+    assert numeric_fields(LoadMessage) == {
+        "kw": numpy.float64,
+        "nr_of_devices": numpy.int64,
+    }
+
+
+def test_from_messages():
+    batch = ColumnarBatch.from_messages(
+        LoadMessage, {"a": LoadMessage(1.5, 2), "b": LoadMessage(2.5, 3)}
+    )
+    assert len(batch) == 2
+    assert batch.esdl_ids.tolist() == ["a", "b"]
+    assert batch["kw"].dtype == numpy.float64
+    assert batch["kw"].tolist() == [1.5, 2.5]
+    assert batch["nr_of_devices"].tolist() == [2, 3]
+
+
+def test_from_no_messages():
+    batch = ColumnarBatch.from_messages(LoadMessage, {})
+    assert len(batch) == 0
+    assert batch["kw"].shape == (0,)
+
+
+def test_inventory_columns_view():
+    inventory = InputDataInventory(
+        {"calc": [NewStep, LoadMessage]}, "svc", {"calc": {"load": ["columns"]}}
+    )
+    inventory.set_expected_esdl_ids_for_input_data(
+        {"asset": {"load_service": ["a", "b"]}}
+    )
+    inventory.add_input(NewStep.get_main_topic(), "new_step", b"", esdl_id="dots-so")
+    inventory.add_input(LoadMessage.get_main_topic(), "load", b"", esdl_id="b")
+    assert inventory.add_input(
+        LoadMessage.get_main_topic(), "load", b"", esdl_id="a"
+    ) == ["calc"]
+
+    input_data = inventory.get_input_data("calc")
+    assert set(input_data) == {"new_step", "load_columns"}
+    batch = input_data["load_columns"]
+    assert isinstance(batch, ColumnarBatch)
+    assert batch.esdl_ids.tolist() == ["b", "a"]
+    assert batch["kw"].tolist() == [0.0, 0.0]
+
+
+def test_columnar_output_serialize():
+    output = ColumnarOutput.allocate(
+        LoadMessage, ["a", "b"], esdl_id_field="origin_esdl_id"
+    )
+    output["kw"] = [1.5, 2.5]
+    output["nr_of_devices"][1] = 3
+    assert list(output.serialize()) == [("a", b"a:1.5:0"), ("b", b"b:2.5:3")]
+
+    # the arrays are reused for the next time step
+    output["kw"] *= 2
+    assert [payload for _, payload in output.serialize()] == [b"a:3.0:0", b"b:5.0:3"]
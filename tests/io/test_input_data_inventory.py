@@ -0,0 +1,172 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+import time
+from typing import override
+
+import pytest
+
+from libdots.io.input_data_inventory import InputDataInventory
+from libdots.io.io_data import NewStep
+from tests.conftest import OutputMessage
+
+
+class LoadMessage(OutputMessage):
+    def __init__(self):
+        pass
+
+    @classmethod
+    @override
+    def get_name(cls) -> str:
+        return "load"
+
+    @classmethod
+    @override
+    def get_main_topic(cls) -> str:
+        return "/data/load_service/model"
+
+
+class PriceMessage(LoadMessage):
+    @classmethod
+    @override
+    def get_name(cls) -> str:
+        return "price"
+
+    @classmethod
+    @override
+    def get_main_topic(cls) -> str:
+        return "/data/price_service/model"
+
+
+LIFECYCLE_TOPIC = NewStep.get_main_topic()
+LOAD_TOPIC = LoadMessage.get_main_topic()
+PRICE_TOPIC = PriceMessage.get_main_topic()
+
+
+def test_add_input_all_received():
+    inventory = InputDataInventory(
+        {
+            "first": [NewStep, PriceMessage],
+            "second": [NewStep, LoadMessage, PriceMessage],
+        },
+        "my_service",
+    )
+    inventory.set_expected_esdl_ids_for_input_data(
+        {
+            "asset_1": {"price_service": ["a"], "load_service": ["c", "d"]},
+            "asset_2": {"price_service": ["a", "b"]},
+        }
+    )
+
+    assert inventory.add_input(LIFECYCLE_TOPIC, "new_step", b"") == []
+    assert inventory.add_input(PRICE_TOPIC, "price", b"") == []
+    assert inventory.add_input(LOAD_TOPIC, "load", b"") == []
+    assert inventory.add_input(PRICE_TOPIC, "price", b"") == ["first"]
+    assert inventory.add_input(LOAD_TOPIC, "load", b"") == ["second"]
+    # more messages than expected don't make a calculation ready twice
+    assert inventory.add_input(LOAD_TOPIC, "load", b"") == []
+    assert inventory.calc_names_all_received == {"first", "second"}
+
+    inventory.set_calc_done("first")
+    assert not inventory.all_calcs_done()
+    inventory.set_calc_done("second")
+    assert inventory.all_calcs_done()
+
+    # the next step starts counting from 0 again
+    inventory.delete_all_received_input_data()
+    assert not inventory.all_calcs_done()
+    assert inventory.add_input(LIFECYCLE_TOPIC, "new_step", b"") == []
+    assert inventory.add_input(PRICE_TOPIC, "price", b"") == []
+    assert inventory.add_input(PRICE_TOPIC, "price", b"") == ["first"]
+
+
+def test_add_input_nothing_expected():
+    inventory = InputDataInventory({"first": [NewStep, PriceMessage]}, "my_service")
+    inventory.set_expected_esdl_ids_for_input_data({})
+    assert inventory.add_input(LIFECYCLE_TOPIC, "new_step", b"") == ["first"]
+
+
+def test_add_input_decodes_outside_lock():
+    inventory = InputDataInventory({"first": [NewStep, PriceMessage]}, "my_service")
+    inventory.set_expected_esdl_ids_for_input_data({"asset": {"price_service": ["a"]}})
+    lock_held_while_decoding: list[bool] = []
+
+    class DecodingPriceMessage(PriceMessage):
+        @override
+        def set_values_from_serialized_protobuf(self, serialized_message: bytes):
+            lock_held_while_decoding.append(inventory.lock.locked())
+
+    inventory.add_input(LIFECYCLE_TOPIC, "new_step", b"")
+    assert inventory.add_input(
+        PRICE_TOPIC, "price", b"payload", DecodingPriceMessage
+    ) == ["first"]
+    assert lock_held_while_decoding == [False]
+
+
+def test_add_input_wrong_data_class():
+    inventory = InputDataInventory({"first": [NewStep, OutputMessage]}, "my_service")
+    inventory.set_expected_esdl_ids_for_input_data({})
+    with pytest.raises(OSError, match="does not have the correct variables"):
+        inventory.add_input(
+            OutputMessage.get_main_topic(), OutputMessage.get_name(), b""
+        )
+    assert not inventory.lock.locked()
+
+
+def test_add_input_by_esdl_id():
+    inventory = InputDataInventory(
+        {"first": [NewStep, PriceMessage]},
+        "my_service",
+        {"first": {"price": ["list", "by_esdl_id"]}},
+    )
+    inventory.set_expected_esdl_ids_for_input_data(
+        {"asset": {"price_service": ["a", "b"]}}
+    )
+
+    assert (
+        inventory.add_input(LIFECYCLE_TOPIC, "new_step", b"", esdl_id="dots-so") == []
+    )
+    assert inventory.add_input(PRICE_TOPIC, "price", b"", esdl_id="a") == []
+    # a redelivered message is ignored and does not complete the step
+    assert inventory.add_input(PRICE_TOPIC, "price", b"", esdl_id="a") == []
+    assert inventory.add_input(PRICE_TOPIC, "price", b"", esdl_id="b") == ["first"]
+
+    input_data = inventory.get_input_data("first")
+    assert isinstance(input_data["price_by_esdl_id"], dict)
+    assert set(input_data["price_by_esdl_id"]) == {"a", "b"}
+    assert isinstance(input_data["price_list"], list)
+    assert len(input_data["price_list"]) == 2
+
+    inventory.delete_all_received_input_data()
+    assert inventory.input_data_by_esdl_id["price"] == {}
+
+
+def test_set_expected_esdl_ids_scales_linearly():
+    def setup_duration(nr_of_assets: int) -> float:
+        connected = {
+            f"asset_{i}": {"price_service": [f"price_{j}" for j in range(i, i + 3)]}
+            for i in range(nr_of_assets)
+        }
+        inventory = InputDataInventory({"first": [NewStep, PriceMessage]}, "svc")
+        start = time.perf_counter()
+        inventory.set_expected_esdl_ids_for_input_data(connected)
+        duration = time.perf_counter() - start
+        assert len(inventory.expected_esdl_ids_dict[PRICE_TOPIC]) == nr_of_assets + 2
+        return duration
+
+    small = min(setup_duration(5000) for _ in range(3))
+    large = min(setup_duration(20000) for _ in range(3))
+    # 4 times the assets, linear is ~4 times the duration, quadratic ~16 times
+    assert large / small < 10
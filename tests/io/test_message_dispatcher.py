@@ -0,0 +1,76 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+import threading
+from unittest.mock import MagicMock
+
+from paho.mqtt.client import Client
+from paho.mqtt.client import MQTTMessage
+
+from libdots.io.message_dispatcher import MessageDispatcher
+
+
+def test_dispatch_ordered():
+    received: list[bytes] = []
+
+    def handler(client: Client, msg: MQTTMessage):
+        received.append(msg.payload)
+
+    dispatcher = MessageDispatcher(handler, mode="ordered", queue_size=10)
+    client = MagicMock()
+    for i in range(100):
+        msg = MQTTMessage(topic=b"/some/topic")
+        msg.payload = str(i).encode()
+        dispatcher.dispatch(client, msg)
+    dispatcher.join()
+    dispatcher.stop()
+
+    assert received == [str(i).encode() for i in range(100)]
+
+
+def test_dispatch_parallel_uses_fixed_pool():
+    thread_names: set[str] = set()
+    lock = threading.Lock()
+
+    def handler(client: Client, msg: MQTTMessage):
+        with lock:
+            thread_names.add(threading.current_thread().name)
+
+    dispatcher = MessageDispatcher(handler, mode="parallel", workers=3, queue_size=5)
+    client = MagicMock()
+    for _ in range(200):
+        dispatcher.dispatch(client, MQTTMessage(topic=b"/some/topic"))
+    dispatcher.join()
+    dispatcher.stop()
+
+    assert thread_names <= {"mqtt-dispatch-0", "mqtt-dispatch-1", "mqtt-dispatch-2"}
+
+
+def test_dispatch_worker_survives_handler_error():
+    handled: list[MQTTMessage] = []
+
+    def handler(client: Client, msg: MQTTMessage):
+        handled.append(msg)
+        if len(handled) == 1:
+            raise ValueError("failed")
+
+    dispatcher = MessageDispatcher(handler, mode="ordered")
+    client = MagicMock()
+    dispatcher.dispatch(client, MQTTMessage(topic=b"/some/topic"))
+    dispatcher.dispatch(client, MQTTMessage(topic=b"/some/topic"))
+    dispatcher.join()
+    dispatcher.stop()
+
+    assert len(handled) == 2
@@ -14,15 +14,27 @@
 #  Manager:
 #      Scene Ltd
 import logging
+import threading
+from collections.abc import Mapping
+from collections.abc import Sequence
+from typing import override
+from unittest.mock import MagicMock
 
+import pytest
+from paho.mqtt.client import MQTT_ERR_NO_CONN
+from paho.mqtt.client import MQTT_ERR_SUCCESS
 from pytest_mock import MockerFixture
 
+from libdots.io.columnar import ColumnarOutput
 from libdots.io.input_data_inventory import InputDataInventory
 from libdots.io.io_data import NewStep
 from libdots.io.mqtt_client import MqttClient
+from libdots.model.service_calc import CalculationFunction
 from libdots.types import EsdlId
+from tests.conftest import InputData
 from tests.conftest import InputMessage
 from tests.conftest import MyServiceCalc
+from tests.conftest import OutputData
 from tests.conftest import OutputMessage
 
 
@@ -69,11 +81,202 @@ def test_do_step(mocker: MockerFixture, service_calc: MyServiceCalc):
         service_calc=service_calc,
         sim_logger=sim_logger,
     )
-    mock_send_io_data = mocker.patch.object(mqtt_client, "_send_io_data")
+    mock_publish_output_batch = mocker.patch.object(
+        mqtt_client, "_publish_output_batch"
+    )
 
     mqtt_client._do_step(calculation_name)  # pyright:ignore[reportPrivateUsage]
     mock_calc_function.assert_called_once_with(calculation_name, expected_input_data)
     spy_get_input_data.assert_called_once_with(calculation_name)
 
-    mock_send_io_data.assert_called_once_with(esdl_id, output_data[0][esdl_id])
+    mock_publish_output_batch.assert_called_once_with(
+        [
+            (
+                f"{OutputMessage.get_main_topic()}/{service_calc.simulation_id}/{esdl_id}/{OutputMessage.get_name()}",
+                output_message.get_values_as_serialized_protobuf(),
+            )
+        ]
+    )
     mock_set_calc_done.assert_called_once_with(calculation_name)
+
+
+class ColumnarOutputMessage(OutputMessage):
+    # serialized columnar output is created without arguments
+    def __init__(self, load: float = 0.0):
+        super().__init__(load)
+
+
+def test_send_columnar_output_data(service_calc: MyServiceCalc, mocker: MockerFixture):
+    mqtt_client = MqttClient(
+        host="",
+        port=123,
+        qos=1,
+        username="",
+        password="",
+        service_name="",
+        input_data_inventory=MagicMock(),
+        service_calc=service_calc,
+        sim_logger=MagicMock(),
+    )
+    mock_publish_output_batch = mocker.patch.object(
+        mqtt_client, "_publish_output_batch"
+    )
+    output = ColumnarOutput.allocate(ColumnarOutputMessage, ["a", "b"])
+
+    mqtt_client._send_output_data(  # pyright:ignore[reportPrivateUsage]
+        (output, {"c": OutputMessage(load=1)})
+    )
+
+    topic = f"{OutputMessage.get_main_topic()}/{service_calc.simulation_id}"
+    mock_publish_output_batch.assert_called_once_with(
+        [
+            (f"{topic}/a/{OutputMessage.get_name()}", b""),
+            (f"{topic}/b/{OutputMessage.get_name()}", b""),
+            (f"{topic}/c/{OutputMessage.get_name()}", b""),
+        ]
+    )
+
+
+def test_calculations_done_after_outputs_published(
+    mocker: MockerFixture, service_calc: MyServiceCalc
+):
+    inventory = InputDataInventory(
+        service_calc.calculation_function_input_types, service_calc.service_name
+    )
+    mqtt_client = MqttClient(
+        host="",
+        port=123,
+        qos=1,
+        username="",
+        password="",
+        service_name="",
+        input_data_inventory=inventory,
+        service_calc=service_calc,
+        sim_logger=logging.getLogger(),
+    )
+    mock_paho_client = MagicMock()
+    mqtt_client._mqtt_client = mock_paho_client  # pyright:ignore[reportPrivateUsage]
+    mocker.patch.object(inventory, "all_calcs_done", return_value=True)
+
+    # publish 2 outputs, the first one is acknowledged before it was registered
+    mock_paho_client.publish.side_effect = [
+        MagicMock(rc=MQTT_ERR_SUCCESS, mid=1),
+        MagicMock(rc=MQTT_ERR_SUCCESS, mid=2),
+        MagicMock(rc=MQTT_ERR_SUCCESS, mid=3),
+    ]
+    mqtt_client._on_publish(1)  # pyright:ignore[reportPrivateUsage]
+    mqtt_client._publish_output_batch(  # pyright:ignore[reportPrivateUsage]
+        [("topic/1", b"1"), ("topic/2", b"2")]
+    )
+    mqtt_client._check_calculations_done()  # pyright:ignore[reportPrivateUsage]
+    assert mock_paho_client.publish.call_count == 2
+
+    # CalculationsDone goes out once the last output is acknowledged
+    mqtt_client._on_publish(2)  # pyright:ignore[reportPrivateUsage]
+    assert mock_paho_client.publish.call_count == 3
+    assert mock_paho_client.publish.call_args.args[0].endswith("/CalculationsDone")
+
+
+@pytest.mark.parametrize("output_qos", [0, 1])
+def test_publish_output_while_disconnected(
+    service_calc: MyServiceCalc, output_qos: int
+):
+    mqtt_client = MqttClient(
+        host="",
+        port=123,
+        qos=1,
+        username="",
+        password="",
+        service_name="",
+        input_data_inventory=MagicMock(),
+        service_calc=service_calc,
+        sim_logger=logging.getLogger(),
+        output_qos=output_qos,
+    )
+    mock_paho_client = MagicMock()
+    mock_paho_client.publish.return_value = MagicMock(rc=MQTT_ERR_NO_CONN, mid=1)
+    mqtt_client._mqtt_client = mock_paho_client  # pyright:ignore[reportPrivateUsage]
+
+    if output_qos == 0:
+        # the message is dropped
+        with pytest.raises(OSError):
+            mqtt_client._publish_output_batch(  # pyright:ignore[reportPrivateUsage]
+                [("topic/1", b"1")]
+            )
+    else:
+        # the message is sent once reconnected, and acknowledged then
+        mqtt_client._publish_output_batch(  # pyright:ignore[reportPrivateUsage]
+            [("topic/1", b"1")]
+        )
+        unacked = (
+            mqtt_client._nr_of_unacked_outputs  # pyright:ignore[reportPrivateUsage]
+        )
+        assert unacked == 1
+    mock_paho_client.publish.assert_called_once_with("topic/1", b"1", qos=output_qos)
+
+
+class MyMultiStageServiceCalc(MyServiceCalc):
+    @property
+    @override
+    def calculation_functions(
+        self,
+    ) -> Mapping[str, CalculationFunction[InputData, OutputData]]:
+        return {
+            "pre_battery": self.test_calc,
+            "post_battery": self.test_calc,
+            "prices": self.test_calc,
+        }
+
+    @property
+    @override
+    def calculation_function_dependencies(self) -> Mapping[str, Sequence[str]]:
+        return {"post_battery": ["pre_battery"]}
+
+
+def test_independent_calculations_run_concurrently(mocker: MockerFixture):
+    service_calc = MyMultiStageServiceCalc(
+        simulation_id="",
+        model_id="",
+        influxdb_host="",
+        influxdb_port=1,
+        influxdb_password="",
+        influxdb_user="",
+        influxdb_name="",
+    )
+    mqtt_client = MqttClient(
+        host="",
+        port=123,
+        qos=1,
+        username="",
+        password="",
+        service_name="",
+        input_data_inventory=MagicMock(),
+        service_calc=service_calc,
+        sim_logger=MagicMock(),
+    )
+    # pre_battery and prices only get past the barrier when they run at the same time
+    barrier = threading.Barrier(2, timeout=5)
+    finished: list[str] = []
+    post_battery_finished = threading.Event()
+
+    def do_step(calc_name: str) -> list[str]:
+        if calc_name != "post_battery":
+            barrier.wait()
+        finished.append(calc_name)
+        if calc_name == "post_battery":
+            post_battery_finished.set()
+        return mqtt_client.calculation_scheduler.finished(calc_name)
+
+    mocker.patch.object(mqtt_client, "_do_step", side_effect=do_step)
+    mocker.patch.object(mqtt_client, "_check_calculations_done")
+    mock_handle_error = mocker.patch.object(mqtt_client, "_handle_error")
+
+    mqtt_client._run_calculations(  # pyright:ignore[reportPrivateUsage]
+        mqtt_client.calculation_scheduler.inputs_received(
+            ["post_battery", "pre_battery", "prices"]
+        )
+    )
+    assert post_battery_finished.wait(timeout=5)
+    mock_handle_error.assert_not_called()
+    assert finished.index("post_battery") > finished.index("pre_battery")
+    assert sorted(finished) == ["post_battery", "pre_battery", "prices"]
@@ -0,0 +1,259 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+from multiprocessing.connection import Connection
+from typing import Any
+from unittest.mock import MagicMock
+
+from pytest_mock import MockerFixture
+
+from libdots.io import sharded_mqtt_client
+from libdots.io.input_data_inventory import InputDataInventory
+from libdots.io.mqtt_log_handler import MqttLogHandler
+from libdots.io.sharded_mqtt_client import ShardedMqttClient
+from libdots.io.sharded_mqtt_client import ShardMqttClient
+from libdots.io.sharded_mqtt_client import split_esdl_ids
+from libdots.model.service_calc import ServiceCalc
+from libdots.types import EsdlId
+from libdots.types import ModelParametersDescription
+from tests.conftest import MyServiceCalc
+
+
+def create_client(service_calc: MyServiceCalc, shards: int) -> ShardedMqttClient:
+    return ShardedMqttClient(
+        shards=shards,
+        host="",
+        port=123,
+        qos=1,
+        username="",
+        password="",
+        service_name="",
+        input_data_inventory=InputDataInventory(
+            service_calc.calculation_function_input_types, service_calc.service_name
+        ),
+        service_calc=service_calc,
+        sim_logger=logging.getLogger(),
+    )
+
+
+def test_split_esdl_ids():
+    esdl_ids = [str(i) for i in range(10)]
+
+    assert split_esdl_ids(esdl_ids, 3) == [
+        ["0", "1", "2"],
+        ["3", "4", "5"],
+        ["6", "7", "8", "9"],
+    ]
+    assert split_esdl_ids(esdl_ids, 1) == [esdl_ids]
+    # never more shards than esdl_ids
+    assert split_esdl_ids(["a", "b"], 4) == [["a"], ["b"]]
+
+
+def test_lifecycle_messages_sent_once_all_shards_reported(
+    mocker: MockerFixture, service_calc: MyServiceCalc
+):
+    client = create_client(service_calc, 2)
+    mock_send_parameterized = mocker.patch.object(client, "_send_parameterized")
+    mock_send_calculations_done = mocker.patch.object(client, "_send_calculations_done")
+    on_shard_event = client._on_shard_event  # pyright:ignore[reportPrivateUsage]
+
+    on_shard_event("parameterized", None, 2)
+    mock_send_parameterized.assert_not_called()
+    on_shard_event("parameterized", None, 2)
+    mock_send_parameterized.assert_called_once()
+
+    for _ in range(2):
+        on_shard_event("calculations_done", None, 2)
+        mock_send_calculations_done.assert_not_called()
+        on_shard_event("calculations_done", None, 2)
+        mock_send_calculations_done.assert_called_once()
+        mock_send_calculations_done.reset_mock()
+
+
+def run_shard_stub(
+    service_calc: ServiceCalc[Any],
+    model_parameters: ModelParametersDescription,
+    esdl_ids: list[EsdlId],
+    connection: Connection,
+    client_kwargs: dict[str, Any],
+):
+    connection.send(("parameterized", None))
+    connection.send(("calculations_done", None))
+    connection.send(("finished", None))
+
+
+def test_start_shards(mocker: MockerFixture, service_calc: MyServiceCalc):
+    mocker.patch.object(sharded_mqtt_client, "_run_shard", run_shard_stub)
+    client = create_client(service_calc, 3)
+    calculations_done = threading.Event()
+    mock_send_parameterized = mocker.patch.object(client, "_send_parameterized")
+    mocker.patch.object(
+        client, "_send_calculations_done", side_effect=calculations_done.set
+    )
+    mock_send_error_occurred = mocker.patch.object(client, "_send_error_occurred")
+
+    client._start_shards(  # pyright:ignore[reportPrivateUsage]
+        {"esdl_ids": ["a", "b", "c", "d"]}  # pyright:ignore[reportArgumentType]
+    )
+
+    assert calculations_done.wait(10)
+    for process in client._shard_processes:  # pyright:ignore[reportPrivateUsage]
+        process.join()
+    assert len(client._shard_processes) == 3  # pyright:ignore[reportPrivateUsage]
+    mock_send_parameterized.assert_called_once()
+    mock_send_error_occurred.assert_not_called()
+
+
+def run_shard_error_stub(
+    service_calc: ServiceCalc[Any],
+    model_parameters: ModelParametersDescription,
+    esdl_ids: list[EsdlId],
+    connection: Connection,
+    client_kwargs: dict[str, Any],
+):
+    if esdl_ids == ["a"]:
+        connection.send(("error", "setup failed"))
+        connection.send(("finished", None))
+    else:
+        # waits for time steps that never come
+        time.sleep(60)
+
+
+def test_start_shards_error(mocker: MockerFixture, service_calc: MyServiceCalc):
+    mocker.patch.object(sharded_mqtt_client, "_run_shard", run_shard_error_stub)
+    client = create_client(service_calc, 3)
+    mock_send_error_occurred = mocker.patch.object(client, "_send_error_occurred")
+
+    client._start_shards(  # pyright:ignore[reportPrivateUsage]
+        {"esdl_ids": ["a", "b", "c"]}  # pyright:ignore[reportArgumentType]
+    )
+
+    # the listener stops once all shards stopped
+    listener = client._shard_listener  # pyright:ignore[reportPrivateUsage]
+    assert listener is not None
+    listener.join(10)
+    assert not listener.is_alive()
+    mock_send_error_occurred.assert_called_once_with("setup failed")
+    processes = client._shard_processes  # pyright:ignore[reportPrivateUsage]
+    assert [process.exitcode for process in processes] == [
+        0,
+        -signal.SIGTERM,
+        -signal.SIGTERM,
+    ]
+
+
+def test_run_shard(
+    mocker: MockerFixture,
+    service_calc: MyServiceCalc,
+    mqtt_log_handler: MqttLogHandler,
+):
+    parent_client = mqtt_log_handler.client
+    assert isinstance(parent_client, MagicMock)
+    shard_logs: list[str] = []
+    mocker.patch.object(ShardMqttClient, "send_log", side_effect=shard_logs.append)
+
+    def setup_esdl_ids(
+        model_parameters: ModelParametersDescription, esdl_ids: list[EsdlId]
+    ):
+        logging.getLogger().info("setting up %s", esdl_ids)
+
+    def wait_for_data():
+        logging.getLogger().info("waiting for data")
+
+    setup_mock = mocker.patch.object(
+        service_calc, "setup_esdl_ids", side_effect=setup_esdl_ids
+    )
+    mocker.patch.object(ShardMqttClient, "wait_for_data", side_effect=wait_for_data)
+    connection, shard_connection = multiprocessing.Pipe()
+    model_parameters: ModelParametersDescription = {
+        "esdl_ids": ["a", "b"]
+    }  # pyright:ignore[reportAssignmentType]
+
+    sharded_mqtt_client._run_shard(  # pyright:ignore[reportPrivateUsage]
+        service_calc,
+        model_parameters,
+        ["b"],
+        shard_connection,
+        dict(
+            host="",
+            port=123,
+            qos=1,
+            username="",
+            password="",
+            service_name="",
+            sim_logger=logging.getLogger(),
+        ),
+    )
+
+    setup_mock.assert_called_once_with(model_parameters, ["b"])
+    # nothing is logged over the connection of the parent process
+    parent_client.send_log.assert_not_called()
+    assert isinstance(mqtt_log_handler.client, ShardMqttClient)
+    assert [log.split(": ", 1)[1] for log in shard_logs] == ["waiting for data"]
+    assert connection.recv() == ("finished", None)
+
+
+def test_shard_subscribes_data_topics_once(service_calc: MyServiceCalc):
+    service_calc.connected_input_esdl_objects_dict = {
+        "b": {"input_service": {"x": None, "y": None}}
+    }
+    connection, shard_connection = multiprocessing.Pipe()
+    client = ShardMqttClient(
+        connection=shard_connection,
+        host="",
+        port=123,
+        qos=1,
+        username="",
+        password="",
+        service_name="",
+        input_data_inventory=InputDataInventory(
+            service_calc.calculation_function_input_types, service_calc.service_name
+        ),
+        service_calc=service_calc,
+        sim_logger=logging.getLogger(),
+    )
+    paho_client = MagicMock()
+    paho_client.subscribe.return_value = (0, 7)
+    client._mqtt_client = paho_client  # pyright:ignore[reportPrivateUsage]
+
+    def loop_forever():
+        paho_client.on_connect(paho_client, None, {}, 0)
+        paho_client.on_subscribe(paho_client, None, 7, (1,))
+        # reconnected
+        paho_client.on_connect(paho_client, None, {}, 0)
+
+    paho_client.loop_forever.side_effect = loop_forever
+
+    client.wait_for_data()
+
+    lifecycle_topic = f"/lifecycle/dots-so/model/{service_calc.simulation_id}/{service_calc.model_id}/+"
+    data_topics = [
+        (f"/lifecycle/dots-so/model/{service_calc.simulation_id}/dots-so/#", 1),
+        (f"/data/input_service/model/{service_calc.simulation_id}/x/#", 1),
+        (f"/data/input_service/model/{service_calc.simulation_id}/y/#", 1),
+    ]
+    assert [call.args for call in paho_client.subscribe.call_args_list] == [
+        (lifecycle_topic, 1),
+        (data_topics,),
+        # the data topics are not subscribed to again on the first connect
+        ([(lifecycle_topic, 1)],),
+        ([(lifecycle_topic, 1), *data_topics],),
+    ]
+    assert connection.recv() == ("parameterized", None)
@@ -0,0 +1,56 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+import pytest
+
+from libdots.io.io_data import NewStep
+from libdots.io.topic_router import NEW_STEP
+from libdots.io.topic_router import Route
+from libdots.io.topic_router import TopicRouter
+from tests.conftest import InputMessage
+from tests.conftest import OutputMessage
+
+
+def test_route_lifecycle():
+    router = TopicRouter("sim", "model")
+    assert router.route("/lifecycle/dots-so/model/sim/model/NewStep") == Route(
+        NEW_STEP, "/lifecycle/dots-so/model", "dots-so"
+    )
+    with pytest.raises(Exception, match="unknown lifecycle message: 'Foo'"):
+        router.route("/lifecycle/dots-so/model/sim/model/Foo")
+
+
+def test_route_data():
+    router = TopicRouter("sim", "model")
+    router.build(
+        [NewStep, InputMessage, InputMessage],
+        {"/lifecycle/dots-so/model": ["dots-so"], "test_output": ["a", "b"]},
+    )
+    # test_output is the main topic of InputMessage
+    topic = "test_output/sim/b/test_input"
+    assert topic in router.routes
+    assert router.route(topic) == Route("test_input", "test_output", "b", InputMessage)
+
+    # topics we didn't expect are still parsed
+    assert router.route("/data/other/model/sim/c/load") == Route(
+        "load", "/data/other/model", "c"
+    )
+
+
+def test_output_topic():
+    router = TopicRouter("sim", "model")
+    topic = router.output_topic("a", OutputMessage)
+    assert topic == "test_output/sim/a/test_output"
+    assert router.output_topic("a", OutputMessage) is topic
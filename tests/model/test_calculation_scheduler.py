@@ -0,0 +1,84 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+import pytest
+
+from libdots.model.calculation_scheduler import CalculationScheduler
+from libdots.model.calculation_scheduler import dependency_groups
+
+CALC_NAMES = ["pre_battery", "post_battery", "prices"]
+DEPENDENCIES = {"post_battery": ["pre_battery"]}
+
+
+def test_dependency_groups():
+    assert dependency_groups(CALC_NAMES, DEPENDENCIES) == [
+        ["pre_battery", "post_battery"],
+        ["prices"],
+    ]
+    assert dependency_groups(CALC_NAMES, {}) == [
+        ["pre_battery"],
+        ["post_battery"],
+        ["prices"],
+    ]
+
+
+def test_dependency_groups_unknown_calculation():
+    with pytest.raises(ValueError, match="unknown calculation function"):
+        dependency_groups(CALC_NAMES, {"post_battery": ["battery"]})
+
+
+def test_no_dependencies():
+    scheduler = CalculationScheduler(CALC_NAMES)
+    assert scheduler.inputs_received(["prices", "post_battery"]) == [
+        "prices",
+        "post_battery",
+    ]
+    assert scheduler.finished("prices") == []
+
+
+def test_dependent_calculation_waits():
+    scheduler = CalculationScheduler(CALC_NAMES, DEPENDENCIES)
+
+    # post_battery has its input, but pre_battery did not run yet
+    assert scheduler.inputs_received(["post_battery", "prices"]) == ["prices"]
+    assert scheduler.inputs_received(["pre_battery"]) == ["pre_battery"]
+    assert scheduler.finished("prices") == []
+    assert scheduler.finished("pre_battery") == ["post_battery"]
+    assert scheduler.finished("post_battery") == []
+
+    # all calculations finished, the next time step starts over
+    assert scheduler.inputs_received(["post_battery"]) == []
+    assert scheduler.inputs_received(["pre_battery"]) == ["pre_battery"]
+
+
+def test_dependency_finished_before_input_received():
+    scheduler = CalculationScheduler(CALC_NAMES, DEPENDENCIES)
+    assert scheduler.inputs_received(["pre_battery"]) == ["pre_battery"]
+    assert scheduler.finished("pre_battery") == []
+    assert scheduler.inputs_received(["post_battery"]) == ["post_battery"]
+
+
+def test_calculation_started_once():
+    scheduler = CalculationScheduler(CALC_NAMES)
+    assert scheduler.inputs_received(["prices", "prices"]) == ["prices"]
+    assert scheduler.inputs_received(["prices"]) == []
+
+
+def test_cyclic_dependencies():
+    with pytest.raises(ValueError, match="cycle"):
+        CalculationScheduler(
+            CALC_NAMES,
+            {"post_battery": ["pre_battery"], "pre_battery": ["post_battery"]},
+        )
@@ -0,0 +1,275 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+import hashlib
+import time
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from esdl import Area
+from esdl import Building
+from esdl import EnergySystem
+from esdl import HeatingDemand
+from esdl import Instance
+
+from libdots.model.esdl_parser import Base64Reader
+from libdots.model.esdl_parser import EsdlIndex
+from libdots.model.esdl_parser import ESDLParser
+from libdots.types import CalculationServiceDescription
+from libdots.types import EsdlId
+from libdots.types import EsdlIdSet
+
+CALCULATION_SERVICES: list[CalculationServiceDescription] = [
+    {
+        "esdl_type": "Building",
+        "calc_service_name": "building_service",
+        "service_image_url": "",
+    }
+]
+
+
+def test_add_esdl_object():
+    esdl_parser = ESDLParser(["building_service"])
+    connected: dict[str, EsdlIdSet] = {}
+    for esdl_id in ["a", "b", "a"]:
+        esdl_parser.add_esdl_object(
+            connected, Building(id=esdl_id), CALCULATION_SERVICES
+        )
+    assert list(connected["building_service"]) == ["a", "b"]
+
+
+def test_add_esdl_object_not_received():
+    esdl_parser = ESDLParser(["other_service"])
+    connected: dict[str, EsdlIdSet] = {}
+    esdl_parser.add_esdl_object(connected, Building(id="a"), CALCULATION_SERVICES)
+    assert connected == {}
+
+
+def test_add_esdl_object_scales_linearly():
+    esdl_parser = ESDLParser(["building_service"])
+
+    def add_duration(nr_of_objects: int) -> float:
+        buildings = [Building(id=f"building_{i}") for i in range(nr_of_objects)]
+        connected: dict[str, EsdlIdSet] = {}
+        start = time.perf_counter()
+        for building in buildings:
+            esdl_parser.add_esdl_object(connected, building, CALCULATION_SERVICES)
+        duration = time.perf_counter() - start
+        assert len(connected["building_service"]) == nr_of_objects
+        return duration
+
+    small = min(add_duration(5000) for _ in range(3))
+    large = min(add_duration(20000) for _ in range(3))
+    # 4 times the objects, linear is ~4 times the duration, quadratic ~16 times
+    assert large / small < 10
+
+
+def create_energy_system(nr_of_buildings: int) -> EnergySystem:
+    area = Area(id="area")
+    for i in range(nr_of_buildings):
+        building = Building(id=f"building_{i}")
+        building.asset.append(HeatingDemand(id=f"demand_{i}"))  # pyright:ignore
+        area.asset.append(building)  # pyright:ignore
+    instance = Instance(id="instance")
+    instance.area = area
+    energy_system = EnergySystem(id="energy_system")
+    energy_system.instance.append(instance)  # pyright:ignore
+    return energy_system
+
+
+def test_esdl_index():
+    energy_system = create_energy_system(3)
+    index = EsdlIndex(energy_system)
+
+    assert index.by_id["energy_system"] is energy_system
+    assert index.by_id["demand_1"].id == "demand_1"
+    assert [obj.id for obj in index.by_type["Building"]] == [
+        "building_0",
+        "building_1",
+        "building_2",
+    ]
+    # the instance and area are no ESDLObject
+    assert len(index.contents) == 6
+
+
+def test_get_model_esdl_object():
+    esdl_parser = ESDLParser(["building_service"])
+    energy_system = create_energy_system(3)
+
+    assert esdl_parser.get_model_esdl_object("energy_system", energy_system) is (
+        energy_system
+    )
+    assert esdl_parser.get_model_esdl_object("building_2", energy_system).id == (
+        "building_2"
+    )
+    assert [
+        obj.id
+        for obj in esdl_parser.get_esdl_objects_by_type("HeatingDemand", energy_system)
+    ] == ["demand_0", "demand_1", "demand_2"]
+    with pytest.raises(OSError):
+        esdl_parser.get_model_esdl_object("unknown", energy_system)
+
+
+def test_get_model_esdl_object_scales_linearly():
+    esdl_parser = ESDLParser(["building_service"])
+
+    def lookup_duration(nr_of_buildings: int) -> float:
+        energy_system = create_energy_system(nr_of_buildings)
+        start = time.perf_counter()
+        for i in range(nr_of_buildings):
+            esdl_parser.get_model_esdl_object(f"demand_{i}", energy_system)
+        return time.perf_counter() - start
+
+    small = min(lookup_duration(250) for _ in range(3))
+    large = min(lookup_duration(1000) for _ in range(3))
+    # 4 times the objects, linear is ~4 times the duration, quadratic ~16 times
+    assert large / small < 10
+
+
+def test_get_connected_input_esdl_objects():
+    esdl_parser = ESDLParser(["building_service"])
+    energy_system = create_energy_system(3)
+    calculation_services = CALCULATION_SERVICES + [
+        {
+            "esdl_type": "HeatingDemand",
+            "calc_service_name": "demand_service",
+            "service_image_url": "",
+        },
+        # only the first calculation service of a type is used
+        {
+            "esdl_type": "Building",
+            "calc_service_name": "other_service",
+            "service_image_url": "",
+        },
+    ]
+
+    connected = [
+        esdl_parser.get_connected_input_esdl_objects(
+            esdl_id, calculation_services, energy_system
+        )
+        for esdl_id in ["demand_0", "demand_1", "building_0"]
+    ]
+
+    for connected_input_esdl_objects in connected:
+        assert connected_input_esdl_objects == {
+            "building_service": {
+                "building_0": None,
+                "building_1": None,
+                "building_2": None,
+            }
+        }
+    # found once in the energy system and shared
+    assert connected[0]["building_service"] is connected[1]["building_service"]
+    with pytest.raises(TypeError):
+        connected[0]["building_service"]["demand_0"] = None
+
+
+def test_get_connected_input_esdl_objects_threads():
+    esdl_parser = ESDLParser(["building_service"])
+    energy_system = create_energy_system(20)
+    esdl_ids = [f"demand_{i}" for i in range(20)]
+
+    def get_connected(esdl_id: EsdlId) -> dict[str, EsdlIdSet]:
+        return esdl_parser.get_connected_input_esdl_objects(
+            esdl_id, CALCULATION_SERVICES, energy_system
+        )
+
+    # the caches are filled by the first thread while the others wait
+    with ThreadPoolExecutor(8) as executor:
+        connected = list(executor.map(get_connected, esdl_ids))
+
+    expected = {f"building_{i}": None for i in range(20)}
+    assert all(
+        connected_input_esdl_objects == {"building_service": expected}
+        for connected_input_esdl_objects in connected
+    )
+    assert len({id(c["building_service"]) for c in connected}) == 1
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 64, 1 << 20])
+def test_base64_reader(chunk_size: int):
+    data = bytes(range(256)) * 10
+    encoded = b64encode(data).decode("ascii")
+    # line breaks and missing padding are accepted
+    wrapped = "\n".join(encoded[i : i + 76] for i in range(0, len(encoded), 76))
+
+    for base64_string in [encoded, wrapped, encoded.rstrip("=")]:
+        reader = Base64Reader(base64_string, chunk_size)
+        assert reader.read() == data
+
+
+def test_get_energy_system():
+    esdl_text = """<?xml version="1.0" encoding="UTF-8"?>
+<esdl:EnergySystem xmlns:esdl="http://www.tno.nl/esdl" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" id="energy_system" name="Überland">
+  <instance id="instance">
+    <area id="area">
+      <asset xsi:type="esdl:Building" id="building_0"/>
+    </area>
+  </instance>
+</esdl:EnergySystem>"""
+    esdl_bytes = esdl_text.encode("utf-8")
+    esdl_parser = ESDLParser(["building_service"])
+
+    energy_system = esdl_parser.get_energy_system(b64encode(esdl_bytes).decode("ascii"))
+
+    assert energy_system.name == "Überland"
+    assert esdl_parser.get_model_esdl_object("building_0", energy_system).id == (
+        "building_0"
+    )
+    assert esdl_parser.esdl_digest == hashlib.sha256(esdl_bytes).hexdigest()
+
+
+def test_prune_energy_system():
+    esdl_bytes = b"""<?xml version="1.0" encoding="UTF-8"?>
+<esdl:EnergySystem xmlns:esdl="http://www.tno.nl/esdl" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" id="energy_system">
+  <energySystemInformation id="information">
+    <profiles id="profiles">
+      <profile xsi:type="esdl:InfluxDBProfile" id="profile"/>
+    </profiles>
+  </energySystemInformation>
+  <instance id="instance">
+    <area id="area">
+      <asset xsi:type="esdl:Building" id="building_0">
+        <asset xsi:type="esdl:HeatingDemand" id="demand_0">
+          <port xsi:type="esdl:InPort" id="demand_0_in" connectedTo="producer_0_out"/>
+        </asset>
+      </asset>
+      <asset xsi:type="esdl:Building" id="building_1">
+        <asset xsi:type="esdl:HeatingDemand" id="demand_1">
+          <port xsi:type="esdl:InPort" id="demand_1_in" connectedTo="producer_1_out"/>
+        </asset>
+      </asset>
+      <asset xsi:type="esdl:GenericProducer" id="producer_0">
+        <port xsi:type="esdl:OutPort" id="producer_0_out" connectedTo="demand_0_in"/>
+      </asset>
+      <asset xsi:type="esdl:GenericProducer" id="producer_1">
+        <port xsi:type="esdl:OutPort" id="producer_1_out" connectedTo="demand_1_in"/>
+      </asset>
+    </area>
+  </instance>
+</esdl:EnergySystem>"""
+    esdl_parser = ESDLParser(["building_service"])
+    energy_system = esdl_parser.get_energy_system(b64encode(esdl_bytes).decode("ascii"))
+
+    # building_1 is removed with demand_1
+    assert esdl_parser.prune_energy_system(energy_system, ["demand_0"]) == 2
+
+    remaining = [obj.id for obj in esdl_parser.get_index(energy_system).contents]
+    assert sorted(remaining) == ["building_0", "demand_0", "producer_0", "profile"]
+    with pytest.raises(OSError):
+        esdl_parser.get_model_esdl_object("demand_1", energy_system)
+    assert "demand_1_in" not in energy_system.eResource.uuid_dict
+    assert esdl_parser.get_topology(energy_system).esdl_ids[1:] == remaining
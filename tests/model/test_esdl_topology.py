@@ -0,0 +1,120 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+from collections.abc import Iterable
+from typing import Any
+
+from esdl import Area
+from esdl import EnergySystem
+from esdl import GenericConsumer
+from esdl import GenericProducer
+from esdl import InPort
+from esdl import Instance
+from esdl import OutPort
+from esdl import Pipe
+from esdl import esdl
+
+from libdots.model.esdl_parser import EsdlIndex
+from libdots.model.esdl_parser import ESDLParser
+from libdots.types import CalculationServiceDescription
+
+
+def connect(sender: esdl.EnergyAsset, receiver: esdl.EnergyAsset):
+    out_port = OutPort(id=f"{sender.id}-{receiver.id}-out")
+    in_port = InPort(id=f"{sender.id}-{receiver.id}-in")
+    sender.port.append(out_port)  # pyright:ignore
+    receiver.port.append(in_port)  # pyright:ignore
+    out_port.connectedTo.append(in_port)  # pyright:ignore
+
+
+def create_energy_system() -> EnergySystem:
+    """Two producers feeding a consumer through a pipe."""
+    area = Area(id="area")
+    producer_1 = GenericProducer(id="producer_1")
+    producer_2 = GenericProducer(id="producer_2")
+    pipe = Pipe(id="pipe")
+    consumer = GenericConsumer(id="consumer")
+    connect(producer_1, pipe)
+    connect(producer_2, pipe)
+    connect(pipe, consumer)
+    for asset in [producer_1, producer_2, pipe, consumer]:
+        area.asset.append(asset)  # pyright:ignore
+    instance = Instance(id="instance")
+    instance.area = area
+    energy_system = EnergySystem(id="energy_system")
+    energy_system.instance.append(instance)  # pyright:ignore
+    return energy_system
+
+
+def test_topology():
+    topology = EsdlIndex(create_energy_system()).topology
+
+    def ids(nodes: Iterable[Any]) -> list[str]:
+        return [topology.esdl_ids[node] for node in nodes]
+
+    assert ids(range(len(topology))) == [
+        "energy_system",
+        "producer_1",
+        "producer_2",
+        "pipe",
+        "consumer",
+    ]
+    assert ids(topology.inputs(topology.node("pipe"))) == ["producer_1", "producer_2"]
+    assert ids(topology.outputs(topology.node("pipe"))) == ["consumer"]
+    assert ids(topology.inputs(topology.node("producer_1"))) == []
+    assert ids(topology.upstream(topology.node("consumer"))) == [
+        "pipe",
+        "producer_1",
+        "producer_2",
+    ]
+    assert ids(topology.downstream(topology.node("producer_2"))) == [
+        "pipe",
+        "consumer",
+    ]
+    assert topology.esdl_types[topology.type_codes[topology.node("pipe")]] == "Pipe"
+    assert topology.type_code("GenericProducer") == topology.type_codes[1]
+    assert topology.type_code("Building") is None
+    assert topology.is_asset.tolist() == [False, True, True, True, True]
+
+
+def test_connected_esdl_objects_from_topology():
+    energy_system = create_energy_system()
+    esdl_parser = ESDLParser(["producer_service", "pipe_service"])
+    calculation_services: list[CalculationServiceDescription] = [
+        {
+            "esdl_type": esdl_type,
+            "calc_service_name": service_name,
+            "service_image_url": "",
+        }
+        for esdl_type, service_name in [
+            ("GenericProducer", "producer_service"),
+            ("Pipe", "pipe_service"),
+            ("GenericConsumer", "consumer_service"),
+        ]
+    ]
+
+    assert esdl_parser.get_connected_input_esdl_objects(
+        "pipe", calculation_services, energy_system
+    ) == {"producer_service": {"producer_1": None, "producer_2": None}}
+    assert esdl_parser.get_connected_output_esdl_objects(
+        "producer_1", calculation_services, energy_system
+    ) == {"pipe_service": {"pipe": None}}
+    # consumer_service is not received
+    assert (
+        esdl_parser.get_connected_output_esdl_objects(
+            "pipe", calculation_services, energy_system
+        )
+        == {}
+    )
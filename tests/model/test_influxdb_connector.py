@@ -0,0 +1,274 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+from datetime import datetime
+from datetime import timezone as tz
+from pathlib import Path
+
+import numpy
+import numpy.typing
+import pytest
+from esdl import HeatingDemand
+from pytest_mock import MockerFixture
+
+from libdots.model.influxdb_connector import InfluxDBConnector
+
+TAGS = "esdl_id={},esdl_name={},model_id=model,simulation_id=simulation"
+
+
+def create_connector(
+    mocker: MockerFixture,
+    nr_of_time_steps: int,
+    stream_batch_steps: int | None,
+    dtype: numpy.typing.DTypeLike = numpy.float64,
+    directory: Path | None = None,
+) -> tuple[InfluxDBConnector, list[list[str]]]:
+    """A connector for 2 esdl_ids, returned with the lines of each request it writes."""
+    connector = InfluxDBConnector("http://influxdb", "8086", "user", "password", "db")
+    connector.stream_batch_steps = stream_batch_steps
+    connector.profile_output_dtype = dtype
+    connector.profile_output_directory = directory
+    written: list[list[str]] = []
+
+    def write_lines(data: bytes):
+        written.append(data.decode("utf-8").splitlines())
+
+    mocker.patch.object(connector, "write_lines", side_effect=write_lines)
+    connector.init_profile_output_data(
+        "simulation",
+        "model",
+        "heatingdemand",
+        datetime(2024, 1, 1, tzinfo=tz.utc),
+        3600,
+        nr_of_time_steps,
+        ["a", "b"],
+        ["load"],
+        {"a": HeatingDemand(id="a", name="A"), "b": HeatingDemand(id="b", name="B")},
+    )
+    return connector, written
+
+
+def test_write_output(mocker: MockerFixture):
+    connector, written = create_connector(mocker, 3, None)
+    write = mocker.patch.object(connector, "write")
+    for time_step_nr in range(1, 4):
+        connector.set_time_step_data_point("a", "load", time_step_nr, time_step_nr)
+        connector.set_time_step_data_point("b", "load", time_step_nr, float("nan"))
+    connector.set_summary_data_point("a", "total", 6.0)
+
+    connector.write_output()
+
+    tags_a = TAGS.format("a", "A")
+    tags_b = TAGS.format("b", "B")
+    assert written == [
+        [
+            f"heatingdemand,{tags_a} load=1.0 1704074400",
+            f"heatingdemand,{tags_b} load=0.0 1704074400",
+            f"heatingdemand,{tags_a} load=2.0 1704078000",
+            f"heatingdemand,{tags_b} load=0.0 1704078000",
+            f"heatingdemand,{tags_a} load=3.0 1704081600",
+            f"heatingdemand,{tags_b} load=0.0 1704081600",
+        ]
+    ]
+    write.assert_called_once_with(
+        [
+            {
+                "measurement": "heatingdemand",
+                "tags": {
+                    "simulation_id": "simulation",
+                    "model_id": "model",
+                    "esdl_id": "a",
+                    "esdl_name": "A",
+                },
+                "time": "2024-01-01T02:00:00Z",
+                "fields": {"total": 6.0},
+            }
+        ]
+    )
+
+
+def test_write_output_float32_memmap(mocker: MockerFixture, tmp_path: Path):
+    connector, written = create_connector(mocker, 2, None, numpy.float32, tmp_path)
+    connector.set_time_step_data_point("a", "load", 1, 0.1)
+    connector.set_time_step_data_point("b", "load", 2, 1e20)
+
+    connector.write_output()
+
+    assert [line.split(" ")[1] for line in written[0]] == [
+        "load=0.1",
+        "load=0.0",
+        "load=0.0",
+        "load=1e+20",
+    ]
+
+
+@pytest.mark.parametrize("stream_batch_steps", [None, 2])
+def test_write_output_replaced_profile_output_data(
+    mocker: MockerFixture, stream_batch_steps: int | None
+):
+    connector, written = create_connector(mocker, 3, stream_batch_steps)
+    # like a simulation that was terminated after the first time step
+    connector.profile_output_data["a"]["load"] = [5.0]
+    connector.set_time_step_data_point("b", "load", 3, 3.0)
+
+    connector.write_output()
+
+    lines = [line for lines in written for line in lines]
+    assert [line.split(" ")[1] for line in lines] == [
+        "load=5.0",
+        "load=0.0",
+        "load=0.0",
+        "load=0.0",
+        "load=0.0",
+        "load=3.0",
+    ]
+
+
+def test_set_time_step_data_points(
+    mocker: MockerFixture, caplog: pytest.LogCaptureFixture
+):
+    connector, written = create_connector(mocker, 2, None)
+
+    connector.set_time_step_data_points("load", 1, [1.0, float("nan")])
+    connector.set_time_step_data_points(
+        "load", 2, numpy.array([float("nan"), 4.0]), esdl_ids=["b", "a"]
+    )
+    connector.write_output()
+
+    assert [line.split(" ")[1] for line in written[0]] == [
+        "load=1.0",
+        "load=0.0",
+        "load=4.0",
+        "load=0.0",
+    ]
+    # reported once per call
+    assert [r.getMessage() for r in caplog.records] == [
+        "1 values for load are nan, changing to 0.0",
+        "1 values for load are nan, changing to 0.0",
+    ]
+
+
+@pytest.mark.parametrize("stream_batch_steps", [None, 3])
+def test_set_time_step_data_range(mocker: MockerFixture, stream_batch_steps: int):
+    connector, written = create_connector(mocker, 4, stream_batch_steps)
+
+    connector.set_time_step_data_range("a", "load", 1, [1.0, 2.0, float("nan")])
+    connector.set_time_step_data_range("b", "load", 2, numpy.array([5.0, 6.0, 7.0]))
+    connector.write_output()
+
+    lines = [line for lines in written for line in lines]
+    assert [line.split(" ")[1] for line in lines if "esdl_id=a" in line] == [
+        "load=1.0",
+        "load=2.0",
+        "load=0.0",
+        "load=0.0",
+    ]
+    assert [line.split(" ")[1] for line in lines if "esdl_id=b" in line] == [
+        "load=0.0",
+        "load=5.0",
+        "load=6.0",
+        "load=7.0",
+    ]
+
+
+def test_set_time_step_data_range_streaming_window(mocker: MockerFixture):
+    connector, _ = create_connector(mocker, 6, 2)
+
+    with pytest.raises(ValueError):
+        connector.set_time_step_data_range("a", "load", 1, [1.0, 2.0, 3.0])
+    connector.write_output()
+
+
+def test_set_summary_data_points(mocker: MockerFixture):
+    connector, _ = create_connector(mocker, 2, None)
+
+    connector.set_summary_data_points("total", [1.0, float("nan")])
+    connector.set_summary_data_points("max", [3.0], esdl_ids=["b"])
+
+    assert connector.summary_output_data == {
+        "a": {"total": 1.0},
+        "b": {"total": 0.0, "max": 3.0},
+    }
+    with pytest.raises(ValueError):
+        connector.set_summary_data_points("total", [1.0])
+
+
+def test_write_output_streaming(mocker: MockerFixture):
+    streamed, streamed_written = create_connector(mocker, 5, 2)
+    at_end, at_end_written = create_connector(mocker, 5, None)
+    for connector in streamed, at_end:
+        for time_step_nr in range(1, 6):
+            connector.set_time_step_data_point("a", "load", time_step_nr, time_step_nr)
+            connector.set_time_step_data_point("b", "load", time_step_nr, -time_step_nr)
+
+    # only the last 2 time steps are kept, the earlier ones were queued when step 5 was set
+    assert len(streamed.profile_output_data["a"]["load"]) == 2
+    streamed.write_output()
+    at_end.write_output()
+
+    # batches of 2 time steps
+    assert [len(lines) for lines in streamed_written] == [4, 4, 2]
+    assert [line for lines in streamed_written for line in lines] == at_end_written[0]
+
+
+def test_write_output_streaming_skipped_steps(mocker: MockerFixture):
+    connector, written = create_connector(mocker, 6, 2)
+    connector.set_time_step_data_point("a", "load", 1, 1.0)
+    connector.set_time_step_data_point("a", "load", 6, 6.0)
+    connector.set_time_step_data_point("a", "load", 1, 2.0)  # too late
+
+    connector.write_output()
+
+    lines = [line for lines in written for line in lines if "esdl_id=a" in line]
+    assert [line.split(" ")[1] for line in lines] == [
+        "load=1.0",
+        "load=0.0",
+        "load=0.0",
+        "load=0.0",
+        "load=0.0",
+        "load=6.0",
+    ]
+
+
+def test_write_output_streaming_error(mocker: MockerFixture):
+    connector, _ = create_connector(mocker, 4, 2)
+    mocker.patch.object(connector, "write_lines", side_effect=ConnectionError("down"))
+    for time_step_nr in range(1, 5):
+        connector.set_time_step_data_point("a", "load", time_step_nr, time_step_nr)
+
+    with pytest.raises(ConnectionError):
+        connector.write_output()
+
+
+def test_write_lines_batch_writer(mocker: MockerFixture):
+    writer_class = mocker.patch("libdots.model.influxdb_connector.InfluxDBWriter")
+    connector = InfluxDBConnector("http://influxdb", "8086", "user", "password", "db")
+    connector.write_batch_size = 1000
+
+    connector.write_lines(b"m load=1.0 1\n")
+    connector.close()
+
+    writer_class.assert_called_once_with(
+        "http://influxdb:8086",
+        "db",
+        "user",
+        "password",
+        batch_size=1000,
+        concurrency=4,
+        retries=5,
+        compress=True,
+    )
+    writer_class.return_value.write_lines.assert_called_once_with(b"m load=1.0 1\n")
+    writer_class.return_value.close.assert_called_once_with()
@@ -0,0 +1,126 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+import gzip
+import threading
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+import httpx
+import pytest
+
+from libdots.model.influxdb_writer import InfluxDBWriter
+
+
+class FakeInfluxDB(ThreadingHTTPServer):
+    """A stand-in for the InfluxDB write endpoint, failing the first ``failures`` requests."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeInfluxDBHandler)
+        self.lock = threading.Lock()
+        self.lines: list[bytes] = []
+        self.requests: list[dict[str, list[str]]] = []
+        self.failures = 0
+        self.status_code = 503
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class FakeInfluxDBHandler(BaseHTTPRequestHandler):
+    server: FakeInfluxDB  # pyright:ignore[reportIncompatibleVariableOverride]
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        url = urlparse(self.path)
+        with self.server.lock:
+            fail = self.server.failures > 0
+            if fail:
+                self.server.failures -= 1
+            else:
+                self.server.requests.append(parse_qs(url.query))
+                self.server.lines.extend(body.splitlines())
+        self.send_response(self.server.status_code if fail else 204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format: str, *args: object):
+        pass
+
+
+@pytest.fixture
+def influxdb() -> Iterator[FakeInfluxDB]:
+    server = FakeInfluxDB()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def create_lines(nr_of_lines: int) -> bytes:
+    return b"".join(b"m,esdl_id=a load=%d.0 %d\n" % (i, i) for i in range(nr_of_lines))
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_write_lines(influxdb: FakeInfluxDB, compress: bool):
+    writer = InfluxDBWriter(
+        influxdb.url, "db", batch_size=10, concurrency=3, compress=compress
+    )
+
+    writer.write_lines(create_lines(25))
+    writer.close()
+
+    assert sorted(influxdb.lines) == sorted(create_lines(25).splitlines())
+    assert influxdb.requests[0] == {"db": ["db"], "precision": ["s"]}
+    assert writer.stats.batches == 3
+    assert writer.stats.lines == 25
+    assert writer.stats.bytes == len(create_lines(25))
+    assert (writer.stats.bytes_sent < writer.stats.bytes) == compress
+    assert writer.stats.lines_per_second > 0
+
+
+def test_write_lines_retry(influxdb: FakeInfluxDB):
+    influxdb.failures = 2
+    writer = InfluxDBWriter(influxdb.url, "db", batch_size=10, backoff=0)
+
+    writer.write_lines(create_lines(20))
+    writer.close()
+
+    assert len(influxdb.lines) == 20
+    assert writer.stats.retries == 2
+    assert writer.stats.failed_batches == 0
+
+
+def test_write_lines_error(influxdb: FakeInfluxDB):
+    # a bad request is not retried
+    influxdb.failures = 1
+    influxdb.status_code = 400
+    writer = InfluxDBWriter(influxdb.url, "db", batch_size=10, concurrency=1, backoff=0)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        writer.write_lines(create_lines(20))
+    writer.close()
+
+    # the other batch is still written
+    assert len(influxdb.lines) == 10
+    assert writer.stats.retries == 0
+    assert writer.stats.failed_batches == 1
@@ -0,0 +1,68 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+import numpy
+import pytest
+from influxdb.line_protocol import make_lines
+
+from libdots.model.line_protocol import LineProtocolEncoder
+
+
+def test_encode():
+    series_tags: list[dict[str, str | None]] = [
+        {"esdl_id": "a b", "esdl_name": "x,y=z"},
+        {"esdl_id": "c", "esdl_name": None},
+    ]
+    field_names = ["load", "a field", "cost"]
+    values = numpy.arange(2 * 3 * 4, dtype=numpy.float64).reshape(2, 3, 4) / 3
+    values[0, 0, 0] = 1e20
+    values[1, 2, 3] = -0.0
+    timestamps = 1704074400 + numpy.arange(4) * 900
+
+    encoder = LineProtocolEncoder("heating demand", series_tags, field_names)
+
+    points = [
+        {
+            "measurement": "heating demand",
+            "tags": series_tags[i_series],
+            "time": int(timestamps[i_step]),
+            "fields": {
+                field_name: values[i_series, i_field, i_step]
+                for i_field, field_name in enumerate(field_names)
+            },
+        }
+        for i_step in range(4)
+        for i_series in range(2)
+    ]
+    assert encoder.encode(values, timestamps) == make_lines(
+        {"points": points}, "s"
+    ).encode("utf-8")
+
+
+def test_encode_float32():
+    encoder = LineProtocolEncoder("m", [{"esdl_id": "a"}], ["load"])
+
+    data = encoder.encode(
+        numpy.array([[[0.1, 1.25]]], dtype=numpy.float32), numpy.array([1, 2])
+    )
+
+    assert data == b"m,esdl_id=a load=0.1 1\nm,esdl_id=a load=1.25 2\n"
+
+
+def test_encode_wrong_shape():
+    encoder = LineProtocolEncoder("m", [{"esdl_id": "a"}], ["load"])
+
+    with pytest.raises(ValueError):
+        encoder.encode(numpy.zeros((2, 1, 3)), numpy.arange(3))
@@ -0,0 +1,48 @@
+#  This work is based on original code developed and copyrighted by TNO 2023
+#  and further developed and copyrighted by Scene Ltd in 2025.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation of the dots calculation-service-generator
+#      Scene Ltd   - Development of libdots
+#  Manager:
+#      Scene Ltd
+from pathlib import Path
+
+import numpy
+
+from libdots.model.profile_output_buffer import ProfileOutputBuffer
+
+
+def test_profile_output_buffer():
+    buffer = ProfileOutputBuffer(["a", "b"], ["load", "cost"], 3)
+
+    views = buffer.views()
+    views["b"]["cost"][2] = 1.0
+
+    assert buffer.values.shape == (2, 2, 3)
+    assert buffer.values.dtype == numpy.float64
+    assert (
+        buffer.values[buffer.esdl_indices["b"], buffer.output_indices["cost"], 2] == 1.0
+    )
+    assert buffer.values.sum() == 1.0
+
+
+def test_profile_output_buffer_memmap(tmp_path: Path):
+    buffer = ProfileOutputBuffer(
+        ["a", "b"], ["load"], 3, numpy.float32, tmp_path / "buffer"
+    )
+
+    buffer.views()["a"]["load"][:] = [1.0, 2.0, 3.0]
+
+    assert isinstance(buffer.values, numpy.memmap)
+    assert buffer.values.dtype == numpy.float32
+    assert buffer.values.tolist() == [[[1.0, 2.0, 3.0]], [[0.0, 0.0, 0.0]]]
+    # the file has no name
+    assert list((tmp_path / "buffer").iterdir()) == []
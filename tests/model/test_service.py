@@ -14,6 +14,7 @@
 #  Manager:
 #      Scene Ltd
 from typing import override
+from unittest.mock import AsyncMock
 from unittest.mock import MagicMock
 
 from pytest_mock import MockerFixture
@@ -47,6 +48,7 @@ def test_service_init(mocker: MockerFixture, config: ServiceConfig):
     mock_input_data_inventory_class.assert_called_once_with(
         mock_service_calc.calculation_function_input_types,
         mock_service_calc.service_name,
+        mock_service_calc.calculation_function_input_views,
     )
     mock_mqtt_client_class.assert_called_once_with(
         host=config.mqtt_host,
@@ -58,4 +60,31 @@ def test_service_init(mocker: MockerFixture, config: ServiceConfig):
         service_calc=mock_service_calc,
         service_name=mock_service_calc.service_name,
         sim_logger=service.logger,
+        dispatch_mode=config.mqtt_dispatch_mode,
+        dispatch_workers=config.mqtt_dispatch_workers,
+        dispatch_queue_size=config.mqtt_dispatch_queue_size,
+        publish_window=config.mqtt_publish_window,
+        output_qos=config.mqtt_output_qos,
+        calculation_workers=config.calculation_workers,
+        calculation_processes=config.calculation_processes,
     )
+
+
+def test_async_service(mocker: MockerFixture, config: ServiceConfig):
+    mock_service_calc = MagicMock()
+    mock_service_calc_class = MagicMock(return_value=mock_service_calc)
+
+    class MyAsyncService(lib_service.AsyncBaseService):
+        @property
+        @override
+        def service_calc_class(self) -> type[MyServiceCalc]:
+            return mock_service_calc_class  # pyright:ignore[reportReturnType]
+
+    mocker.patch.object(lib_service, "InputDataInventory", return_value=MagicMock())
+    mock_mqtt_client_class = mocker.patch.object(lib_service, "AsyncMqttClient")
+
+    service = MyAsyncService(config)
+    assert service.mqtt_client is mock_mqtt_client_class.return_value
+    mock_mqtt_client_class.return_value.run = AsyncMock()
+    service.start()
+    mock_mqtt_client_class.return_value.run.assert_awaited_once_with()
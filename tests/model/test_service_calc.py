@@ -13,22 +13,37 @@
 #      Scene Ltd   - Development of libdots
 #  Manager:
 #      Scene Ltd
+import asyncio
+import logging
+import os
+from collections.abc import Collection
+from collections.abc import Mapping
+from collections.abc import Sequence
 from datetime import datetime
 from datetime import timezone as tz
 from typing import Annotated
+from typing import TypedDict
+from typing import override
 from unittest.mock import MagicMock
 
+import pytest
 from esdl import EnergyDemand
 from esdl import EnergySystem
 from pytest_mock import MockerFixture
 
+from libdots.io.columnar import ColumnarBatch
 from libdots.io.io_data import NewStep
+from libdots.io.mqtt_log_handler import MqttLogHandler
 from libdots.model.esdl_parser import ESDLParser
+from libdots.model.service_calc import EsdlObjectSetupMode
 from libdots.types import CalculationServiceDescription
 from libdots.types import EsdlId
+from libdots.types import ESDLObject
 from libdots.types import ModelParametersDescription
+from tests.conftest import InputData
 from tests.conftest import InputMessage
 from tests.conftest import MyServiceCalc
+from tests.conftest import OutputData
 from tests.conftest import OutputMessage
 
 
@@ -40,6 +55,83 @@ def test_calculation_function_input_types(
     }
 
 
+def test_calculation_function_input_views(service_calc: MyServiceCalc):
+    assert service_calc.calculation_function_input_views == {
+        "calc": {"test_input": ["list"]}
+    }
+
+
+class KeyedInputData(TypedDict):
+    test_input_list: Sequence[InputMessage]
+    test_input_by_esdl_id: Mapping[EsdlId, InputMessage]
+
+
+class MyKeyedServiceCalc(MyServiceCalc):
+    def test_calc(  # pyright:ignore[reportIncompatibleMethodOverride]
+        self, new_step: NewStep, input_data: KeyedInputData
+    ) -> OutputData:
+        return (
+            {
+                esdl_id: OutputMessage(load=message.demand)
+                for esdl_id, message in input_data["test_input_by_esdl_id"].items()
+            },
+        )
+
+
+def test_calculation_function_input_views_by_esdl_id():
+    service_calc = MyKeyedServiceCalc(
+        simulation_id="",
+        model_id="",
+        influxdb_host="",
+        influxdb_port=1,
+        influxdb_password="",
+        influxdb_user="",
+        influxdb_name="",
+    )
+    assert service_calc.calculation_function_input_types == {
+        "calc": [NewStep, InputMessage]
+    }
+    assert service_calc.calculation_function_input_views == {
+        "calc": {"test_input": ["list", "by_esdl_id"]}
+    }
+    input_data_dict = {
+        "new_step": NewStep(),
+        "test_input_list": [InputMessage(demand=10)],
+        "test_input_by_esdl_id": {"a": InputMessage(demand=10)},
+    }
+    result = service_calc.calc_function("calc", input_data_dict=input_data_dict)
+    assert result == ({"a": OutputMessage(load=10)},)
+
+
+class ColumnarInputData(TypedDict):
+    test_input_columns: ColumnarBatch[InputMessage]
+
+
+class MyColumnarServiceCalc(MyServiceCalc):
+    def test_calc(  # pyright:ignore[reportIncompatibleMethodOverride]
+        self, new_step: NewStep, input_data: ColumnarInputData
+    ) -> OutputData:
+        return ({"1234": OutputMessage(load=len(input_data["test_input_columns"]))},)
+
+
+def test_calculation_function_input_views_columns():
+    service_calc = MyColumnarServiceCalc(
+        simulation_id="",
+        model_id="",
+        influxdb_host="",
+        influxdb_port=1,
+        influxdb_password="",
+        influxdb_user="",
+        influxdb_name="",
+    )
+    assert service_calc.calculation_function_input_types == {
+        "calc": [NewStep, InputMessage]
+    }
+    assert service_calc.calculation_function_input_views == {
+        "calc": {"test_input": ["columns"]}
+    }
+
+
 def test_calculation_function(service_calc: MyServiceCalc):
     input_messages = [InputMessage(demand=10), InputMessage(demand=12)]
     input_data_dict = {"new_step": NewStep(), "test_input_list": input_messages}
@@ -73,7 +165,7 @@ def test_setup(
         "time_step_seconds": 60,
         "nr_of_time_steps": 1,
         "calculation_services": [calculation_service],
-        "esdl_base64string": "",
+        "esdl_base64string": "ESDL",
     }
     process_esdl_object_spy = mocker.spy(service_calc, "process_esdl_object")
 
@@ -88,8 +180,318 @@ def test_setup(
         ESDLParser, service_calc.receives_service_names
     )
 
-    mock_get_energy_system.assert_called_once_with(
-        model_parameters["esdl_base64string"]
-    )
+    mock_get_energy_system.assert_called_once_with("ESDL")
+    # released after parsing
+    assert model_parameters["esdl_base64string"] == ""
     mock_get_model_esdl_object.assert_called_once_with(esdl_id, energy_system)
     process_esdl_object_spy.assert_called_once_with(esdl_id, energy_demand)
+
+
+def test_setup_esdl_ids(
+    mock_esdl_parser: Annotated[MagicMock, type[ESDLParser]],
+    mocker: MockerFixture,
+    service_calc: MyServiceCalc,
+):
+    energy_demand = EnergyDemand()
+    mock_esdl_parser.return_value.get_energy_system.return_value = EnergySystem()
+    mock_esdl_parser.return_value.get_model_esdl_object.return_value = energy_demand
+    model_parameters: ModelParametersDescription = {
+        "esdl_ids": ["1", "2", "3"],
+        "simulation_name": "testsimulation",
+        "start_timestamp": datetime.now(tz.utc).timestamp(),
+        "time_step_seconds": 60,
+        "nr_of_time_steps": 1,
+        "calculation_services": [
+            {
+                "esdl_type": "EnergyDemand",
+                "calc_service_name": "my_service",
+                "service_image_url": "foo",
+            }
+        ],
+        "esdl_base64string": "",
+    }
+    base_setup_spy = mocker.spy(service_calc, "base_setup")
+    process_esdl_object_spy = mocker.spy(service_calc, "process_esdl_object")
+
+    service_calc.setup_shared(model_parameters)
+    assert service_calc.esdl_ids == ["1", "2", "3"]
+    service_calc.setup_esdl_ids(model_parameters, ["2", "3"])
+
+    base_setup_spy.assert_called_once()
+    assert service_calc.esdl_ids == ["2", "3"]
+    assert [call.args[0] for call in process_esdl_object_spy.call_args_list] == [
+        "2",
+        "3",
+    ]
+
+
+def test_setup_esdl_ids_partial_esdl_load(
+    mock_esdl_parser: Annotated[MagicMock, type[ESDLParser]],
+    mocker: MockerFixture,
+    service_calc: MyServiceCalc,
+):
+    mock_esdl_parser.return_value.get_energy_system.return_value = EnergySystem()
+    mock_esdl_parser.return_value.get_model_esdl_object.return_value = EnergyDemand()
+    mock_esdl_parser.return_value.get_connected_input_esdl_objects.return_value = {
+        "my_service": {"4": None}
+    }
+    mock_esdl_parser.return_value.get_connected_output_esdl_objects.return_value = {
+        "my_service": {"5": None}
+    }
+    model_parameters: ModelParametersDescription = {
+        "esdl_ids": ["1", "2"],
+        "simulation_name": "testsimulation",
+        "start_timestamp": datetime.now(tz.utc).timestamp(),
+        "time_step_seconds": 60,
+        "nr_of_time_steps": 1,
+        "calculation_services": [],
+        "esdl_base64string": "",
+    }
+    mocker.patch.object(
+        MyServiceCalc, "partial_esdl_load", new_callable=mocker.PropertyMock
+    ).return_value = True
+
+    service_calc.setup(model_parameters)
+
+    mock_esdl_parser.return_value.prune_energy_system.assert_called_once_with(
+        service_calc.esdl_energy_system, {"1", "2", "4", "5"}
+    )
+
+
+class MySetupModeServiceCalc(MyServiceCalc):
+    mode: EsdlObjectSetupMode = "serial"
+    processed: dict[EsdlId, int]
+
+    @property
+    @override
+    def esdl_object_setup_mode(self) -> EsdlObjectSetupMode:
+        return self.mode
+
+    @override
+    def process_esdl_object(  # pyright:ignore[reportIncompatibleMethodOverride]
+        self, esdl_id: EsdlId, esdl_object: ESDLObject
+    ) -> int:
+        logging.getLogger().info("processing %s", esdl_id)
+        return os.getpid()
+
+    @override
+    def add_processed_esdl_object(self, esdl_id: EsdlId, result: int):
+        self.processed[esdl_id] = result
+
+
+@pytest.mark.parametrize("mode", ["serial", "thread", "process"])
+def test_esdl_object_setup_mode(
+    mock_esdl_parser: Annotated[MagicMock, type[ESDLParser]],
+    mqtt_log_handler: MqttLogHandler,
+    mode: EsdlObjectSetupMode,
+):
+    esdl_ids = [str(i) for i in range(20)]
+    parser = mock_esdl_parser.return_value
+    parser.get_energy_system.return_value = EnergySystem()
+    parser.get_model_esdl_object.return_value = EnergyDemand()
+
+    def connected_input(esdl_id: EsdlId, *args: object):
+        return {"input_service": {f"in-{esdl_id}": None}}
+
+    def connected_output(esdl_id: EsdlId, *args: object):
+        return {"output_service": {f"out-{esdl_id}": None}}
+
+    parser.get_connected_input_esdl_objects.side_effect = connected_input
+    parser.get_connected_output_esdl_objects.side_effect = connected_output
+    service_calc = MySetupModeServiceCalc("", "", "", 1, "", "", "")
+    service_calc.mode = mode
+    service_calc.processed = {}
+
+    service_calc.setup(
+        {
+            "esdl_ids": esdl_ids,
+            "simulation_name": "testsimulation",
+            "start_timestamp": datetime.now(tz.utc).timestamp(),
+            "time_step_seconds": 60,
+            "nr_of_time_steps": 1,
+            "calculation_services": [],
+            "esdl_base64string": "",
+        }
+    )
+
+    # the results are stored in the order of the esdl_ids
+    assert list(service_calc.processed) == esdl_ids
+    assert list(service_calc.connected_input_esdl_objects_dict) == esdl_ids
+    assert service_calc.connected_input_esdl_objects_dict["3"] == {
+        "input_service": {"in-3": None}
+    }
+    assert service_calc.connected_output_esdl_objects_dict["3"] == {
+        "output_service": {"out-3": None}
+    }
+    assert list(service_calc.esdl_objects) == esdl_ids
+    in_this_process = set(service_calc.processed.values()) == {os.getpid()}
+    assert in_this_process == (mode != "process")
+    # the logs of the worker processes are published by this process
+    send_log = mqtt_log_handler.client.send_log
+    assert isinstance(send_log, MagicMock)
+    logged = [call.args[0].split(": ", 1)[1] for call in send_log.call_args_list]
+    assert sorted(logged) == sorted(f"processing {esdl_id}" for esdl_id in esdl_ids)
+
+
+class MyAsyncServiceCalc(MyServiceCalc):
+    async def test_calc(  # pyright:ignore[reportIncompatibleMethodOverride]
+        self, new_step: NewStep, input_data: InputData
+    ) -> OutputData:
+        await asyncio.sleep(0)
+        return super().test_calc(new_step, input_data)
+
+
+def test_async_calculation_function():
+    service_calc = MyAsyncServiceCalc(
+        simulation_id="",
+        model_id="",
+        influxdb_host="",
+        influxdb_port=1,
+        influxdb_password="",
+        influxdb_user="",
+        influxdb_name="",
+    )
+    assert service_calc.calculation_function_input_types == {
+        "calc": [NewStep, InputMessage]
+    }
+    input_messages = [InputMessage(demand=10), InputMessage(demand=12)]
+    input_data_dict = {"new_step": NewStep(), "test_input_list": input_messages}
+
+    result = asyncio.run(
+        service_calc.async_calc_function("calc", input_data_dict=input_data_dict)
+    )
+    assert result == ({"1234": OutputMessage(load=22)},)
+
+    # async calculation functions also work in the threaded runtime
+    result = service_calc.calc_function("calc", input_data_dict=input_data_dict)
+    assert result == ({"1234": OutputMessage(load=22)},)
+    assert not service_calc.lock.locked()
+
+
+def test_async_calc_function_with_sync_function(service_calc: MyServiceCalc):
+    input_messages = [InputMessage(demand=10), InputMessage(demand=12)]
+    input_data_dict = {"new_step": NewStep(), "test_input_list": input_messages}
+    result = asyncio.run(
+        service_calc.async_calc_function("calc", input_data_dict=input_data_dict)
+    )
+    assert result == ({"1234": OutputMessage(load=22)},)
+
+
+def test_calculation_lock(service_calc: MyServiceCalc):
+    # without declared dependencies all calculations share the service lock
+    assert service_calc.calculation_lock("calc") is service_calc.lock
+
+
+def test_calculation_lock_per_dependency_group(mocker: MockerFixture):
+    service_calc = MyServiceCalc(
+        simulation_id="",
+        model_id="",
+        influxdb_host="",
+        influxdb_port=1,
+        influxdb_password="",
+        influxdb_user="",
+        influxdb_name="",
+    )
+    mocker.patch.object(
+        MyServiceCalc,
+        "calculation_functions",
+        {
+            "pre": service_calc.test_calc,
+            "post": service_calc.test_calc,
+            "other": service_calc.test_calc,
+        },
+    )
+    mocker.patch.object(
+        MyServiceCalc, "calculation_function_dependencies", {"post": ["pre"]}
+    )
+    assert service_calc.calculation_lock("pre") is service_calc.calculation_lock("post")
+    assert service_calc.calculation_lock("pre") is not service_calc.calculation_lock(
+        "other"
+    )
+    assert service_calc.calculation_lock("other") is not service_calc.lock
+
+
+class MyProcessServiceCalc(MyServiceCalc):
+    factor: int
+
+    @property
+    @override
+    def process_calculation_functions(self) -> Collection[str]:
+        return ["calc"]
+
+    @override
+    def test_calc(self, new_step: NewStep, input_data: InputData) -> OutputData:
+        # uses the state set before the workers started, and reports the process it ran in
+        return ({str(os.getpid()): OutputMessage(load=self.factor)},)
+
+
+def test_calculation_function_in_process():
+    service_calc = MyProcessServiceCalc(
+        simulation_id="",
+        model_id="",
+        influxdb_host="",
+        influxdb_port=1,
+        influxdb_password="",
+        influxdb_user="",
+        influxdb_name="",
+    )
+    service_calc.factor = 3
+    service_calc.start_calculation_processes(1)
+    try:
+        input_data_dict = {
+            "new_step": NewStep(),
+            "test_input_list": [InputMessage(demand=1)],
+        }
+        result = service_calc.calc_function("calc", input_data_dict=input_data_dict)
+        async_result = asyncio.run(
+            service_calc.async_calc_function("calc", input_data_dict=input_data_dict)
+        )
+    finally:
+        service_calc.stop_calculation_processes()
+
+    ((pid, output),) = result[0].items()
+    assert pid != str(os.getpid())
+    assert output == OutputMessage(load=3)
+    assert async_result == result
+
+
+class MyLoggingProcessServiceCalc(MyProcessServiceCalc):
+    @override
+    def test_calc(self, new_step: NewStep, input_data: InputData) -> OutputData:
+        root_logger = logging.getLogger()
+        root_logger.info("calculating in %s", os.getpid())
+        # the number of MQTT log handlers left in the worker process
+        nr_of_handlers = sum(
+            isinstance(handler, MqttLogHandler) for handler in root_logger.handlers
+        )
+        return ({str(os.getpid()): OutputMessage(load=nr_of_handlers)},)
+
+
+def test_calculation_function_in_process_logs(mqtt_log_handler: MqttLogHandler):
+    service_calc = MyLoggingProcessServiceCalc(
+        simulation_id="",
+        model_id="",
+        influxdb_host="",
+        influxdb_port=1,
+        influxdb_password="",
+        influxdb_user="",
+        influxdb_name="",
+    )
+    service_calc.start_calculation_processes(1)
+    try:
+        result = service_calc.calc_function(
+            "calc",
+            input_data_dict={
+                "new_step": NewStep(),
+                "test_input_list": [InputMessage(demand=1)],
+            },
+        )
+    finally:
+        service_calc.stop_calculation_processes()
+
+    ((pid, output),) = result[0].items()
+    assert output == OutputMessage(load=0)
+    send_log = mqtt_log_handler.client.send_log
+    assert isinstance(send_log, MagicMock)
+    send_log.assert_called_once()
+    assert send_log.call_args.args[0].endswith(f"[INFO]: calculating in {pid}")
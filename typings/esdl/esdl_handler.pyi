@@ -21,7 +21,7 @@ class EnergySystemHandler:
         """Loads a file in a new resource set"""
         ...
 
-    def load_uri(self, uri) -> esdl.EnergySystem:
+    def load_uri(self, uri: URI) -> esdl.EnergySystem:
         """Loads a new resource in a new resourceSet"""
         ...
 
@@ -77,7 +77,7 @@ class EnergySystemHandler:
 
     def add_object(self, obj): ...
     def remove_object(self, obj): ...
-    def remove_obj_by_id(self, obj_id): ...
+    def remove_obj_by_id(self, obj_id: str) -> None: ...
     def get_all_instances_of_type(self, esdl_type): ...
     @staticmethod
     def instantiate_esdltype(className: str) -> EObject:
@@ -166,14 +166,14 @@ class InfluxDBClient:
 
     def request(
         self,
-        url,
-        method=...,
-        params=...,
-        data=...,
-        stream=...,
-        expected_response_code=...,
-        headers=...,
-    ):  # -> Response:
+        url: str,
+        method: str = ...,
+        params: dict[str, Any] | None = ...,
+        data: Any = ...,
+        stream: bool = ...,
+        expected_response_code: int = ...,
+        headers: dict[str, str] | None = ...,
+    ) -> Any:  # -> Response:
         """Make a HTTP request to the InfluxDB API.
 
         :param url: the path of the HTTP request, e.g. write, query, etc.
@@ -2,6 +2,8 @@
 This type stub file was generated by pyright.
 """
 
+from typing import Any
+
 """Define the line_protocol handler."""
 EPOCH = ...
 def quote_ident(value): # -> str:
@@ -16,7 +18,7 @@ def make_line(measurement, tags=..., fields=..., time=..., precision=...): # ->
     """Extract the actual point from a given measurement line."""
     ...
 
-def make_lines(data, precision=...): # -> LiteralString:
+def make_lines(data: dict[str, Any], precision: str | None = ...) -> str:
     """Extract points from given dict.
 
     Extracts the points from the given dict and returns a Unicode string
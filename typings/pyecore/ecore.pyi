@@ -3,6 +3,7 @@ This type stub file was generated by pyright.
 """
 
 from collections.abc import Generator
+from typing import Any
 
 from .notification import ENotifer
 
@@ -81,22 +82,20 @@ class EObject(ENotifer, metaclass=Metasubinstance):
     def allInstances(cls, resources=...):  # -> Generator[Self, Any, None]:
         ...
 
-    def eContainer(self): ...
+    def eContainer(self) -> EObject | None: ...
     def eContainmentFeature(self): ...
     def eIsSet(self, feature):  # -> bool:
         ...
 
     @property
-    def eResource(self): ...
+    def eResource(self) -> Any: ...
     def eGet(self, feature):  # -> Any:
         ...
 
     def eSet(self, feature, value):  # -> None:
         ...
 
-    def delete(self, recursive=...):  # -> None:
-        ...
-
+    def delete(self, recursive: bool = ...) -> None: ...
     @property
     def eContents(self):  # -> list[Any]:
         ...
@@ -68,7 +68,7 @@ class ResourceSet:
 class URI:
     _uri_norm = ...
     _uri_split = ...
-    def __init__(self, uri) -> None:
+    def __init__(self, uri: str) -> None:
         ...
 
     @property